@@ -0,0 +1,4 @@
+# Rich only highlights Python source (tracebacks), with plain text as the
+# fallback. PyInstaller's stock hook bundles every lexer, formatter and style,
+# over 4 MB of modules the CLI never loads; this hook replaces it.
+hiddenimports = ["pygments.lexers.python", "pygments.lexers.special"]
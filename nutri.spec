@@ -1,5 +1,36 @@
 # -*- mode: python ; coding: utf-8 -*-
+#
+# Build with `make build`. The default is a onedir bundle (dist/nutri/nutri),
+# which starts without unpacking anything; NUTRI_BUILD_MODE=onefile builds a
+# single self-extracting binary instead. NUTRI_TARGET_ARCH is only honoured on
+# macOS (e.g. arm64, x86_64, universal2); Linux builds the host architecture.
 
+import os
+import sys
+
+onefile = os.environ.get("NUTRI_BUILD_MODE", "onedir") == "onefile"
+target_arch = os.environ.get("NUTRI_TARGET_ARCH") if sys.platform == "darwin" else None
+
+# Stdlib and build-tool packages the CLI never imports.
+excludes = [
+    "tkinter",
+    "test",
+    "unittest",
+    "lib2to3",
+    "pydoc_data",
+    "xmlrpc",
+    "setuptools",
+    "pip",
+    "pkg_resources",
+    # Only reached through rich's Jupyter support and test tooling.
+    "IPython",
+    "pytest",
+    "_pytest",
+    # Optional extras (nutri-cli[arrow], nutri-cli[duckdb]) are imported lazily
+    # and report how to install them; they would add ~200 MB to the bundle.
+    "pyarrow",
+    "duckdb",
+]
 
 a = Analysis(
     ['src/nutricli/__main__.py'],
@@ -10,29 +41,40 @@ a = Analysis(
     hookspath=['hooks'],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    excludes=excludes,
     noarchive=False,
-    optimize=0,
+    # Level 1 drops asserts only; level 2 would strip the docstrings that
+    # Typer uses as command help.
+    optimize=1,
 )
 pyz = PYZ(a.pure)
 
-exe = EXE(
-    pyz,
-    a.scripts,
-    a.binaries,
-    a.datas,
-    [],
+exe_options = dict(
     name='nutri',
     debug=False,
     bootloader_ignore_signals=False,
     strip=False,
-    upx=True,
-    upx_exclude=[],
-    runtime_tmpdir=None,
+    # UPX-compressed libraries must be decompressed on every start.
+    upx=False,
     console=True,
     disable_windowed_traceback=False,
     argv_emulation=False,
-    target_arch='arm64',
+    target_arch=target_arch,
     codesign_identity=None,
     entitlements_file=None,
 )
+
+if onefile:
+    exe = EXE(
+        pyz,
+        a.scripts,
+        a.binaries,
+        a.datas,
+        [],
+        upx_exclude=[],
+        runtime_tmpdir=None,
+        **exe_options,
+    )
+else:
+    exe = EXE(pyz, a.scripts, [], exclude_binaries=True, **exe_options)
+    coll = COLLECT(exe, a.binaries, a.datas, strip=False, upx=False, name='nutri')
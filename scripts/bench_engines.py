@@ -0,0 +1,124 @@
+"""Benchmark `query` aggregation on the SQLite and DuckDB engines.
+
+Builds a synthetic database (1M meals over ~5 years by default), runs the
+same range summary (--avg --trend calories --below protein_g) on both
+engines, checks that the results are identical and prints the timings.
+
+    python scripts/bench_engines.py --meals 1000000 --runs 3
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import statistics
+import sys
+import tempfile
+import time
+from datetime import date, timedelta
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "src"))
+
+from nutricli import db, models, queries  # noqa: E402
+
+BATCH = 50_000
+
+
+def build(path: Path, meals: int, days: int, seed: int) -> tuple[str, str]:
+    rng = random.Random(seed)
+    start = date(2021, 1, 1)
+    conn = db.get_connection(path)
+    db.insert_target(conn, date_from=start.isoformat(), calories=2200, protein_g=150)
+    cols = ("date", "day", "time", "meal_type", "description", *models.MACRO_FIELDS)
+    sql = f"INSERT INTO meals ({', '.join(cols)}) VALUES ({', '.join('?' * len(cols))})"
+    batch = []
+    for i in range(meals):
+        d = start + timedelta(days=i * days // meals)
+        batch.append(
+            (
+                d.isoformat(),
+                models.epoch_day(d.isoformat()),
+                f"{rng.randrange(6, 23):02d}:{rng.randrange(60):02d}",
+                rng.choice(models.MEAL_TYPES),
+                "meal",
+                round(rng.uniform(50, 900), 1),
+                round(rng.uniform(0, 60), 1),
+                round(rng.uniform(0, 120), 1),
+                round(rng.uniform(0, 50), 1),
+                round(rng.uniform(0, 15), 1),
+                round(rng.uniform(0, 40), 1),
+                round(rng.uniform(0, 1500), 1),
+            )
+        )
+        if len(batch) >= BATCH:
+            with conn:
+                conn.executemany(sql, batch)
+            batch.clear()
+    with conn:
+        conn.executemany(sql, batch)
+    conn.close()
+    return start.isoformat(), (start + timedelta(days=days)).isoformat()
+
+
+def timed(fn, runs: int) -> tuple[float, object]:
+    result = None
+    times = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = fn()
+        times.append(time.perf_counter() - started)
+    return statistics.median(times), result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--meals", type=int, default=1_000_000)
+    parser.add_argument("--days", type=int, default=5 * 365)
+    parser.add_argument("--runs", type=int, default=3)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--db", help="Reuse or keep the database at this path")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = Path(args.db) if args.db else Path(tmp) / "bench.db"
+        if path.exists():
+            conn = db.get_connection(path)
+            date_from, date_to = conn.execute(
+                "SELECT MIN(date), MAX(date) FROM meals"
+            ).fetchone()
+            conn.close()
+        else:
+            started = time.perf_counter()
+            date_from, date_to = build(path, args.meals, args.days, args.seed)
+            print(
+                f"  built {args.meals} meals in {time.perf_counter() - started:.1f} s"
+            )
+
+        conn = db.get_read_connection(path)
+        results = {}
+        for engine in ("sqlite", "duckdb"):
+            seconds, results[engine] = timed(
+                lambda: queries.range_summary(
+                    conn,
+                    date_from,
+                    date_to,
+                    avg=True,
+                    trend_field="calories",
+                    below_field="protein_g",
+                    engine=engine,
+                ),
+                args.runs,
+            )
+            print(f"  {engine:<7} {seconds * 1000:8.0f} ms (median of {args.runs})")
+        conn.close()
+
+    if results["sqlite"] != results["duckdb"]:
+        print("  results differ between engines", file=sys.stderr)
+        return 1
+    print(f"  identical results over {results['sqlite']['total_meals']} meals")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,78 @@
+"""Startup smoke test for a built nutri binary.
+
+Runs each command once against a fresh HOME and database ("cold": first
+start after the build, including database creation) and then several more
+times ("warm", median reported), and fails if any timing exceeds its budget.
+
+    python scripts/smoke.py dist/nutri/nutri --cold-ms 2000 --warm-ms 600
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+COMMANDS = (
+    ("--help",),
+    ("status", "--format", "json"),
+)
+
+
+def clean_env(home: Path) -> dict[str, str]:
+    # Mirror a user's shell without any Python environment leaking in.
+    return {
+        "PATH": "/usr/bin:/bin:/usr/sbin:/sbin",
+        "HOME": str(home),
+        "PYTHONNOUSERSITE": "1",
+        "NUTRI_DB_PATH": str(home / "nutrition.db"),
+    }
+
+
+def run_once(cmd: list[str], env: dict[str, str]) -> float:
+    start = time.perf_counter()
+    proc = subprocess.run(cmd, env=env, capture_output=True, text=True)
+    elapsed = (time.perf_counter() - start) * 1000
+    if proc.returncode != 0:
+        sys.exit(f"{' '.join(cmd)} failed ({proc.returncode}):\n{proc.stderr}")
+    return elapsed
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument(
+        "binary",
+        help="Command to start, e.g. dist/nutri/nutri or 'python3 dist/nutri.pyz'",
+    )
+    parser.add_argument("--runs", type=int, default=5, help="Warm runs per command")
+    parser.add_argument("--cold-ms", type=float, default=2000.0)
+    parser.add_argument("--warm-ms", type=float, default=600.0)
+    args = parser.parse_args()
+
+    base = [os.path.abspath(p) if os.path.exists(p) else p for p in args.binary.split()]
+    failures = []
+    with tempfile.TemporaryDirectory() as tmp:
+        env = clean_env(Path(tmp))
+        for command in COMMANDS:
+            cmd = [*base, *command]
+            cold = run_once(cmd, env)
+            warm = statistics.median(run_once(cmd, env) for _ in range(args.runs))
+            label = " ".join(command)
+            print(f"  {label:<22} cold {cold:7.0f} ms   warm {warm:7.0f} ms")
+            if cold > args.cold_ms:
+                failures.append(f"{label}: cold {cold:.0f} ms > {args.cold_ms:.0f} ms")
+            if warm > args.warm_ms:
+                failures.append(f"{label}: warm {warm:.0f} ms > {args.warm_ms:.0f} ms")
+
+    for failure in failures:
+        print(f"  over budget: {failure}", file=sys.stderr)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
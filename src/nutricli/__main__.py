@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+import multiprocessing
 import sys
 from pathlib import Path
 
@@ -11,6 +12,8 @@ from nutricli.cli import app
 
 
 def main() -> None:
+    # `nutri fleet` starts worker processes; frozen binaries need this hook.
+    multiprocessing.freeze_support()
     app()
 
 
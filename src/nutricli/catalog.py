@@ -0,0 +1,136 @@
+"""Offline food catalog: CSV import, fuzzy search and portion scaling."""
+
+from __future__ import annotations
+
+import csv
+import sqlite3
+from pathlib import Path
+from typing import Iterable, Iterator
+
+from .db import FOODS_FTS_INSERT_TRIGGER
+from .models import MACRO_FIELDS
+
+IMPORT_BATCH = 5000
+SEARCH_LIMIT = 10
+# Trigram matching needs at least three characters per term.
+MIN_TERM_LENGTH = 3
+
+FOOD_COLUMNS = ("name", "brand", *MACRO_FIELDS)
+
+
+def _parse_amount(value: str | None) -> float:
+    if value is None or not value.strip():
+        return 0.0
+    return float(value.replace(",", "."))
+
+
+def read_foods_csv(path: Path) -> Iterator[tuple]:
+    """Rows from a CSV with a ``name`` column and per-100 g macro columns.
+
+    ``brand`` and any macro column may be missing; missing macros count as 0.
+    """
+    with open(path, newline="", encoding="utf-8-sig") as f:
+        reader = csv.DictReader(f)
+        if not reader.fieldnames or "name" not in reader.fieldnames:
+            raise ValueError(f"{path}: CSV needs a 'name' column.")
+        for line, row in enumerate(reader, start=2):
+            name = (row.get("name") or "").strip()
+            if not name:
+                continue
+            try:
+                macros = [_parse_amount(row.get(f)) for f in MACRO_FIELDS]
+            except ValueError as e:
+                raise ValueError(f"{path}:{line}: {e}") from e
+            yield (name, (row.get("brand") or "").strip() or None, *macros)
+
+
+def import_foods(
+    conn: sqlite3.Connection, rows: Iterable[tuple], replace: bool = False
+) -> int:
+    """Insert catalog rows in batches within one transaction.
+
+    The search index is filled with one set-based insert at the end instead
+    of per row from the trigger, which is several times faster for large
+    catalogs.
+    """
+    cols = ", ".join(FOOD_COLUMNS)
+    marks = ", ".join("?" * len(FOOD_COLUMNS))
+    count = 0
+    batch: list[tuple] = []
+    with conn:
+        # Explicit BEGIN so the trigger swap rolls back with a failed import.
+        conn.execute("BEGIN")
+        if replace:
+            conn.execute("DELETE FROM foods")
+        last_id = conn.execute("SELECT COALESCE(MAX(id), 0) FROM foods").fetchone()[0]
+        conn.execute("DROP TRIGGER trg_foods_insert_fts")
+        for row in rows:
+            batch.append(row)
+            if len(batch) >= IMPORT_BATCH:
+                conn.executemany(f"INSERT INTO foods ({cols}) VALUES ({marks})", batch)
+                count += len(batch)
+                batch.clear()
+        if batch:
+            conn.executemany(f"INSERT INTO foods ({cols}) VALUES ({marks})", batch)
+            count += len(batch)
+        conn.execute(
+            "INSERT INTO foods_fts (rowid, name, brand) "
+            "SELECT id, name, brand FROM foods WHERE id > ?",
+            (last_id,),
+        )
+        conn.execute(FOODS_FTS_INSERT_TRIGGER)
+    return count
+
+
+def _match_expression(query: str) -> str | None:
+    terms = [t for t in query.split() if len(t) >= MIN_TERM_LENGTH]
+    if not terms:
+        return None
+    # Each term is quoted so FTS operators in user input are taken literally.
+    return " ".join('"' + t.replace('"', '""') + '"' for t in terms)
+
+
+def search_foods(
+    conn: sqlite3.Connection, query: str, limit: int = SEARCH_LIMIT
+) -> list[dict]:
+    """Foods whose name or brand contains every term of ``query``, best first.
+
+    Uses the trigram index; queries with only very short terms fall back to a
+    name prefix match.
+    """
+    expr = _match_expression(query)
+    if expr is None:
+        rows = conn.execute(
+            "SELECT * FROM foods WHERE name LIKE ? ORDER BY length(name), id LIMIT ?",
+            (query.strip() + "%", limit),
+        ).fetchall()
+    else:
+        rows = conn.execute(
+            "SELECT foods.* FROM foods_fts JOIN foods ON foods.id = foods_fts.rowid "
+            "WHERE foods_fts MATCH ? ORDER BY bm25(foods_fts), length(foods.name) "
+            "LIMIT ?",
+            (expr, limit),
+        ).fetchall()
+    return [dict(r) for r in rows]
+
+
+def get_food(conn: sqlite3.Connection, food_id: int) -> dict | None:
+    row = conn.execute("SELECT * FROM foods WHERE id = ?", (food_id,)).fetchone()
+    return dict(row) if row else None
+
+
+def resolve_food(conn: sqlite3.Connection, ref: str) -> dict | None:
+    """A catalog id, or the best search hit for a name."""
+    if ref.isdigit():
+        return get_food(conn, int(ref))
+    hits = search_foods(conn, ref, limit=1)
+    return hits[0] if hits else None
+
+
+def scale_macros(per_100g: dict, grams: float) -> dict[str, float]:
+    factor = grams / 100
+    return {f: round((per_100g.get(f) or 0) * factor, 1) for f in MACRO_FIELDS}
+
+
+def count_foods(conn: sqlite3.Connection) -> int:
+    return conn.execute("SELECT COUNT(*) FROM foods").fetchone()[0]
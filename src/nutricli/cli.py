@@ -2,17 +2,48 @@
 
 from __future__ import annotations
 
+import contextlib
 import csv
 import io
+import json
+import os
+import re
+import shlex
+import sqlite3
+import sys
 from enum import Enum
-from typing import Annotated, Optional
+from pathlib import Path
+from typing import Annotated, Callable, NoReturn, Optional
 
 import typer
 
-from . import db, formatters, models, queries
+from . import (
+    catalog,
+    columnar,
+    db,
+    fleet,
+    formatters,
+    metrics,
+    models,
+    products,
+    queries,
+    reports,
+    sync,
+)
+from . import watch as watch_feed
 
 
 app = typer.Typer(help="nutri — Nutrition Tracker CLI", add_completion=False)
+sync_app = typer.Typer(help="Exchange changes with other devices.")
+app.add_typer(sync_app, name="sync")
+food_app = typer.Typer(help="Offline food catalog.")
+app.add_typer(food_app, name="food")
+products_app = typer.Typer(help="Barcode product store.")
+app.add_typer(products_app, name="products")
+fleet_app = typer.Typer(help="Run read-only reports across many databases.")
+app.add_typer(fleet_app, name="fleet")
+nutrients_app = typer.Typer(help="Extra nutrients tracked beside the macros.")
+app.add_typer(nutrients_app, name="nutrients")
 
 
 class OutputFormat(str, Enum):
@@ -23,6 +54,44 @@ class OutputFormat(str, Enum):
 class ExportFormat(str, Enum):
     csv = "csv"
     json = "json"
+    parquet = "parquet"
+    arrow = "arrow"
+
+
+class Partition(str, Enum):
+    month = "month"
+
+
+class WatchFormat(str, Enum):
+    table = "table"
+    ndjson = "ndjson"
+
+
+class MetricsFormat(str, Enum):
+    openmetrics = "openmetrics"
+    json = "json"
+
+
+class Engine(str, Enum):
+    sqlite = "sqlite"
+    duckdb = "duckdb"
+
+
+class ReportFormat(str, Enum):
+    markdown = "markdown"
+    html = "html"
+    json = "json"
+
+
+class OnDuplicate(str, Enum):
+    skip = "skip"
+    warn = "warn"
+    insert = "insert"
+
+
+class BreakdownKey(str, Enum):
+    meal_type = "meal_type"
+    hour = "hour"
 
 
 class MealType(str, Enum):
@@ -44,10 +113,66 @@ class Source(str, Enum):
     barcode = "barcode"
 
 
+@app.callback()
+def _record_metrics(ctx: typer.Context) -> None:
+    # Opt-in via NUTRI_METRICS; `nutri metrics` itself is not recorded, and
+    # neither is the in-memory database (there is no file to keep them by).
+    if (
+        metrics.enabled()
+        and ctx.invoked_subcommand != "metrics"
+        and not db.is_memory_path(db.get_db_path())
+    ):
+        metrics.start_command(ctx.invoked_subcommand or "")
+        ctx.call_on_close(lambda: metrics.finish_command(db.get_db_path()))
+
+
+def _label_subcommand(ctx: typer.Context) -> None:
+    if metrics.enabled():
+        metrics.label_command(f"{ctx.info_name} {ctx.invoked_subcommand}")
+
+
+for _sub_app in (sync_app, food_app, products_app, nutrients_app):
+    _sub_app.callback()(_label_subcommand)
+
+
+# Set by `nutri exec` so every command in a batch reuses one connection.
+_shared_conn: db.SharedConnection | None = None
+
+
 def get_conn():
+    if _shared_conn is not None:
+        return _shared_conn
     return db.get_connection()
 
 
+def get_read_conn():
+    """Read-only connection for commands that never write.
+
+    A database that does not exist yet, or that still needs migrating and
+    can be written, goes through the normal path once so first use and
+    upgrades keep working.
+    """
+    if _shared_conn is not None:
+        return _shared_conn
+    path = db.get_db_path()
+    if not path.exists() or path.stat().st_size == 0:
+        return db.get_connection()
+    try:
+        return db.get_read_connection(path)
+    except db.SchemaError as e:
+        if e.migratable and os.access(path, os.W_OK):
+            return db.get_connection()
+        typer.echo(f"  {path}: {e}", err=True)
+        raise typer.Exit(1)
+    except sqlite3.Error as e:
+        typer.echo(
+            f"  Cannot read {path}: {e}. For a snapshot on read-only media "
+            "set NUTRI_DB_IMMUTABLE=1.",
+            err=True,
+        )
+        raise typer.Exit(1)
+
+
 def parse_date_or_exit(value: str) -> str:
     try:
         return models.parse_iso_date(value)
@@ -56,6 +181,135 @@ def parse_date_or_exit(value: str) -> str:
         raise typer.Exit(1)
 
 
+def meal_not_found_exit(conn, meal_id: int) -> NoReturn:
+    """Exit for an id that is not a live meal; archived meals are read-only."""
+    meal = db.get_meal(conn, meal_id)
+    conn.close()
+    if meal is not None and meal.get("archived"):
+        typer.echo(f"  Meal #{meal_id} is archived and read-only.", err=True)
+    else:
+        typer.echo(f"  Meal #{meal_id} not found.", err=True)
+    raise typer.Exit(1)
+
+
+def nutrient_codes_or_exit(conn, spec: str | None) -> list[str] | None:
+    """Registered codes for a --nutrients value, or None when not asked for."""
+    if spec is None:
+        return None
+    try:
+        return db.resolve_nutrient_codes(conn, spec)
+    except ValueError as e:
+        conn.close()
+        typer.echo(f"  {e}", err=True)
+        raise typer.Exit(1)
+
+
+def nutrient_amounts_or_exit(conn, values: list[str] | None) -> dict:
+    """Parsed and registry-checked --nutrient code=amount values."""
+    if not values:
+        return {}
+    try:
+        amounts = models.parse_nutrient_amounts(values)
+        db.resolve_nutrient_codes(conn, ",".join(amounts))
+    except ValueError as e:
+        conn.close()
+        typer.echo(f"  {e}", err=True)
+        raise typer.Exit(1)
+    return amounts
+
+
+def resolve_range_or_exit(
+    last_spec: str | None,
+    week: bool,
+    offset: int,
+    from_: str | None,
+    to_: str | None,
+) -> tuple[str, str]:
+    """Date range from --last, --week/--offset or --from/--to."""
+    if last_spec:
+        try:
+            return models.parse_duration(last_spec)
+        except ValueError as e:
+            typer.echo(f"  {e}", err=True)
+            raise typer.Exit(1)
+    if week:
+        return models.get_week_range(offset)
+    if from_:
+        return (
+            parse_date_or_exit(from_),
+            parse_date_or_exit(to_) if to_ else models.today_str(),
+        )
+    typer.echo("  Please provide --last, --week, or --from.", err=True)
+    raise typer.Exit(1)
+
+
+def bulk_filters_or_exit(
+    ids: str | None,
+    date_: str | None,
+    from_: str | None,
+    to_: str | None,
+    source: Source | None = None,
+    confidence: Confidence | None = None,
+) -> dict:
+    """Meal filters for bulk commands; at least one filter is required."""
+    filters: dict = {}
+    if ids is not None:
+        try:
+            filters["ids"] = [int(i) for i in ids.split(",") if i.strip()]
+        except ValueError:
+            typer.echo(f"  Invalid --ids: {ids}. Use e.g. 1,2,3.", err=True)
+            raise typer.Exit(1)
+    if date_ is not None and (from_ is not None or to_ is not None):
+        typer.echo("  Use either --date or --from/--to.", err=True)
+        raise typer.Exit(1)
+    if date_ is not None:
+        filters["date_from"] = filters["date_to"] = parse_date_or_exit(date_)
+    if from_ is not None:
+        filters["date_from"] = parse_date_or_exit(from_)
+    if to_ is not None:
+        filters["date_to"] = parse_date_or_exit(to_)
+    if source is not None:
+        filters["source"] = source.value
+    if confidence is not None:
+        filters["confidence"] = confidence.value
+    if not filters or filters.get("ids") == []:
+        typer.echo(
+            "  Provide a meal id or a filter (--ids, --date, --from/--to, ...).",
+            err=True,
+        )
+        raise typer.Exit(1)
+    return filters
+
+
+def run_bulk(
+    action: str,
+    apply: Callable[[sqlite3.Connection], list[int]],
+    filters: dict,
+    dry_run: bool,
+    fmt: OutputFormat,
+    extra: dict | None = None,
+) -> None:
+    """Run a set-based bulk operation (or list its matches with --dry-run)."""
+    conn = get_conn()
+    if dry_run:
+        ids = db.select_meal_ids(conn, **filters)
+    else:
+        ids = apply(conn)
+    conn.close()
+
+    if fmt == OutputFormat.json:
+        result = {action: ids, "count": len(ids), "dry_run": dry_run}
+        typer.echo(formatters.output_json({**result, **(extra or {})}))
+    elif dry_run:
+        typer.echo(
+            f"  Would have {action} {len(ids)} meals: {formatters.format_id_list(ids)}"
+        )
+    else:
+        typer.echo(
+            f"  {action.capitalize()} {len(ids)} meals: {formatters.format_id_list(ids)}"
+        )
+
+
 # ── log ──────────────────────────────────────────────────────────────────────
 
 
@@ -64,54 +318,174 @@ def log(
     meal: Annotated[
         MealType, typer.Option("--meal", case_sensitive=False)
     ] = MealType.snack,
-    desc: Annotated[str, typer.Option("--desc", help="Meal description")] = ...,
-    cal: Annotated[float, typer.Option("--cal", help="Calories")] = ...,
-    protein: Annotated[float, typer.Option("--protein")] = 0,
-    carbs: Annotated[float, typer.Option("--carbs")] = 0,
-    fat: Annotated[float, typer.Option("--fat")] = 0,
-    fiber: Annotated[float, typer.Option("--fiber")] = 0,
-    sugar: Annotated[float, typer.Option("--sugar")] = 0,
-    sodium: Annotated[float, typer.Option("--sodium")] = 0,
+    desc: Annotated[
+        Optional[str], typer.Option("--desc", help="Meal description")
+    ] = None,
+    cal: Annotated[Optional[float], typer.Option("--cal", help="Calories")] = None,
+    protein: Annotated[Optional[float], typer.Option("--protein")] = None,
+    carbs: Annotated[Optional[float], typer.Option("--carbs")] = None,
+    fat: Annotated[Optional[float], typer.Option("--fat")] = None,
+    fiber: Annotated[Optional[float], typer.Option("--fiber")] = None,
+    sugar: Annotated[Optional[float], typer.Option("--sugar")] = None,
+    sodium: Annotated[Optional[float], typer.Option("--sodium")] = None,
+    nutrient: Annotated[
+        Optional[list[str]],
+        typer.Option(
+            "--nutrient",
+            help="Extra nutrient as code=amount, e.g. potassium_mg=420 (repeatable)",
+        ),
+    ] = None,
+    food: Annotated[
+        Optional[str],
+        typer.Option(
+            "--food",
+            help="Catalog food id or name (macros from catalog; --cal etc. override)",
+        ),
+    ] = None,
+    barcode: Annotated[
+        Optional[str],
+        typer.Option(
+            "--barcode",
+            help="Product barcode (macros from product store; --cal etc. override)",
+        ),
+    ] = None,
+    grams: Annotated[
+        Optional[float],
+        typer.Option(
+            "--grams",
+            min=0,
+            help="Portion size for --food/--barcode (default: serving or 100 g)",
+        ),
+    ] = None,
     confidence: Annotated[
         Confidence, typer.Option("--confidence", case_sensitive=False)
     ] = Confidence.medium,
     source: Annotated[
-        Source, typer.Option("--source", case_sensitive=False)
-    ] = Source.manual,
+        Optional[Source],
+        typer.Option(
+            "--source",
+            case_sensitive=False,
+            help="Defaults to barcode with --barcode, else manual",
+        ),
+    ] = None,
     time_: Annotated[Optional[str], typer.Option("--time", help="HH:MM")] = None,
     date_: Annotated[Optional[str], typer.Option("--date", help="YYYY-MM-DD")] = None,
+    on_duplicate: Annotated[
+        OnDuplicate,
+        typer.Option(
+            "--on-duplicate",
+            case_sensitive=False,
+            help="When a near-identical meal is already logged that day",
+        ),
+    ] = OnDuplicate.warn,
+    duplicate_window: Annotated[
+        int,
+        typer.Option(
+            "--duplicate-window",
+            min=0,
+            help="Minutes between meal times that still count as a duplicate",
+        ),
+    ] = models.DUPLICATE_WINDOW_MIN,
     fmt: Annotated[
         OutputFormat, typer.Option("--format", case_sensitive=False)
     ] = OutputFormat.table,
 ):
     """Log a meal."""
 
+    if food is not None and barcode is not None:
+        typer.echo("  Use either --food or --barcode, not both.", err=True)
+        raise typer.Exit(1)
+    if food is None and barcode is None and (desc is None or cal is None):
+        typer.echo("  Provide --desc and --cal, or --food / --barcode.", err=True)
+        raise typer.Exit(1)
+
+    d = parse_date_or_exit(date_) if date_ else models.today_str()
     conn = get_conn()
-    d = date_ or models.today_str()
+    amounts = nutrient_amounts_or_exit(conn, nutrient)
     t = time_ or models.now_time_str()
-    meal_id = db.insert_meal(
+    # Macros given on the command line win over catalog or product values.
+    given = {
+        k: v
+        for k, v in {
+            "calories": cal,
+            "protein_g": protein,
+            "carbs_g": carbs,
+            "fat_g": fat,
+            "fiber_g": fiber,
+            "sugar_g": sugar,
+            "sodium_mg": sodium,
+        }.items()
+        if v is not None
+    }
+    macros = {**dict.fromkeys(models.MACRO_FIELDS, 0.0), **given}
+    extra: dict = {}
+    if food is not None:
+        item = catalog.resolve_food(conn, food)
+        if item is None:
+            conn.close()
+            typer.echo(f"  No catalog food matches: {food}", err=True)
+            raise typer.Exit(1)
+        grams = 100 if grams is None else grams
+        macros = {**catalog.scale_macros(item, grams), **given}
+        desc = desc or f"{item['name']} ({grams:g} g)"
+        extra["food_id"] = item["id"]
+    elif barcode is not None:
+        product = products.get_product(conn, barcode)
+        if product is None:
+            conn.close()
+            typer.echo(f"  Unknown barcode: {barcode}", err=True)
+            raise typer.Exit(1)
+        if grams is None:
+            grams = product["serving_g"] or 100
+        macros = {**catalog.scale_macros(product, grams), **given}
+        desc = desc or f"{product['name'] or product['barcode']} ({grams:g} g)"
+        extra["barcode"] = product["barcode"]
+        source = source or Source.barcode
+    meal_id, duplicate = db.insert_meal_checked(
         conn,
+        on_duplicate.value,
+        window=duplicate_window,
         date=d,
         time=t,
         meal_type=meal.value,
         description=desc,
-        calories=cal,
-        protein_g=protein,
-        carbs_g=carbs,
-        fat_g=fat,
-        fiber_g=fiber,
-        sugar_g=sugar,
-        sodium_mg=sodium,
+        **macros,
         confidence=confidence.value,
-        source=source.value,
+        source=(source or Source.manual).value,
+        **extra,
     )
+    if meal_id is None:
+        conn.close()
+        if fmt == OutputFormat.json:
+            typer.echo(
+                formatters.output_json(
+                    {
+                        "skipped": True,
+                        "duplicate_of": duplicate["id"],
+                        "meal": duplicate,
+                    }
+                )
+            )
+        else:
+            typer.echo(
+                f"  Skipped: already logged as meal #{duplicate['id']} "
+                f"({duplicate['description']}, {duplicate['calories']:.0f} kcal)"
+            )
+        return
+    if amounts:
+        db.set_meal_nutrients(conn, meal_id, amounts)
     result = db.get_meal(conn, meal_id)
+    if amounts:
+        result["nutrients"] = db.get_meal_nutrients(conn, meal_id)
     conn.close()
+    if duplicate:
+        result["duplicate_of"] = duplicate["id"]
+        typer.echo(f"  Possible duplicate of meal #{duplicate['id']}.", err=True)
 
     if fmt == OutputFormat.json:
         typer.echo(formatters.output_json(result))
     else:
-        typer.echo(f"  Meal #{meal_id} logged: {desc} ({cal:.0f} kcal)")
+        typer.echo(f"  Meal #{meal_id} logged: {desc} ({result['calories']:.0f} kcal)")
 
 
 # ── edit ─────────────────────────────────────────────────────────────────────
@@ -119,7 +493,7 @@ def log(
 
 @app.command()
 def edit(
-    meal_id: Annotated[int, typer.Argument()],
+    meal_id: Annotated[Optional[int], typer.Argument()] = None,
     desc: Annotated[Optional[str], typer.Option("--desc")] = None,
     cal: Annotated[Optional[float], typer.Option("--cal")] = None,
     protein: Annotated[Optional[float], typer.Option("--protein")] = None,
@@ -128,19 +502,44 @@ def edit(
     fiber: Annotated[Optional[float], typer.Option("--fiber")] = None,
     sugar: Annotated[Optional[float], typer.Option("--sugar")] = None,
     sodium: Annotated[Optional[float], typer.Option("--sodium")] = None,
+    nutrient: Annotated[
+        Optional[list[str]],
+        typer.Option(
+            "--nutrient",
+            help="Extra nutrient as code=amount, e.g. potassium_mg=420 ; code= removes it",
+        ),
+    ] = None,
     meal: Annotated[
         Optional[MealType], typer.Option("--meal", case_sensitive=False)
     ] = None,
     confidence: Annotated[
         Optional[Confidence], typer.Option("--confidence", case_sensitive=False)
     ] = None,
+    ids: Annotated[
+        Optional[str], typer.Option("--ids", help="Bulk: comma-separated meal ids")
+    ] = None,
+    date_: Annotated[
+        Optional[str], typer.Option("--date", help="Bulk: meals on YYYY-MM-DD")
+    ] = None,
+    from_: Annotated[
+        Optional[str], typer.Option("--from", help="Bulk: start date YYYY-MM-DD")
+    ] = None,
+    to_: Annotated[
+        Optional[str], typer.Option("--to", help="Bulk: end date YYYY-MM-DD")
+    ] = None,
+    source: Annotated[
+        Optional[Source],
+        typer.Option("--source", case_sensitive=False, help="Bulk: meals from source"),
+    ] = None,
+    dry_run: Annotated[
+        bool, typer.Option("--dry-run", help="Bulk: only list matching meals")
+    ] = False,
     fmt: Annotated[
         OutputFormat, typer.Option("--format", case_sensitive=False)
     ] = OutputFormat.table,
 ):
-    """Edit an existing meal."""
+    """Edit an existing meal, or all meals matching a filter."""
 
-    conn = get_conn()
     updates: dict[str, object] = {}
     if desc is not None:
         updates["description"] = desc
@@ -163,18 +562,40 @@ def edit(
     if confidence is not None:
         updates["confidence"] = confidence.value
 
-    if not updates:
+    if not updates and not nutrient:
         typer.echo("  No changes provided.", err=True)
-        conn.close()
         raise typer.Exit(1)
 
-    ok = db.update_meal(conn, meal_id, **updates)
+    if meal_id is None:
+        if nutrient:
+            typer.echo("  --nutrient needs a meal id.", err=True)
+            raise typer.Exit(1)
+        filters = bulk_filters_or_exit(ids, date_, from_, to_, source)
+        run_bulk(
+            "updated",
+            lambda conn: db.update_meals(conn, updates, **filters),
+            filters,
+            dry_run,
+            fmt,
+            extra={"changes": updates},
+        )
+        return
+
+    conn = get_conn()
+    amounts = nutrient_amounts_or_exit(conn, nutrient)
+    if updates:
+        ok = db.update_meal(conn, meal_id, **updates)
+    else:
+        meal = db.get_meal(conn, meal_id)
+        ok = meal is not None and not meal.get("archived")
     if not ok:
-        typer.echo(f"  Meal #{meal_id} not found.", err=True)
-        conn.close()
-        raise typer.Exit(1)
+        meal_not_found_exit(conn, meal_id)
+    if amounts:
+        db.set_meal_nutrients(conn, meal_id, amounts)
 
     result = db.get_meal(conn, meal_id)
+    if amounts:
+        result["nutrients"] = db.get_meal_nutrients(conn, meal_id)
     conn.close()
 
     if fmt == OutputFormat.json:
@@ -188,22 +609,55 @@ def edit(
 
 @app.command()
 def delete(
-    meal_id: Annotated[int, typer.Argument()],
+    meal_id: Annotated[Optional[int], typer.Argument()] = None,
+    ids: Annotated[
+        Optional[str], typer.Option("--ids", help="Bulk: comma-separated meal ids")
+    ] = None,
+    date_: Annotated[
+        Optional[str], typer.Option("--date", help="Bulk: meals on YYYY-MM-DD")
+    ] = None,
+    from_: Annotated[
+        Optional[str], typer.Option("--from", help="Bulk: start date YYYY-MM-DD")
+    ] = None,
+    to_: Annotated[
+        Optional[str], typer.Option("--to", help="Bulk: end date YYYY-MM-DD")
+    ] = None,
+    source: Annotated[
+        Optional[Source],
+        typer.Option("--source", case_sensitive=False, help="Bulk: meals from source"),
+    ] = None,
+    confidence: Annotated[
+        Optional[Confidence],
+        typer.Option(
+            "--confidence", case_sensitive=False, help="Bulk: meals with confidence"
+        ),
+    ] = None,
+    dry_run: Annotated[
+        bool, typer.Option("--dry-run", help="Bulk: only list matching meals")
+    ] = False,
     fmt: Annotated[
         OutputFormat, typer.Option("--format", case_sensitive=False)
     ] = OutputFormat.table,
 ):
-    """Delete a meal."""
+    """Delete a meal, or all meals matching a filter."""
+
+    if meal_id is None:
+        filters = bulk_filters_or_exit(ids, date_, from_, to_, source, confidence)
+        run_bulk(
+            "deleted",
+            lambda conn: db.delete_meals(conn, **filters),
+            filters,
+            dry_run,
+            fmt,
+        )
+        return
 
     conn = get_conn()
     meal = db.get_meal(conn, meal_id)
-    ok = db.delete_meal(conn, meal_id)
+    if not db.delete_meal(conn, meal_id):
+        meal_not_found_exit(conn, meal_id)
     conn.close()
 
-    if not ok:
-        typer.echo(f"  Meal #{meal_id} not found.", err=True)
-        raise typer.Exit(1)
-
     if fmt == OutputFormat.json:
         typer.echo(formatters.output_json({"deleted": meal_id, "meal": meal}))
     else:
@@ -215,40 +669,131 @@ def delete(
 
 @app.command()
 def confirm(
-    meal_id: Annotated[int, typer.Argument()],
+    meal_id: Annotated[Optional[int], typer.Argument()] = None,
+    ids: Annotated[
+        Optional[str], typer.Option("--ids", help="Bulk: comma-separated meal ids")
+    ] = None,
+    date_: Annotated[
+        Optional[str], typer.Option("--date", help="Bulk: meals on YYYY-MM-DD")
+    ] = None,
+    from_: Annotated[
+        Optional[str], typer.Option("--from", help="Bulk: start date YYYY-MM-DD")
+    ] = None,
+    to_: Annotated[
+        Optional[str], typer.Option("--to", help="Bulk: end date YYYY-MM-DD")
+    ] = None,
+    source: Annotated[
+        Optional[Source],
+        typer.Option("--source", case_sensitive=False, help="Bulk: meals from source"),
+    ] = None,
+    confidence: Annotated[
+        Optional[Confidence],
+        typer.Option(
+            "--confidence", case_sensitive=False, help="Bulk: meals with confidence"
+        ),
+    ] = None,
+    dry_run: Annotated[
+        bool, typer.Option("--dry-run", help="Bulk: only list matching meals")
+    ] = False,
     fmt: Annotated[
         OutputFormat, typer.Option("--format", case_sensitive=False)
     ] = OutputFormat.table,
 ):
-    """Confirm a meal (mark as user-verified)."""
+    """Confirm a meal (mark as user-verified), or all unconfirmed meals matching a filter."""
+
+    if meal_id is None:
+        filters = bulk_filters_or_exit(ids, date_, from_, to_, source, confidence)
+        filters["unconfirmed"] = True
+        run_bulk(
+            "confirmed",
+            lambda conn: db.update_meals(conn, {"confirmed": 1}, **filters),
+            filters,
+            dry_run,
+            fmt,
+        )
+        return
 
     conn = get_conn()
-    ok = db.confirm_meal(conn, meal_id)
+    if not db.confirm_meal(conn, meal_id):
+        meal_not_found_exit(conn, meal_id)
     conn.close()
 
-    if not ok:
-        typer.echo(f"  Meal #{meal_id} not found.", err=True)
-        raise typer.Exit(1)
-
     if fmt == OutputFormat.json:
         typer.echo(formatters.output_json({"confirmed": meal_id}))
     else:
         typer.echo(f"  Meal #{meal_id} confirmed.")
 
 
+# ── dedupe ───────────────────────────────────────────────────────────────────
+
+
+@app.command()
+def dedupe(
+    from_: Annotated[str, typer.Option("--from", help="Start date YYYY-MM-DD")] = ...,
+    to_: Annotated[
+        Optional[str], typer.Option("--to", help="End date YYYY-MM-DD")
+    ] = None,
+    window: Annotated[
+        int,
+        typer.Option("--window", min=0, help="Max minutes between duplicate meals"),
+    ] = models.DUPLICATE_WINDOW_MIN,
+    tolerance: Annotated[
+        float,
+        typer.Option(
+            "--tolerance", min=0, max=1, help="Max calorie difference as a fraction"
+        ),
+    ] = models.DUPLICATE_CAL_TOLERANCE,
+    dry_run: Annotated[
+        bool, typer.Option("--dry-run", help="Only list the duplicates")
+    ] = False,
+    fmt: Annotated[
+        OutputFormat, typer.Option("--format", case_sensitive=False)
+    ] = OutputFormat.table,
+):
+    """Delete near-duplicate meals in a date range, keeping the earliest."""
+
+    date_from = parse_date_or_exit(from_)
+    date_to = parse_date_or_exit(to_) if to_ else models.today_str()
+    conn = get_read_conn()
+    duplicates = db.find_duplicate_meals(conn, date_from, date_to, window, tolerance)
+    conn.close()
+    ids = list(duplicates)
+    run_bulk(
+        "deleted",
+        lambda conn: db.delete_meals(conn, ids=ids),
+        {"ids": ids},
+        dry_run,
+        fmt,
+        extra={"duplicate_of": duplicates},
+    )
+
+
 # ── today ────────────────────────────────────────────────────────────────────
 
 
 @app.command()
 def today(
+    nutrients: Annotated[
+        Optional[str],
+        typer.Option(
+            "--nutrients",
+            help="Include extra nutrients: comma-separated codes or 'all'",
+        ),
+    ] = None,
     fmt: Annotated[
         OutputFormat, typer.Option("--format", case_sensitive=False)
     ] = OutputFormat.table,
 ):
     """Show today's meals and totals."""
 
-    conn = get_conn()
-    summary = queries.day_summary(conn, models.today_str())
+    conn = get_read_conn()
+    codes = nutrient_codes_or_exit(conn, nutrients)
+    summary = queries.day_summary(
+        conn,
+        models.today_str(),
+        water_entries=fmt == OutputFormat.json,
+        nutrients=codes,
+    )
     conn.close()
 
     if fmt == OutputFormat.json:
@@ -263,6 +808,13 @@ def today(
 @app.command()
 def day(
     date: Annotated[str, typer.Argument(help="YYYY-MM-DD")],
+    nutrients: Annotated[
+        Optional[str],
+        typer.Option(
+            "--nutrients",
+            help="Include extra nutrients: comma-separated codes or 'all'",
+        ),
+    ] = None,
     fmt: Annotated[
         OutputFormat, typer.Option("--format", case_sensitive=False)
     ] = OutputFormat.table,
@@ -270,8 +822,11 @@ def day(
     """Show meals and totals for a specific date (YYYY-MM-DD)."""
 
     date = parse_date_or_exit(date)
-    conn = get_conn()
-    summary = queries.day_summary(conn, date)
+    conn = get_read_conn()
+    codes = nutrient_codes_or_exit(conn, nutrients)
+    summary = queries.day_summary(
+        conn, date, water_entries=fmt == OutputFormat.json, nutrients=codes
+    )
     conn.close()
 
     if fmt == OutputFormat.json:
@@ -309,32 +864,77 @@ def query(
             "--below", help="Show days below target for field (e.g. protein_g)"
         ),
     ] = None,
+    percentiles: Annotated[
+        bool,
+        typer.Option(
+            "--percentiles",
+            help="Show daily percentiles, meal-size histogram and target adherence",
+        ),
+    ] = False,
+    by: Annotated[
+        Optional[BreakdownKey],
+        typer.Option(
+            "--by", case_sensitive=False, help="Break down by meal_type or hour"
+        ),
+    ] = None,
+    between: Annotated[
+        Optional[tuple[str, str]],
+        typer.Option(
+            "--between",
+            help="Break down only meals between HH:MM HH:MM (totals cover whole days)",
+        ),
+    ] = None,
+    engine: Annotated[
+        Engine,
+        typer.Option(
+            "--engine",
+            case_sensitive=False,
+            help="Aggregation engine; duckdb needs the optional duckdb package",
+        ),
+    ] = Engine.sqlite,
+    nutrients: Annotated[
+        Optional[str],
+        typer.Option(
+            "--nutrients",
+            help="Include extra nutrients: comma-separated codes or 'all'",
+        ),
+    ] = None,
     fmt: Annotated[
         OutputFormat, typer.Option("--format", case_sensitive=False)
     ] = OutputFormat.table,
 ):
     """Query meal data over a date range."""
 
-    if last_spec:
+    window = None
+    if between:
         try:
-            date_from, date_to = models.parse_duration(last_spec)
+            window = (models.parse_hhmm(between[0]), models.parse_hhmm(between[1]))
         except ValueError as e:
             typer.echo(f"  {e}", err=True)
             raise typer.Exit(1)
-    elif week:
-        date_from, date_to = models.get_week_range(offset)
-    elif from_:
-        date_from = from_
-        date_to = to_ or models.today_str()
-    else:
-        typer.echo("  Please provide --last, --week, or --from.", err=True)
-        raise typer.Exit(1)
 
-    conn = get_conn()
-    result = queries.range_summary(
-        conn, date_from, date_to, avg=avg, trend_field=trend, below_field=below
-    )
-    conn.close()
+    date_from, date_to = resolve_range_or_exit(last_spec, week, offset, from_, to_)
+    conn = get_read_conn()
+    codes = nutrient_codes_or_exit(conn, nutrients)
+    try:
+        result = queries.range_summary(
+            conn,
+            date_from,
+            date_to,
+            avg=avg,
+            trend_field=trend,
+            below_field=below,
+            percentiles=percentiles,
+            by=by.value if by else None,
+            between=window,
+            engine=engine.value,
+            nutrients=codes,
+        )
+    except RuntimeError as e:
+        typer.echo(f"  {e}", err=True)
+        raise typer.Exit(1)
+    finally:
+        conn.close()
 
     if fmt == OutputFormat.json:
         typer.echo(formatters.output_json(result))
@@ -342,13 +942,191 @@ def query(
         typer.echo(formatters.format_range_table(result))
 
 
-# ── target ───────────────────────────────────────────────────────────────────
+# ── streaks / adherence ──────────────────────────────────────────────────────
+
+
+ADHERENCE_FIELDS = ("calories", "protein_g")
+
+
+def target_fields_or_exit(fields: list[str] | None) -> list[str]:
+    fields = fields or list(ADHERENCE_FIELDS)
+    unknown = [f for f in fields if f not in db.TARGET_FIELDS]
+    if unknown:
+        typer.echo(
+            f"  No targets for: {', '.join(unknown)}. "
+            f"Use one of {', '.join(db.TARGET_FIELDS)}.",
+            err=True,
+        )
+        raise typer.Exit(1)
+    return list(dict.fromkeys(fields))
 
 
 @app.command()
-def target(
-    cal: Annotated[
-        Optional[float], typer.Option("--cal", help="Calorie target")
+def streaks(
+    field: Annotated[
+        Optional[list[str]],
+        typer.Option(
+            "--field", help="Target field (repeatable; default calories, protein_g)"
+        ),
+    ] = None,
+    date_: Annotated[
+        Optional[str], typer.Option("--date", help="As of YYYY-MM-DD (default today)")
+    ] = None,
+    tolerance: Annotated[
+        float,
+        typer.Option(
+            "--tolerance", min=0, max=1, help="Calorie tolerance as a fraction"
+        ),
+    ] = queries.TARGET_TOLERANCE,
+    fmt: Annotated[
+        OutputFormat, typer.Option("--format", case_sensitive=False)
+    ] = OutputFormat.table,
+):
+    """Current and longest streaks of days hitting the target."""
+
+    fields = target_fields_or_exit(field)
+    date = parse_date_or_exit(date_) if date_ else models.today_str()
+    conn = get_read_conn()
+    result = queries.streaks_summary(conn, fields, date, tolerance)
+    conn.close()
+
+    if fmt == OutputFormat.json:
+        typer.echo(formatters.output_json(result))
+    else:
+        typer.echo(formatters.format_streaks_table(result))
+
+
+@app.command()
+def adherence(
+    last_spec: Annotated[
+        Optional[str],
+        typer.Option("--last", help="Duration, e.g. 30d (default 90d)"),
+    ] = None,
+    week: Annotated[bool, typer.Option("--week", help="Current week")] = False,
+    offset: Annotated[
+        int, typer.Option("--offset", help="Week offset (e.g. -1 for last week)")
+    ] = 0,
+    from_: Annotated[
+        Optional[str], typer.Option("--from", help="Start date YYYY-MM-DD")
+    ] = None,
+    to_: Annotated[
+        Optional[str], typer.Option("--to", help="End date YYYY-MM-DD")
+    ] = None,
+    field: Annotated[
+        Optional[list[str]],
+        typer.Option(
+            "--field", help="Target field (repeatable; default calories, protein_g)"
+        ),
+    ] = None,
+    tolerance: Annotated[
+        float,
+        typer.Option(
+            "--tolerance", min=0, max=1, help="Calorie tolerance as a fraction"
+        ),
+    ] = queries.TARGET_TOLERANCE,
+    fmt: Annotated[
+        OutputFormat, typer.Option("--format", case_sensitive=False)
+    ] = OutputFormat.table,
+):
+    """Share of tracked days that hit the target."""
+
+    fields = target_fields_or_exit(field)
+    if not (last_spec or week or from_):
+        last_spec = "90d"
+    date_from, date_to = resolve_range_or_exit(last_spec, week, offset, from_, to_)
+    conn = get_read_conn()
+    result = queries.adherence_summary(conn, fields, date_from, date_to, tolerance)
+    conn.close()
+
+    if fmt == OutputFormat.json:
+        typer.echo(formatters.output_json(result))
+    else:
+        typer.echo(formatters.format_adherence_table(result))
+
+
+@app.command()
+def report(
+    weekly: Annotated[
+        bool, typer.Option("--weekly", help="One report per ISO week")
+    ] = False,
+    monthly: Annotated[
+        bool, typer.Option("--monthly", help="One report per calendar month")
+    ] = False,
+    all_: Annotated[
+        bool, typer.Option("--all", help="Every period since the first entry")
+    ] = False,
+    last_spec: Annotated[
+        Optional[str], typer.Option("--last", help="Duration, e.g. 90d")
+    ] = None,
+    from_: Annotated[
+        Optional[str], typer.Option("--from", help="Start date YYYY-MM-DD")
+    ] = None,
+    to_: Annotated[
+        Optional[str], typer.Option("--to", help="End date YYYY-MM-DD")
+    ] = None,
+    output: Annotated[
+        Path, typer.Option("-o", "--output", help="Directory for the report files")
+    ] = Path("reports"),
+    fmt: Annotated[
+        ReportFormat, typer.Option("--format", case_sensitive=False)
+    ] = ReportFormat.markdown,
+    jobs: Annotated[
+        Optional[int],
+        typer.Option("--jobs", "-j", min=1, help="Render and write threads"),
+    ] = None,
+    force: Annotated[
+        bool, typer.Option("--force", help="Rewrite reports even if unchanged")
+    ] = False,
+    tolerance: Annotated[
+        float,
+        typer.Option(
+            "--tolerance", min=0, max=1, help="Calorie tolerance as a fraction"
+        ),
+    ] = queries.TARGET_TOLERANCE,
+):
+    """Write one report file per week or month, skipping unchanged ones."""
+
+    if weekly == monthly:
+        typer.echo("  Please choose one of --weekly or --monthly.", err=True)
+        raise typer.Exit(1)
+    period = "week" if weekly else "month"
+    if not (all_ or last_spec or from_):
+        typer.echo("  Please provide --all, --last, or --from.", err=True)
+        raise typer.Exit(1)
+
+    conn = get_read_conn()
+    if all_:
+        span = db.get_tracked_span(conn)
+        if span is None:
+            conn.close()
+            typer.echo("  Nothing logged yet.")
+            return
+        date_from, date_to = span
+    else:
+        date_from, date_to = resolve_range_or_exit(last_spec, False, 0, from_, to_)
+    summaries = reports.collect(conn, period, date_from, date_to, tolerance)
+    conn.close()
+
+    try:
+        result = reports.write_reports(
+            summaries, output, fmt.value, jobs=jobs, force=force
+        )
+    except OSError as e:
+        typer.echo(f"  Cannot write reports to {output}: {e}", err=True)
+        raise typer.Exit(1)
+    typer.echo(
+        f"  Reports: {len(result['written'])} written, "
+        f"{result['unchanged']} unchanged -> {result['output']}"
+    )
+
+
+# ── target ───────────────────────────────────────────────────────────────────
+
+
+@app.command()
+def target(
+    cal: Annotated[
+        Optional[float], typer.Option("--cal", help="Calorie target")
     ] = None,
     protein: Annotated[Optional[float], typer.Option("--protein")] = None,
     carbs: Annotated[Optional[float], typer.Option("--carbs")] = None,
@@ -367,6 +1145,7 @@ def target(
 ):
     """Set or show nutrition targets."""
 
+    d = parse_date_or_exit(date_) if date_ else models.today_str()
     conn = get_conn()
 
     if show:
@@ -383,7 +1162,6 @@ def target(
         conn.close()
         raise typer.Exit(1)
 
-    d = date_ or models.today_str()
     target_id = db.insert_target(
         conn,
         date_from=d,
@@ -427,8 +1205,8 @@ def water(
 ):
     """Log or show water intake (in ml)."""
 
+    d = parse_date_or_exit(date_) if date_ else models.today_str()
     conn = get_conn()
-    d = date_ or models.today_str()
 
     if show_today or amount is None:
         entries = db.get_water_by_date(conn, d)
@@ -447,8 +1225,7 @@ def water(
 
     t = time_ or models.now_time_str()
     water_id = db.insert_water(conn, date=d, time=t, amount_ml=amount)
-    entries = db.get_water_by_date(conn, d)
-    total = sum(w["amount_ml"] for w in entries)
+    total = db.get_water_total(conn, d)
     conn.close()
 
     if fmt == OutputFormat.json:
@@ -473,8 +1250,8 @@ def status(
 ):
     """Quick status summary (for coach)."""
 
-    conn = get_conn()
-    d = date_ or models.today_str()
+    d = parse_date_or_exit(date_) if date_ else models.today_str()
+    conn = get_read_conn()
     result = queries.status_summary(conn, d)
     conn.close()
 
@@ -489,14 +1266,23 @@ def status(
 
 @app.command()
 def info(
+    exact: Annotated[
+        bool,
+        typer.Option("--exact", help="Recount rows instead of reading the counters"),
+    ] = False,
+    sizes: Annotated[
+        bool,
+        typer.Option("--sizes", help="Add per table/index sizes (reads every page)"),
+    ] = False,
     fmt: Annotated[
         OutputFormat, typer.Option("--format", case_sensitive=False)
     ] = OutputFormat.table,
 ):
     """Show database info and stats."""
 
-    conn = get_conn()
-    stats = db.get_db_stats(conn)
+    conn = get_read_conn()
+    stats = db.get_db_stats(conn, exact=exact)
+    stats["storage"] = db.get_storage_stats(conn, objects=sizes)
     conn.close()
 
     if fmt == OutputFormat.json:
@@ -505,9 +1291,805 @@ def info(
         typer.echo(formatters.format_info_table(stats))
 
 
+# ── metrics ──────────────────────────────────────────────────────────────────
+
+
+@app.command("metrics")
+def metrics_(
+    fmt: Annotated[
+        MetricsFormat, typer.Option("--format", case_sensitive=False)
+    ] = MetricsFormat.openmetrics,
+    reset: Annotated[
+        bool, typer.Option("--reset", help="Delete all recorded metrics")
+    ] = False,
+):
+    """Show command metrics recorded with NUTRI_METRICS=1."""
+
+    path = metrics.metrics_path(db.get_db_path().expanduser())
+    if reset:
+        metrics.reset(path)
+        typer.echo(f"  Metrics reset: {path}")
+        return
+    data = metrics.load(path)
+    if fmt == MetricsFormat.json:
+        typer.echo(
+            formatters.output_json(
+                {
+                    "enabled": metrics.enabled(),
+                    "store": str(path),
+                    **metrics.to_json(data),
+                }
+            )
+        )
+    else:
+        typer.echo(metrics.to_openmetrics(data))
+
+
+# ── migrate ──────────────────────────────────────────────────────────────────
+
+
+@app.command()
+def migrate(
+    dry_run: Annotated[
+        bool, typer.Option("--dry-run", help="Only show what would be migrated")
+    ] = False,
+    estimate: Annotated[
+        bool, typer.Option("--estimate", help="Predict duration from row counts")
+    ] = False,
+    batch: Annotated[
+        int, typer.Option("--batch", min=1, help="Rows per backfill transaction")
+    ] = db.BACKFILL_BATCH,
+    fmt: Annotated[
+        OutputFormat, typer.Option("--format", case_sensitive=False)
+    ] = OutputFormat.table,
+):
+    """Apply schema migrations and batched backfills (resumable)."""
+
+    conn = db.get_connection(migrate=False)
+    plan = db.estimate_migration(conn)
+    if not estimate:
+        for w in plan["backfills"]:
+            del w["seconds"]
+        del plan["estimated_seconds"]
+    if dry_run:
+        conn.close()
+        if fmt == OutputFormat.json:
+            typer.echo(formatters.output_json(plan))
+        else:
+            typer.echo(formatters.format_migration_plan(plan))
+        return
+
+    def on_version(version: int) -> None:
+        if fmt == OutputFormat.table:
+            typer.echo(f"  Schema v{version} applied", err=True)
+
+    def on_batch(state: dict) -> None:
+        if fmt == OutputFormat.table:
+            typer.echo(
+                f"  {state['name']}: {state['last_id']}/{state['max_id']} ids, {state['rows']} rows",
+                err=True,
+            )
+
+    if estimate and fmt == OutputFormat.table:
+        typer.echo(formatters.format_migration_plan(plan))
+    try:
+        applied = db.migrate_schema(conn, progress=on_version)
+        finished = db.run_backfills(conn, batch_size=batch, progress=on_batch)
+    except (RuntimeError, sqlite3.Error) as e:
+        typer.echo(f"  Migration failed: {e}", err=True)
+        raise typer.Exit(1)
+    finally:
+        conn.close()
+
+    result = {
+        **plan,
+        "applied_versions": applied,
+        "backfills_finished": [b["name"] for b in finished],
+    }
+    if fmt == OutputFormat.json:
+        typer.echo(formatters.output_json(result))
+    elif not applied and not finished:
+        typer.echo(f"  Schema is up to date (v{db.SCHEMA_VERSION}).")
+    else:
+        typer.echo(
+            f"  Migrated to v{db.SCHEMA_VERSION}: {len(applied)} schema versions, {len(finished)} backfills"
+        )
+
+
+# ── maintenance ──────────────────────────────────────────────────────────────
+
+
+@app.command()
+def maintenance(
+    archive_before: Annotated[
+        Optional[str],
+        typer.Option(
+            "--archive-before",
+            help="Move meals before YYYY-MM-DD into the archive DB",
+        ),
+    ] = None,
+    vacuum_pages: Annotated[
+        Optional[int],
+        typer.Option("--vacuum-pages", help="Max free pages to reclaim (default: all)"),
+    ] = None,
+    fmt: Annotated[
+        OutputFormat, typer.Option("--format", case_sensitive=False)
+    ] = OutputFormat.table,
+):
+    """Checkpoint the WAL, refresh statistics, vacuum and archive old meals."""
+
+    cutoff = parse_date_or_exit(archive_before) if archive_before else None
+    conn = get_conn()
+    result: dict = {"before": db.get_file_sizes(conn)}
+    if cutoff:
+        result["archived"] = db.archive_meals_before(conn, cutoff)
+    result["optimize"] = db.optimize_db(conn)
+    result["change_log_compacted"] = sync.compact_change_log(conn)
+    result["vacuum"] = db.vacuum_db(conn, vacuum_pages)
+    result["checkpoint"] = db.checkpoint_wal(conn)
+    result["after"] = db.get_file_sizes(conn)
+    conn.close()
+
+    if fmt == OutputFormat.json:
+        typer.echo(formatters.output_json(result))
+    else:
+        typer.echo(formatters.format_maintenance_table(result))
+
+
+# ── backup / restore ─────────────────────────────────────────────────────────
+
+
+@app.command()
+def backup(
+    dest: Annotated[str, typer.Argument(help="Backup file or directory")],
+    pages: Annotated[
+        int, typer.Option("--pages", help="Pages copied per step")
+    ] = db.BACKUP_PAGES,
+    sleep: Annotated[
+        float, typer.Option("--sleep", help="Seconds to pause between steps")
+    ] = db.BACKUP_SLEEP,
+    vacuum_into: Annotated[
+        bool, typer.Option("--vacuum-into", help="Write a compacted snapshot")
+    ] = False,
+    keep: Annotated[
+        Optional[int],
+        typer.Option("--keep", help="Keep only the newest N backups in a directory"),
+    ] = None,
+    fmt: Annotated[
+        OutputFormat, typer.Option("--format", case_sensitive=False)
+    ] = OutputFormat.table,
+):
+    """Back up the database (meals, targets and water) while it is in use."""
+
+    conn = get_conn()
+    target_path = Path(dest).expanduser()
+    into_dir = target_path.is_dir() or dest.endswith(("/", os.sep))
+    if into_dir:
+        target_path = target_path / db.backup_file_name(conn)
+    try:
+        result = db.backup_db(
+            conn, target_path, pages=pages, sleep=sleep, vacuum_into=vacuum_into
+        )
+    except (RuntimeError, sqlite3.Error) as e:
+        typer.echo(f"  {e}", err=True)
+        raise typer.Exit(1)
+    finally:
+        main_path = db.get_main_db_path(conn) or db.get_db_path()
+        conn.close()
+    if into_dir and keep is not None:
+        result["removed"] = db.prune_backups(target_path.parent, main_path.stem, keep)
+
+    if fmt == OutputFormat.json:
+        typer.echo(formatters.output_json(result))
+    else:
+        typer.echo(
+            f"  Backup written: {result['path']} ({result['bytes'] / 1024:.0f} KiB, {result['seconds']:.1f}s)"
+        )
+        if result["archive"]:
+            typer.echo(f"  Archive written: {result['archive']}")
+        for removed in result.get("removed", []):
+            typer.echo(f"  Removed old backup: {removed}")
+
+
+@app.command()
+def restore(
+    src: Annotated[str, typer.Argument(help="Backup file to restore")],
+    force: Annotated[
+        bool, typer.Option("--force", help="Overwrite a database that has data")
+    ] = False,
+    fmt: Annotated[
+        OutputFormat, typer.Option("--format", case_sensitive=False)
+    ] = OutputFormat.table,
+):
+    """Restore the database from a backup after checking its integrity."""
+
+    conn = get_conn()
+    stats = db.get_db_stats(conn)
+    if not force and (stats["meals"] or stats["water_entries"] or stats["targets"]):
+        conn.close()
+        typer.echo("  Database is not empty. Use --force to overwrite it.", err=True)
+        raise typer.Exit(1)
+    try:
+        result = db.restore_db(conn, Path(src))
+    except (RuntimeError, sqlite3.Error) as e:
+        typer.echo(f"  {e}", err=True)
+        raise typer.Exit(1)
+    finally:
+        conn.close()
+
+    if fmt == OutputFormat.json:
+        typer.echo(formatters.output_json(result))
+    else:
+        typer.echo(
+            f"  Restored {result['meals']} meals, {result['water_entries']} water entries, {result['targets']} targets from {result['restored_from']}"
+        )
+        if result["archived_meals"]:
+            typer.echo(f"  Restored {result['archived_meals']} archived meals")
+
+
+# ── sync ─────────────────────────────────────────────────────────────────────
+
+
+@sync_app.command("push")
+def sync_push(
+    target: Annotated[str, typer.Argument(help="Transport directory or file")],
+    fmt: Annotated[
+        OutputFormat, typer.Option("--format", case_sensitive=False)
+    ] = OutputFormat.table,
+):
+    """Send local changes since the last push."""
+
+    conn = get_conn()
+    result = sync.push(conn, Path(target))
+    conn.close()
+
+    if fmt == OutputFormat.json:
+        typer.echo(formatters.output_json(result))
+    elif result["changes"]:
+        typer.echo(f"  Pushed {result['changes']} changes -> {result['file']}")
+    else:
+        typer.echo("  Nothing to push.")
+
+
+@sync_app.command("pull")
+def sync_pull(
+    source: Annotated[str, typer.Argument(help="Transport directory or file")],
+    fmt: Annotated[
+        OutputFormat, typer.Option("--format", case_sensitive=False)
+    ] = OutputFormat.table,
+):
+    """Apply changes from other devices."""
+
+    conn = get_conn()
+    try:
+        result = sync.pull(conn, Path(source))
+    except sync.SyncError as e:
+        typer.echo(f"  {e}", err=True)
+        raise typer.Exit(1)
+    except (ValueError, KeyError) as e:
+        typer.echo(f"  Invalid changeset: {e}", err=True)
+        raise typer.Exit(1)
+    finally:
+        conn.close()
+
+    if fmt == OutputFormat.json:
+        typer.echo(formatters.output_json(result))
+    else:
+        typer.echo(
+            f"  Pulled {result['files']} changesets: {result['applied']} applied, {result['skipped']} skipped"
+        )
+
+
+@sync_app.command("status")
+def sync_status(
+    target: Annotated[str, typer.Argument(help="Transport directory or file")],
+    fmt: Annotated[
+        OutputFormat, typer.Option("--format", case_sensitive=False)
+    ] = OutputFormat.table,
+):
+    """Show this device's id and how many changes are waiting to be pushed."""
+
+    conn = get_conn()
+    result = {
+        "device": sync.get_device_id(conn),
+        "pending": sync.pending_changes(conn, Path(target).expanduser()),
+    }
+    conn.close()
+
+    if fmt == OutputFormat.json:
+        typer.echo(formatters.output_json(result))
+    else:
+        typer.echo(f"  Device {result['device']}: {result['pending']} changes to push")
+
+
+# ── food ─────────────────────────────────────────────────────────────────────
+
+
+@food_app.command("import")
+def food_import(
+    csv_path: Annotated[
+        str, typer.Argument(help="CSV with name, brand and per-100 g macro columns")
+    ],
+    replace: Annotated[
+        bool, typer.Option("--replace", help="Drop the existing catalog first")
+    ] = False,
+    fmt: Annotated[
+        OutputFormat, typer.Option("--format", case_sensitive=False)
+    ] = OutputFormat.table,
+):
+    """Import foods into the catalog."""
+
+    path = Path(csv_path).expanduser()
+    if not path.is_file():
+        typer.echo(f"  File not found: {path}", err=True)
+        raise typer.Exit(1)
+    conn = get_conn()
+    try:
+        imported = catalog.import_foods(
+            conn, catalog.read_foods_csv(path), replace=replace
+        )
+        result = {"imported": imported, "total": catalog.count_foods(conn)}
+    except ValueError as e:
+        typer.echo(f"  {e}", err=True)
+        raise typer.Exit(1)
+    finally:
+        conn.close()
+
+    if fmt == OutputFormat.json:
+        typer.echo(formatters.output_json(result))
+    else:
+        typer.echo(
+            f"  Imported {result['imported']} foods ({result['total']} in catalog)"
+        )
+
+
+@food_app.command("search")
+def food_search(
+    query_: Annotated[str, typer.Argument(help="Name or brand, any part of it")],
+    limit: Annotated[int, typer.Option("--limit", min=1)] = catalog.SEARCH_LIMIT,
+    fmt: Annotated[
+        OutputFormat, typer.Option("--format", case_sensitive=False)
+    ] = OutputFormat.table,
+):
+    """Search the food catalog."""
+
+    conn = get_read_conn()
+    foods = catalog.search_foods(conn, query_, limit)
+    conn.close()
+
+    if fmt == OutputFormat.json:
+        typer.echo(formatters.output_json(foods))
+    else:
+        typer.echo(formatters.format_foods_table(foods))
+
+
+# ── nutrients ────────────────────────────────────────────────────────────────
+
+
+@nutrients_app.command("list")
+def nutrients_list(
+    fmt: Annotated[
+        OutputFormat, typer.Option("--format", case_sensitive=False)
+    ] = OutputFormat.table,
+):
+    """List the extra nutrient codes that can be logged."""
+
+    conn = get_read_conn()
+    rows = db.get_nutrients(conn)
+    conn.close()
+
+    if fmt == OutputFormat.json:
+        typer.echo(formatters.output_json(rows))
+    else:
+        typer.echo(formatters.format_nutrients_table(rows))
+
+
+@nutrients_app.command("add")
+def nutrients_add(
+    code: Annotated[str, typer.Argument(help="Code with unit suffix, e.g. zinc_mg")],
+    name: Annotated[str, typer.Option("--name", help="Display name")] = ...,
+    unit: Annotated[str, typer.Option("--unit", help="Unit, e.g. mg")] = ...,
+    fmt: Annotated[
+        OutputFormat, typer.Option("--format", case_sensitive=False)
+    ] = OutputFormat.table,
+):
+    """Register an extra nutrient code (or rename an existing one)."""
+
+    code = code.strip().lower()
+    if not re.fullmatch(r"[a-z][a-z0-9_]*", code) or code in models.MACRO_FIELDS:
+        typer.echo(
+            f"  Invalid code: {code}. Use lowercase letters, digits and _, "
+            "and not a macro field.",
+            err=True,
+        )
+        raise typer.Exit(1)
+    conn = get_conn()
+    db.add_nutrient(conn, code, name, unit)
+    conn.close()
+
+    if fmt == OutputFormat.json:
+        typer.echo(formatters.output_json({"code": code, "name": name, "unit": unit}))
+    else:
+        typer.echo(f"  Nutrient {code} ({name}, {unit}) registered.")
+
+
+# ── products ─────────────────────────────────────────────────────────────────
+
+
+@products_app.command("import")
+def products_import(
+    dump: Annotated[str, typer.Argument(help="Product dump (.csv, .tsv or .gz)")],
+    chunk: Annotated[
+        int, typer.Option("--chunk", min=1, help="Rows per transaction")
+    ] = products.IMPORT_CHUNK,
+    restart: Annotated[
+        bool,
+        typer.Option("--restart", help="Ignore an interrupted import's checkpoint"),
+    ] = False,
+    fmt: Annotated[
+        OutputFormat, typer.Option("--format", case_sensitive=False)
+    ] = OutputFormat.table,
+):
+    """Import or refresh products from an offline dump (resumable)."""
+
+    path = Path(dump).expanduser()
+    if not path.is_file():
+        typer.echo(f"  File not found: {path}", err=True)
+        raise typer.Exit(1)
+
+    def progress(rows: int, rate: float) -> None:
+        if fmt == OutputFormat.table:
+            typer.echo(f"  {rows} rows ({rate:.0f} rows/s)", err=True)
+
+    conn = get_conn()
+    try:
+        result = products.import_products(
+            conn, path, chunk_size=chunk, restart=restart, progress=progress
+        )
+    except (ValueError, UnicodeDecodeError, EOFError, OSError) as e:
+        typer.echo(f"  Import failed: {e}", err=True)
+        raise typer.Exit(1)
+    finally:
+        conn.close()
+
+    if fmt == OutputFormat.json:
+        typer.echo(formatters.output_json(result))
+    else:
+        resumed = (
+            f", resumed after row {result['resumed_from']}"
+            if result["resumed_from"]
+            else ""
+        )
+        typer.echo(
+            f"  Imported {result['rows']} rows in {result['seconds']}s ({result['rows_per_sec']} rows/s){resumed}: {result['upserted']} new or changed, {result['invalid']} without barcode"
+        )
+
+
+# ── fleet ────────────────────────────────────────────────────────────────────
+
+
+@fleet_app.callback()
+def fleet_main(
+    ctx: typer.Context,
+    pattern: Annotated[
+        str, typer.Argument(help="Glob of database files, e.g. 'clients/*/nutri.db'")
+    ],
+    jobs: Annotated[
+        Optional[int],
+        typer.Option("--jobs", "-j", min=1, help="Worker processes (default: CPUs)"),
+    ] = None,
+):
+    _label_subcommand(ctx)
+    paths = fleet.expand(pattern)
+    if not paths:
+        typer.echo(f"  No databases match {pattern}", err=True)
+        raise typer.Exit(1)
+    ctx.obj = {"paths": paths, "jobs": jobs}
+
+
+def _fleet_output(
+    rows: list[dict], combined: dict, fmt: OutputFormat, table: Callable
+) -> None:
+    if fmt == OutputFormat.json:
+        typer.echo(
+            formatters.output_json(
+                {"databases": fleet.public_rows(rows), "combined": combined}
+            )
+        )
+    else:
+        typer.echo(table(fleet.public_rows(rows), combined))
+    if combined["failed"]:
+        raise typer.Exit(1)
+
+
+@fleet_app.command("info")
+def fleet_info(
+    ctx: typer.Context,
+    fmt: Annotated[
+        OutputFormat, typer.Option("--format", case_sensitive=False)
+    ] = OutputFormat.table,
+):
+    """Row counts and sizes per database, plus totals."""
+
+    rows = fleet.run(ctx.obj["paths"], fleet.info_worker, jobs=ctx.obj["jobs"])
+    _fleet_output(rows, fleet.merge_info(rows), fmt, formatters.format_fleet_info)
+
+
+@fleet_app.command("query")
+def fleet_query(
+    ctx: typer.Context,
+    last_spec: Annotated[
+        Optional[str], typer.Option("--last", help="Duration, e.g. 7d, 30d")
+    ] = None,
+    week: Annotated[bool, typer.Option("--week", help="Current week")] = False,
+    offset: Annotated[
+        int, typer.Option("--offset", help="Week offset (e.g. -1 for last week)")
+    ] = 0,
+    from_: Annotated[
+        Optional[str], typer.Option("--from", help="Start date YYYY-MM-DD")
+    ] = None,
+    to_: Annotated[
+        Optional[str], typer.Option("--to", help="End date YYYY-MM-DD")
+    ] = None,
+    fmt: Annotated[
+        OutputFormat, typer.Option("--format", case_sensitive=False)
+    ] = OutputFormat.table,
+):
+    """Per-database daily averages plus combined averages and percentiles."""
+
+    date_from, date_to = resolve_range_or_exit(last_spec, week, offset, from_, to_)
+    rows = fleet.run(
+        ctx.obj["paths"],
+        fleet.query_worker,
+        args=(date_from, date_to),
+        jobs=ctx.obj["jobs"],
+    )
+    combined = {"date_from": date_from, "date_to": date_to, **fleet.merge_query(rows)}
+    _fleet_output(rows, combined, fmt, formatters.format_fleet_query)
+
+
+# ── watch ────────────────────────────────────────────────────────────────────
+
+
+@app.command()
+def watch(
+    fmt: Annotated[
+        WatchFormat, typer.Option("--format", case_sensitive=False)
+    ] = WatchFormat.table,
+    interval: Annotated[
+        float, typer.Option("--interval", min=0.05, help="Seconds between polls")
+    ] = watch_feed.POLL_INTERVAL,
+    since: Annotated[
+        Optional[int],
+        typer.Option("--since", min=0, help="Replay changes after this sequence"),
+    ] = None,
+    status_: Annotated[
+        bool, typer.Option("--status", help="Also emit today's status deltas")
+    ] = False,
+    once: Annotated[
+        bool, typer.Option("--once", help="Emit pending changes and exit")
+    ] = False,
+    timeout: Annotated[
+        Optional[float], typer.Option("--timeout", min=0, help="Stop after N seconds")
+    ] = None,
+):
+    """Stream meal and water changes as they are committed."""
+
+    conn = get_read_conn()
+    events = watch_feed.watch(
+        conn,
+        since=since,
+        interval=interval,
+        status=status_,
+        timeout=0 if once else timeout,
+    )
+    try:
+        for event in events:
+            if fmt == WatchFormat.ndjson:
+                typer.echo(json.dumps(event, ensure_ascii=False, default=str))
+            else:
+                typer.echo(formatters.format_watch_event(event))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        conn.close()
+
+
+# ── exec ─────────────────────────────────────────────────────────────────────
+
+# Commands that cannot run inside a batch.
+EXEC_EXCLUDED = ("exec", "watch")
+# Commands that begin, commit or lock around their own transaction, so they
+# cannot join the one held by ``exec --transaction``.
+EXEC_OWN_TRANSACTION = (
+    "backup",
+    "dedupe",
+    "food import",
+    "maintenance",
+    "migrate",
+    "products import",
+    "restore",
+)
+
+
+def _exec_own_transaction(line: str) -> str | None:
+    """Return the command of a batch line that manages its own transaction."""
+    try:
+        args = shlex.split(line, comments=True)
+    except ValueError:
+        # Reported when the line runs.
+        return None
+    if args and args[0] == "nutri":
+        args = args[1:]
+    for name in (" ".join(args[:2]), " ".join(args[:1])):
+        if name in EXEC_OWN_TRANSACTION:
+            return name
+    return None
+
+
+def _exec_args(group, args: list[str]) -> list[str]:
+    """Validate one batch line and ask for JSON output where supported."""
+    if args and args[0] == "nutri":
+        args = args[1:]
+    if not args:
+        raise ValueError("Empty command.")
+    if args[0] in EXEC_EXCLUDED:
+        raise ValueError(f"'{args[0]}' cannot run inside exec.")
+    command = group
+    for token in args:
+        if not hasattr(command, "commands"):
+            break
+        command = command.commands.get(token)
+    if command is None or hasattr(command, "commands"):
+        # Let the parser report the unknown or incomplete command.
+        return args
+    for param in command.params:
+        if "--format" in getattr(param, "opts", ()):
+            if "json" in getattr(param.type, "choices", ()) and not any(
+                a == "--format" or a.startswith("--format=") for a in args
+            ):
+                args = [*args, "--format", "json"]
+    return args
+
+
+def _exec_line(group, line: str) -> dict:
+    out, err = io.StringIO(), io.StringIO()
+    exit_code = 0
+    try:
+        args = _exec_args(group, shlex.split(line, comments=True))
+        with contextlib.redirect_stdout(out), contextlib.redirect_stderr(err):
+            exit_code = group.main(args=args, prog_name="nutri", standalone_mode=False)
+    except Exception as e:
+        # One failing line (usage error, bad quoting, database error) must
+        # not abort the rest of the batch.
+        exit_code = getattr(e, "exit_code", 2 if isinstance(e, ValueError) else 1)
+        format_message = getattr(e, "format_message", None)
+        err.write(format_message() if format_message else str(e))
+    text = out.getvalue().strip()
+    try:
+        result = json.loads(text) if text else None
+    except json.JSONDecodeError:
+        result = text
+    record: dict = {"exit_code": exit_code or 0, "result": result}
+    if err.getvalue().strip():
+        record["error"] = err.getvalue().strip()
+    return record
+
+
+@app.command("exec")
+def exec_(
+    script: Annotated[
+        str, typer.Argument(help="File with one nutri command per line, or - for stdin")
+    ] = "-",
+    transaction: Annotated[
+        bool,
+        typer.Option(
+            "--transaction",
+            help="Commit all writes at once; roll back everything on the first error",
+        ),
+    ] = False,
+):
+    """Run many commands in one process over a shared connection (NDJSON output)."""
+
+    global _shared_conn
+    if script == "-":
+        lines = sys.stdin.read().splitlines()
+    else:
+        path = Path(script).expanduser()
+        if not path.is_file():
+            typer.echo(f"  File not found: {path}", err=True)
+            raise typer.Exit(1)
+        lines = path.read_text(encoding="utf-8").splitlines()
+
+    if transaction:
+        for number, line in enumerate(lines, start=1):
+            command = _exec_own_transaction(line)
+            if command:
+                typer.echo(
+                    f"  Line {number}: '{command}' manages its own transaction "
+                    "and cannot run with --transaction.",
+                    err=True,
+                )
+                raise typer.Exit(1)
+
+    group = typer.main.get_command(app)
+    conn = db.get_connection(factory=db.SharedConnection)
+    conn.hold_commits = transaction
+    _shared_conn = conn
+    failed = 0
+    ran = 0
+    try:
+        for number, line in enumerate(lines, start=1):
+            if not line.strip() or line.lstrip().startswith("#"):
+                continue
+            record = {"line": number, "command": line.strip()}
+            record.update(_exec_line(group, line))
+            ran += 1
+            typer.echo(json.dumps(record, ensure_ascii=False, default=str))
+            if record["exit_code"]:
+                failed += 1
+                if transaction:
+                    break
+        if transaction:
+            conn.finish(commit=not failed)
+            typer.echo(
+                json.dumps(
+                    {
+                        "transaction": "rolled_back" if failed else "committed",
+                        "commands": ran,
+                    }
+                )
+            )
+    finally:
+        _shared_conn = None
+        conn.release()
+    if failed:
+        raise typer.Exit(1)
+
+
 # ── export ───────────────────────────────────────────────────────────────────
 
 
+def _export_columnar(
+    conn,
+    fmt: ExportFormat,
+    target: Path,
+    date_from: str,
+    date_to: str,
+    codes: list[str] | None,
+    partition: Partition | None,
+    jobs: int | None,
+    force: bool,
+) -> None:
+    try:
+        if partition:
+            # Workers open their own connections to the same database.
+            db_path = db.get_main_db_path(conn) or db.get_db_path()
+            result = columnar.export_months(
+                conn, db_path, target, fmt.value, date_from, date_to, codes, jobs, force
+            )
+        else:
+            rows = columnar.write_range(
+                conn, target, fmt.value, date_from, date_to, codes
+            )
+    except columnar.ColumnarUnavailable as e:
+        typer.echo(f"  {e}", err=True)
+        raise typer.Exit(1)
+    except OSError as e:
+        typer.echo(f"  Cannot write {target}: {e}", err=True)
+        raise typer.Exit(1)
+    finally:
+        conn.close()
+    if not partition:
+        typer.echo(f"  Exported: {rows} meals -> {target}")
+        return
+    typer.echo(
+        f"  Exported: {result['meals']} meals in {result['partitions']} months "
+        f"({len(result['written'])} written, {result['unchanged']} unchanged, "
+        f"{len(result['removed'])} removed) -> {result['output']}"
+    )
+
+
 @app.command()
 def export(
     from_: Annotated[str, typer.Option("--from", help="Start date YYYY-MM-DD")] = ...,
@@ -518,14 +2100,69 @@ def export(
         ExportFormat, typer.Option("--format", case_sensitive=False)
     ] = ExportFormat.csv,
     outfile: Annotated[
-        Optional[str], typer.Option("-o", "--output", help="Output file path")
+        Optional[str],
+        typer.Option("-o", "--output", help="Output file (directory with --partition)"),
+    ] = None,
+    nutrients: Annotated[
+        Optional[str],
+        typer.Option(
+            "--nutrients",
+            help="Include extra nutrients: comma-separated codes or 'all'",
+        ),
     ] = None,
+    partition: Annotated[
+        Optional[Partition],
+        typer.Option(
+            "--partition",
+            case_sensitive=False,
+            help="One parquet/arrow file per month in the --output directory",
+        ),
+    ] = None,
+    jobs: Annotated[
+        Optional[int],
+        typer.Option("--jobs", "-j", min=1, help="Partition worker threads"),
+    ] = None,
+    force: Annotated[
+        bool, typer.Option("--force", help="Rewrite partitions even if unchanged")
+    ] = False,
 ):
     """Export meal data."""
 
-    conn = get_conn()
-    date_to = to_ or models.today_str()
+    columnar_fmt = fmt in (ExportFormat.parquet, ExportFormat.arrow)
+    if partition and not columnar_fmt:
+        typer.echo("  --partition needs --format parquet or arrow.", err=True)
+        raise typer.Exit(1)
+    if columnar_fmt and not outfile:
+        typer.echo(f"  --format {fmt.value} needs --output.", err=True)
+        raise typer.Exit(1)
+
+    from_ = parse_date_or_exit(from_)
+    date_to = parse_date_or_exit(to_) if to_ else models.today_str()
+    conn = get_read_conn()
+    codes = nutrient_codes_or_exit(conn, nutrients)
+    if columnar_fmt:
+        _export_columnar(
+            conn,
+            fmt,
+            Path(outfile).expanduser(),
+            from_,
+            date_to,
+            codes,
+            partition,
+            jobs,
+            force,
+        )
+        return
     meals = db.get_meals_in_range(conn, from_, date_to)
+    if codes:
+        extras = db.get_meal_nutrients_in_range(conn, from_, date_to, codes)
+        for m in meals:
+            amounts = extras.get(m["id"], {})
+            if fmt == ExportFormat.json:
+                m["nutrients"] = amounts
+            else:
+                # One column per requested code; empty where not recorded.
+                m.update({c: amounts.get(c) for c in codes})
     conn.close()
 
     if fmt == ExportFormat.json:
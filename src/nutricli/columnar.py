@@ -0,0 +1,305 @@
+"""Columnar meal export (Parquet or Arrow IPC), optionally one file per month.
+
+Rows are streamed from a cursor in ``fetchmany`` batches straight into
+Arrow record batches, so no export ever holds the whole range in memory.
+With month partitions a thread pool handles the months, each worker on its
+own read-only connection. The months are first hashed from the same rows.
+Only months whose digest differs from the manifest kept next to the files
+are converted and rewritten, and files for months that no longer have meals
+are removed.
+
+pyarrow is an optional dependency: ``pip install 'nutri-cli[arrow]'``.
+"""
+
+from __future__ import annotations
+
+import calendar
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+
+from . import db, manifest
+from .models import MACRO_FIELDS
+
+EXTENSIONS = {"parquet": "parquet", "arrow": "arrow"}
+MANIFEST_NAME = ".nutri-export.json"
+BATCH_ROWS = 50_000
+# Bump when the file layout changes so existing partitions are rewritten.
+LAYOUT_VERSION = 1
+
+# Exported meal columns; ``date`` is read as the epoch day and stored as date32.
+COLUMNS = (
+    "id",
+    "date",
+    "time",
+    "meal_type",
+    "description",
+    *MACRO_FIELDS,
+    "confidence",
+    "confirmed",
+    "source",
+    "food_id",
+    "barcode",
+    "uid",
+    "created_at",
+    "updated_at",
+)
+TIMESTAMP_COLUMNS = ("created_at", "updated_at")
+
+
+class ColumnarUnavailable(RuntimeError):
+    """pyarrow is not installed."""
+
+
+def _pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.compute
+        import pyarrow.ipc
+        import pyarrow.parquet
+    except ImportError:
+        raise ColumnarUnavailable(
+            "Parquet and Arrow export need the pyarrow package: "
+            "pip install 'nutri-cli[arrow]'."
+        ) from None
+    return pyarrow
+
+
+def check_available() -> None:
+    _pyarrow()
+
+
+def _schema(pa, codes: list[str]):
+    types = {
+        "id": pa.int64(),
+        "date": pa.date32(),
+        "confirmed": pa.bool_(),
+        "food_id": pa.int64(),
+        **{f: pa.float64() for f in MACRO_FIELDS},
+        **{c: pa.timestamp("s", tz="UTC") for c in TIMESTAMP_COLUMNS},
+    }
+    return pa.schema(
+        [(c, types.get(c, pa.string())) for c in COLUMNS]
+        + [(code, pa.float64()) for code in codes]
+    )
+
+
+def _select() -> tuple[str, ...]:
+    return tuple("day AS date" if c == "date" else c for c in COLUMNS)
+
+
+def _batch(pa, schema, rows: list[tuple], extras: dict[int, dict], codes: list[str]):
+    columns = list(zip(*rows))
+    arrays = []
+    for i, name in enumerate(COLUMNS):
+        values = columns[i]
+        if name == "date":
+            arrays.append(pa.array(values, pa.int32()).cast(pa.date32()))
+        elif name in TIMESTAMP_COLUMNS:
+            arrays.append(
+                pa.compute.strptime(
+                    pa.array(values, pa.string()),
+                    format="%Y-%m-%d %H:%M:%S",
+                    unit="s",
+                    error_is_null=True,
+                ).cast(schema.field(name).type)
+            )
+        elif name == "confirmed":
+            arrays.append(
+                pa.array([None if v is None else bool(v) for v in values], pa.bool_())
+            )
+        else:
+            arrays.append(pa.array(values, schema.field(name).type))
+    ids = columns[0]
+    for code in codes:
+        arrays.append(
+            pa.array([extras.get(i, {}).get(code) for i in ids], pa.float64())
+        )
+    return pa.RecordBatch.from_arrays(arrays, schema=schema)
+
+
+def _open_writer(pa, fmt: str, path: Path, schema):
+    if fmt == "parquet":
+        return pa.parquet.ParquetWriter(str(path), schema, compression="zstd")
+    return pa.ipc.new_file(str(path), schema)
+
+
+def write_range(
+    conn,
+    path: Path,
+    fmt: str,
+    date_from: str,
+    date_to: str,
+    codes: list[str] | None = None,
+) -> int:
+    """Stream the meals of a range into one file; returns the row count.
+
+    The file is written under a temporary name and moved into place.
+    """
+    pa = _pyarrow()
+    codes = codes or []
+    schema = _schema(pa, codes)
+    extras = (
+        db.get_meal_nutrients_in_range(conn, date_from, date_to, codes) if codes else {}
+    )
+    cur = db.iter_meal_rows(conn, _select(), date_from, date_to)
+    tmp = path.with_name(f".{path.name}.tmp")
+    rows = 0
+    try:
+        writer = _open_writer(pa, fmt, tmp, schema)
+        try:
+            while batch := cur.fetchmany(BATCH_ROWS):
+                writer.write_batch(_batch(pa, schema, batch, extras, codes))
+                rows += len(batch)
+        finally:
+            writer.close()
+        os.replace(tmp, path)
+    finally:
+        cur.close()
+        tmp.unlink(missing_ok=True)
+    return rows
+
+
+def digest_range(
+    conn, date_from: str, date_to: str, codes: list[str] | None = None
+) -> str:
+    """Hash of exactly the rows and extra nutrients ``write_range`` would write."""
+    codes = codes or []
+    h = hashlib.sha256(
+        json.dumps(
+            {"layout": LAYOUT_VERSION, "columns": COLUMNS, "codes": codes}
+        ).encode()
+    )
+    cur = db.iter_meal_rows(conn, _select(), date_from, date_to)
+    try:
+        while batch := cur.fetchmany(BATCH_ROWS):
+            h.update("".join(f"{row!r}\n" for row in batch).encode())
+    finally:
+        cur.close()
+    if codes:
+        extras = db.get_meal_nutrients_in_range(conn, date_from, date_to, codes)
+        h.update(
+            repr(sorted((i, sorted(a.items())) for i, a in extras.items())).encode()
+        )
+    return h.hexdigest()
+
+
+# ── month partitions ─────────────────────────────────────────────────────────
+
+
+def month_bounds(month: str) -> tuple[str, str]:
+    """First and last day of ``YYYY-MM``."""
+    year, mon = int(month[:4]), int(month[5:7])
+    last = calendar.monthrange(year, mon)[1]
+    return f"{month}-01", f"{month}-{last:02d}"
+
+
+def load_manifest(out_dir: Path) -> dict[str, dict]:
+    """Month -> ``{"file", "rows", "digest"}`` from the last export."""
+    return manifest.load(out_dir / MANIFEST_NAME, "partitions")
+
+
+def _export_month(
+    db_path: Path,
+    month: str,
+    fmt: str,
+    out_dir: Path,
+    codes: list[str],
+    previous: dict | None,
+    force: bool,
+) -> dict:
+    # Runs in a worker thread, so it opens its own connection.
+    start, end = month_bounds(month)
+    name = f"{month}.{EXTENSIONS[fmt]}"
+    conn = db.get_read_connection(db_path)
+    try:
+        # One snapshot for the digest and the rows written.
+        conn.execute("BEGIN")
+        digest = digest_range(conn, start, end, codes)
+        if (
+            not force
+            and previous
+            and previous.get("digest") == digest
+            and previous.get("file") == name
+            and (out_dir / name).exists()
+        ):
+            return {**previous, "written": False}
+        rows = write_range(conn, out_dir / name, fmt, start, end, codes)
+    finally:
+        conn.close()
+    return {"file": name, "rows": rows, "digest": digest, "written": True}
+
+
+def export_months(
+    conn,
+    db_path: Path,
+    out_dir: Path,
+    fmt: str,
+    date_from: str,
+    date_to: str,
+    codes: list[str] | None = None,
+    jobs: int | None = None,
+    force: bool = False,
+) -> dict:
+    """Write one file per month with meals in the range into ``out_dir``.
+
+    ``conn`` lists the months; each month is then digested and, if changed,
+    written by a pool of ``jobs`` threads with their own connections to
+    ``db_path``. The range only picks the months: each file always holds
+    its whole month, so a narrower range never truncates one. Months of the
+    range that lost all their meals have their file removed. The manifest
+    is saved even if a month fails.
+    """
+    _pyarrow()
+    codes = codes or []
+    first, last = date_from[:7], date_to[:7]
+    months = db.get_meal_months(conn, month_bounds(first)[0], month_bounds(last)[1])
+    out_dir.mkdir(parents=True, exist_ok=True)
+    partitions = load_manifest(out_dir)
+
+    removed: list[str] = []
+    for month in sorted(partitions):
+        if month not in months and first <= month <= last:
+            (out_dir / partitions[month]["file"]).unlink(missing_ok=True)
+            removed.append(partitions.pop(month)["file"])
+
+    written: list[str] = []
+    unchanged = 0
+    try:
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            futures = {
+                month: pool.submit(
+                    _export_month,
+                    db_path,
+                    month,
+                    fmt,
+                    out_dir,
+                    codes,
+                    partitions.get(month),
+                    force,
+                )
+                for month in months
+            }
+            for month, future in futures.items():
+                result = future.result()
+                if result.pop("written"):
+                    written.append(result["file"])
+                else:
+                    unchanged += 1
+                previous = partitions.get(month)
+                if previous and previous["file"] != result["file"]:
+                    (out_dir / previous["file"]).unlink(missing_ok=True)
+                partitions[month] = result
+    finally:
+        manifest.save(out_dir / MANIFEST_NAME, "partitions", partitions)
+    return {
+        "output": str(out_dir),
+        "format": fmt,
+        "partitions": len(months),
+        "meals": sum(months.values()),
+        "written": written,
+        "unchanged": unchanged,
+        "removed": removed,
+    }
@@ -2,17 +2,34 @@
 
 from __future__ import annotations
 
+import contextlib
+import glob
 import os
 import sqlite3
+import time
+import uuid
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Callable
+from typing import Callable, Iterable, Iterator, NamedTuple
+
+from . import metrics
+from .models import (
+    DUPLICATE_CAL_TOLERANCE,
+    DUPLICATE_WINDOW_MIN,
+    EXTRA_NUTRIENTS,
+    MACRO_FIELDS,
+    MEAL_TYPES,
+    description_key,
+    epoch_day,
+    is_near_duplicate,
+)
 
 
 def get_db_path() -> Path:
     """Resolve the DB path.
 
     - Default: XDG data directory (app-specific)
-    - Override: NUTRI_DB_PATH
+    - Override: NUTRI_DB_PATH (``:memory:`` for a per-process in-memory DB)
     """
 
     override = os.environ.get("NUTRI_DB_PATH")
@@ -22,7 +39,33 @@ def get_db_path() -> Path:
     return Path.home() / ".local" / "share" / "nutri" / "nutrition.db"
 
 
-SCHEMA_VERSION = 1
+MEMORY_PATH = ":memory:"
+# Every connection to this URI in a process shares one in-memory database.
+MEMORY_URI = "file:nutri-memory?mode=memory&cache=shared"
+# Held open so the shared database outlives the connections commands close.
+_memory_anchor: sqlite3.Connection | None = None
+
+
+def is_memory_path(path: Path) -> bool:
+    return str(path) == MEMORY_PATH
+
+
+def _connect_memory(factory: type[sqlite3.Connection]) -> sqlite3.Connection:
+    global _memory_anchor
+    if _memory_anchor is None:
+        _memory_anchor = sqlite3.connect(MEMORY_URI, uri=True)
+    return sqlite3.connect(MEMORY_URI, uri=True, factory=factory)
+
+
+def reset_memory_db() -> None:
+    """Drop the shared in-memory database once its open connections close."""
+    global _memory_anchor
+    if _memory_anchor is not None:
+        _memory_anchor.close()
+        _memory_anchor = None
+
+
+SCHEMA_VERSION = 11
 
 SCHEMA = """
 CREATE TABLE IF NOT EXISTS meals (
@@ -69,21 +112,155 @@ CREATE INDEX IF NOT EXISTS idx_water_date ON water(date);
 """
 
 
-def get_connection(db_path: Path | None = None) -> sqlite3.Connection:
-    """Get a database connection, creating the DB and schema if needed."""
-    path = (db_path or get_db_path()).expanduser()
-    path.parent.mkdir(parents=True, exist_ok=True)
+def get_connection(
+    db_path: Path | None = None,
+    migrate: bool = True,
+    factory: type[sqlite3.Connection] = sqlite3.Connection,
+) -> sqlite3.Connection:
+    """Get a database connection, creating the DB and schema if needed.
 
-    conn = sqlite3.connect(str(path))
+    With ``migrate=False`` pending migrations are left for ``nutri migrate``.
+    A ``:memory:`` path opens the process-wide shared in-memory database.
+    """
+    path = (db_path or get_db_path()).expanduser()
+    if metrics.enabled():
+        factory = metrics.metered(factory)
+    if is_memory_path(path):
+        conn = _connect_memory(factory)
+    else:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        conn = sqlite3.connect(str(path), factory=factory)
     conn.row_factory = sqlite3.Row
+    # Used by the desc_key backfill and `nutri dedupe` repairs.
+    conn.create_function("nutri_desc_key", 1, description_key, deterministic=True)
+    # Only takes effect for new databases; `nutri maintenance` converts old ones.
+    conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
     conn.execute("PRAGMA journal_mode=WAL")
-    _ensure_schema(conn)
+    if migrate:
+        _ensure_schema(conn)
+    attach_archive(conn)
+    return conn
+
+
+class SchemaError(RuntimeError):
+    """The database has no nutri schema, or not the current one.
+
+    ``migratable`` is set when ``nutri migrate`` would fix it.
+    """
+
+    def __init__(self, message: str, migratable: bool = False) -> None:
+        super().__init__(message)
+        self.migratable = migratable
+
+
+def get_read_connection(
+    db_path: Path | None = None,
+    immutable: bool | None = None,
+    factory: type[sqlite3.Connection] = sqlite3.Connection,
+) -> sqlite3.Connection:
+    """Open an existing database read-only (``mode=ro``).
+
+    Nothing is created or changed: no directory, no DDL and no journal-mode
+    switch, so reads work on read-only mounts and alongside writers.
+    ``immutable`` (default: ``NUTRI_DB_IMMUTABLE``) is for snapshot files
+    that cannot change; SQLite then skips locking and the ``-shm`` file.
+    Raises ``SchemaError`` unless the schema is current. The shared
+    in-memory database is opened with ``query_only`` instead.
+    """
+    path = (db_path or get_db_path()).expanduser()
+    if metrics.enabled():
+        factory = metrics.metered(factory)
+    if is_memory_path(path):
+        conn = _connect_memory(factory)
+        conn.execute("PRAGMA query_only=1")
+    else:
+        if not path.is_file():
+            raise SchemaError(f"No database at {path}.")
+        if immutable is None:
+            immutable = os.environ.get("NUTRI_DB_IMMUTABLE", "") not in ("", "0")
+        uri = path.resolve().as_uri() + "?mode=ro"
+        if immutable:
+            uri += "&immutable=1"
+        conn = sqlite3.connect(uri, uri=True, factory=factory)
+    conn.row_factory = sqlite3.Row
+    try:
+        check_schema(conn)
+        attach_archive(conn, read_only=True, immutable=bool(immutable))
+    except BaseException:
+        conn.close()
+        raise
     return conn
 
 
+def check_schema(conn: sqlite3.Connection) -> None:
+    """Raise ``SchemaError`` unless the schema is current and fully backfilled."""
+    version = get_schema_version(conn)
+    if (
+        version == 0
+        and not conn.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'meals'"
+        ).fetchone()
+    ):
+        raise SchemaError("Database has no nutri schema.")
+    if version > SCHEMA_VERSION:
+        raise SchemaError(
+            f"Database schema version {version} is newer than this CLI "
+            f"(max {SCHEMA_VERSION}). Please update nutri."
+        )
+    if version < SCHEMA_VERSION:
+        raise SchemaError(
+            f"Database schema version {version} needs migrating to "
+            f"{SCHEMA_VERSION}. Run `nutri migrate`.",
+            migratable=True,
+        )
+    if pending_backfills(conn):
+        raise SchemaError(
+            "Database migration is unfinished. Run `nutri migrate`.", migratable=True
+        )
+
+
+class SharedConnection(sqlite3.Connection):
+    """A connection reused across several commands in one process.
+
+    ``close()`` is a no-op until ``release()``. With ``hold_commits`` set,
+    commits (including ``with conn:`` blocks) are deferred so that every
+    write lands in one transaction, finished by ``finish()``.
+    """
+
+    hold_commits = False
+
+    def close(self) -> None:
+        pass
+
+    def release(self) -> None:
+        super().close()
+
+    def commit(self) -> None:
+        if not self.hold_commits:
+            super().commit()
+
+    def __exit__(self, exc_type, exc, tb):
+        if not self.hold_commits:
+            return super().__exit__(exc_type, exc, tb)
+        return False
+
+    def finish(self, commit: bool) -> None:
+        if commit:
+            super().commit()
+        else:
+            self.rollback()
+
+
+def get_main_db_path(conn: sqlite3.Connection) -> Path | None:
+    for row in conn.execute("PRAGMA database_list").fetchall():
+        if row["name"] == "main":
+            return Path(row["file"]) if row["file"] else None
+    return None
+
+
 def _ensure_schema(conn: sqlite3.Connection) -> None:
     conn.executescript(SCHEMA)
-    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    version = get_schema_version(conn)
     if version < SCHEMA_VERSION:
         _migrate(conn, version)
     elif version > SCHEMA_VERSION:
@@ -91,18 +268,208 @@ def _ensure_schema(conn: sqlite3.Connection) -> None:
             f"Database schema version {version} is newer than this CLI "
             f"(max {SCHEMA_VERSION}). Please update nutri."
         )
+    if pending_backfills(conn):
+        run_backfills(conn)
+
 
+def get_schema_version(conn: sqlite3.Connection) -> int:
+    return conn.execute("PRAGMA user_version").fetchone()[0]
 
-def _migrate(conn: sqlite3.Connection, version: int) -> None:
+
+def _migrate(
+    conn: sqlite3.Connection,
+    version: int,
+    progress: Callable[[int], None] | None = None,
+) -> None:
+    # Each version commits with its user_version bump, so an interruption
+    # keeps the versions already applied. Row rewrites are not done here but
+    # queued as batched backfills (see run_backfills).
     while version < SCHEMA_VERSION:
         next_version = version + 1
         migration = MIGRATIONS.get(next_version)
         if not migration:
             raise RuntimeError(f"No migration found for schema version {next_version}.")
-        migration(conn)
-        conn.execute(f"PRAGMA user_version = {next_version}")
+        conn.execute("BEGIN")
+        try:
+            migration(conn)
+            for name in MIGRATION_BACKFILLS.get(next_version, ()):
+                _queue_backfill(conn, name)
+            conn.execute(f"PRAGMA user_version = {next_version}")
+        except BaseException:
+            conn.rollback()
+            raise
+        conn.commit()
         version = next_version
-    conn.commit()
+        if progress:
+            progress(version)
+
+
+def migrate_schema(
+    conn: sqlite3.Connection, progress: Callable[[int], None] | None = None
+) -> list[int]:
+    """Apply pending schema migrations; returns the versions applied."""
+    conn.executescript(SCHEMA)
+    version = get_schema_version(conn)
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(
+            f"Database schema version {version} is newer than this CLI "
+            f"(max {SCHEMA_VERSION}). Please update nutri."
+        )
+    _migrate(conn, version, progress)
+    return list(range(version + 1, SCHEMA_VERSION + 1))
+
+
+# ── batched backfills ────────────────────────────────────────────────────────
+
+BACKFILL_BATCH = 5000
+# Rough rewrite rate used by `nutri migrate --estimate`; real rates vary with
+# the disk and the number of indexes on the table.
+BACKFILL_ROWS_PER_SEC = 100_000
+
+
+class Backfill(NamedTuple):
+    """A row rewrite applied in id-ordered batches: ``UPDATE table SET assignments``."""
+
+    table: str
+    assignments: str
+
+
+def _ensure_backfill_table(conn: sqlite3.Connection) -> None:
+    conn.execute(
+        """
+        CREATE TABLE IF NOT EXISTS backfills (
+            name        TEXT PRIMARY KEY,
+            last_id     INTEGER NOT NULL DEFAULT 0,
+            max_id      INTEGER NOT NULL DEFAULT 0,
+            rows        INTEGER NOT NULL DEFAULT 0,
+            done        INTEGER NOT NULL DEFAULT 0
+        )
+        """
+    )
+
+
+def _queue_backfill(conn: sqlite3.Connection, name: str) -> None:
+    # Rows added after this point are written with the new values already.
+    _ensure_backfill_table(conn)
+    table = BACKFILLS[name].table
+    max_id = conn.execute(f"SELECT COALESCE(MAX(id), 0) FROM {table}").fetchone()[0]
+    conn.execute(
+        "INSERT OR REPLACE INTO backfills (name, max_id, done) VALUES (?, ?, ?)",
+        (name, max_id, int(max_id == 0)),
+    )
+
+
+def pending_backfills(conn: sqlite3.Connection) -> list[dict]:
+    exists = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'backfills'"
+    ).fetchone()
+    if not exists:
+        return []
+    rows = conn.execute("SELECT * FROM backfills WHERE NOT done ORDER BY name")
+    return [dict(r) for r in rows]
+
+
+@contextlib.contextmanager
+def write_transaction(conn: sqlite3.Connection) -> Iterator[None]:
+    """``with conn:`` that takes the write lock first (``BEGIN IMMEDIATE``).
+
+    sqlite3 only opens a transaction at the first write, so reads at the
+    start of a plain ``with conn:`` block (e.g. the change-log position) can
+    miss commits from other connections made before that write. Inside an
+    open transaction (``nutri exec --transaction``) the block joins it.
+    """
+    if not conn.in_transaction:
+        conn.execute("BEGIN IMMEDIATE")
+    with conn:
+        yield
+
+
+def run_backfills(
+    conn: sqlite3.Connection,
+    batch_size: int = BACKFILL_BATCH,
+    progress: Callable[[dict], None] | None = None,
+) -> list[dict]:
+    """Run queued backfills in short transactions, resuming from checkpoints.
+
+    Each batch updates one id range and advances the checkpoint in the same
+    commit, so other connections are only blocked for one batch and an
+    interrupted run continues where it stopped.
+    """
+    finished = []
+    for state in pending_backfills(conn):
+        backfill = BACKFILLS[state["name"]]
+        while state["last_id"] < state["max_id"]:
+            upper = min(state["last_id"] + batch_size, state["max_id"])
+            with write_transaction(conn):
+                last_seq = conn.execute(
+                    "SELECT COALESCE(MAX(seq), 0) FROM changes"
+                ).fetchone()[0]
+                cur = conn.execute(
+                    f"UPDATE {backfill.table} SET {backfill.assignments} "
+                    "WHERE id > ? AND id <= ?",
+                    (state["last_id"], upper),
+                )
+                # Derived-column rewrites are not user changes; keep them out
+                # of the change log (sync, watch).
+                conn.execute("DELETE FROM changes WHERE seq > ?", (last_seq,))
+                state["last_id"] = upper
+                state["rows"] += cur.rowcount
+                state["done"] = int(upper >= state["max_id"])
+                conn.execute(
+                    "UPDATE backfills SET last_id = ?, rows = ?, done = ? "
+                    "WHERE name = ?",
+                    (upper, state["rows"], state["done"], state["name"]),
+                )
+            if progress:
+                progress(dict(state))
+        if not state["done"]:
+            with conn:
+                conn.execute(
+                    "UPDATE backfills SET done = 1 WHERE name = ?", (state["name"],)
+                )
+            state["done"] = 1
+        finished.append(state)
+    return finished
+
+
+def estimate_migration(conn: sqlite3.Connection) -> dict:
+    """Pending schema versions and backfills with a duration estimate.
+
+    Backfill work is predicted from the rows still to rewrite; backfills of
+    migrations not applied yet cover their whole table.
+    """
+    version = get_schema_version(conn)
+    pending = list(range(version + 1, SCHEMA_VERSION + 1))
+    work: list[dict] = []
+    for state in pending_backfills(conn):
+        table = BACKFILLS[state["name"]].table
+        rows = conn.execute(
+            f"SELECT COUNT(*) FROM {table} WHERE id > ? AND id <= ?",
+            (state["last_id"], state["max_id"]),
+        ).fetchone()[0]
+        work.append({"name": state["name"], "rows": rows, "resumed": state["rows"]})
+    for v in pending:
+        for name in MIGRATION_BACKFILLS.get(v, ()):
+            table = BACKFILLS[name].table
+            has_table = conn.execute(
+                "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?",
+                (table,),
+            ).fetchone()
+            rows = (
+                conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+                if has_table
+                else 0
+            )
+            work.append({"name": name, "rows": rows, "resumed": 0})
+    for w in work:
+        w["seconds"] = round(w["rows"] / BACKFILL_ROWS_PER_SEC, 2)
+    return {
+        "schema_version": version,
+        "target_version": SCHEMA_VERSION,
+        "pending_versions": pending,
+        "backfills": work,
+        "estimated_seconds": round(sum(w["seconds"] for w in work), 2),
+    }
 
 
 def _migration_1(conn: sqlite3.Connection) -> None:
@@ -110,12 +477,349 @@ def _migration_1(conn: sqlite3.Connection) -> None:
     return None
 
 
+def _migration_2(conn: sqlite3.Connection) -> None:
+    # Composite indexes for meal-type / time-of-day breakdowns.
+    conn.execute(
+        "CREATE INDEX IF NOT EXISTS idx_meals_date_meal_type ON meals(date, meal_type)"
+    )
+    conn.execute("CREATE INDEX IF NOT EXISTS idx_meals_date_time ON meals(date, time)")
+
+
+SYNC_TABLES = ("meals", "water", "targets")
+
+
+def _migration_3(conn: sqlite3.Connection) -> None:
+    # Stable row ids across devices plus a trigger-maintained change log.
+    for table in SYNC_TABLES:
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN uid TEXT")
+        conn.execute(
+            f"UPDATE {table} SET uid = lower(hex(randomblob(16))) WHERE uid IS NULL"
+        )
+        conn.execute(f"CREATE UNIQUE INDEX idx_{table}_uid ON {table}(uid)")
+    conn.execute("ALTER TABLE water ADD COLUMN updated_at TEXT")
+    conn.execute("UPDATE water SET updated_at = COALESCE(created_at, datetime('now'))")
+    conn.execute("ALTER TABLE targets ADD COLUMN updated_at TEXT")
+    conn.execute("UPDATE targets SET updated_at = datetime('now')")
+    conn.execute(
+        """
+        CREATE TABLE changes (
+            seq         INTEGER PRIMARY KEY AUTOINCREMENT,
+            tbl         TEXT NOT NULL,
+            row_id      INTEGER NOT NULL,
+            uid         TEXT,
+            op          TEXT NOT NULL,
+            changed_at  TEXT DEFAULT (datetime('now')),
+            origin      TEXT
+        )
+        """
+    )
+    conn.execute("CREATE INDEX idx_changes_uid ON changes(tbl, uid)")
+    conn.execute("CREATE TABLE sync_state (key TEXT PRIMARY KEY, value TEXT)")
+    for table in SYNC_TABLES:
+        # Seed the log so a first push carries every existing row.
+        conn.execute(
+            f"INSERT INTO changes (tbl, row_id, uid, op) "
+            f"SELECT '{table}', id, uid, 'upsert' FROM {table} ORDER BY id"
+        )
+        for event, ref, op in (
+            ("INSERT", "NEW", "upsert"),
+            ("UPDATE", "NEW", "upsert"),
+            ("DELETE", "OLD", "delete"),
+        ):
+            conn.execute(
+                f"CREATE TRIGGER trg_{table}_{event.lower()}_changes "
+                f"AFTER {event} ON {table} BEGIN "
+                f"INSERT INTO changes (tbl, row_id, uid, op) "
+                f"VALUES ('{table}', {ref}.id, {ref}.uid, '{op}'); END"
+            )
+
+
+def _migration_4(conn: sqlite3.Connection) -> None:
+    # Record inserts and updates separately so change feeds can tell them apart.
+    for table in SYNC_TABLES:
+        for event, ref in (("INSERT", "NEW"), ("UPDATE", "NEW"), ("DELETE", "OLD")):
+            conn.execute(f"DROP TRIGGER IF EXISTS trg_{table}_{event.lower()}_changes")
+            conn.execute(
+                f"CREATE TRIGGER trg_{table}_{event.lower()}_changes "
+                f"AFTER {event} ON {table} BEGIN "
+                f"INSERT INTO changes (tbl, row_id, uid, op) "
+                f"VALUES ('{table}', {ref}.id, {ref}.uid, '{event.lower()}'); END"
+            )
+
+
+FOODS_FTS_INSERT_TRIGGER = (
+    "CREATE TRIGGER trg_foods_insert_fts AFTER INSERT ON foods BEGIN "
+    "INSERT INTO foods_fts (rowid, name, brand) "
+    "VALUES (NEW.id, NEW.name, NEW.brand); END"
+)
+
+
+def _migration_5(conn: sqlite3.Connection) -> None:
+    # Offline food catalog (per-100 g macros) with a trigram index for search.
+    macros = ", ".join(f"{f} REAL DEFAULT 0" for f in MACRO_FIELDS)
+    conn.execute(
+        f"CREATE TABLE foods (id INTEGER PRIMARY KEY AUTOINCREMENT, "
+        f"name TEXT NOT NULL, brand TEXT, {macros})"
+    )
+    conn.execute(
+        "CREATE VIRTUAL TABLE foods_fts USING fts5("
+        "name, brand, content='foods', content_rowid='id', tokenize='trigram')"
+    )
+    conn.execute(FOODS_FTS_INSERT_TRIGGER)
+    conn.execute(
+        "CREATE TRIGGER trg_foods_delete_fts AFTER DELETE ON foods BEGIN "
+        "INSERT INTO foods_fts (foods_fts, rowid, name, brand) "
+        "VALUES ('delete', OLD.id, OLD.name, OLD.brand); END"
+    )
+    conn.execute(
+        "CREATE TRIGGER trg_foods_update_fts AFTER UPDATE ON foods BEGIN "
+        "INSERT INTO foods_fts (foods_fts, rowid, name, brand) "
+        "VALUES ('delete', OLD.id, OLD.name, OLD.brand); "
+        "INSERT INTO foods_fts (rowid, name, brand) "
+        "VALUES (NEW.id, NEW.name, NEW.brand); END"
+    )
+    conn.execute("ALTER TABLE meals ADD COLUMN food_id INTEGER")
+
+
+def _migration_6(conn: sqlite3.Connection) -> None:
+    # Barcode products (per-100 g macros) and checkpoints for resumable imports.
+    macros = ", ".join(f"{f} REAL" for f in MACRO_FIELDS)
+    conn.execute(
+        f"CREATE TABLE products (barcode TEXT PRIMARY KEY, name TEXT, "
+        f"brand TEXT, serving_g REAL, {macros}, "
+        f"updated_at TEXT DEFAULT (datetime('now'))) WITHOUT ROWID"
+    )
+    conn.execute(
+        """
+        CREATE TABLE import_state (
+            path        TEXT PRIMARY KEY,
+            size        INTEGER,
+            mtime       REAL,
+            rows        INTEGER NOT NULL DEFAULT 0,
+            done        INTEGER NOT NULL DEFAULT 0
+        )
+        """
+    )
+    conn.execute("ALTER TABLE meals ADD COLUMN barcode TEXT")
+
+
+# Days since 1970-01-01 for a TEXT YYYY-MM-DD column (see models.epoch_day).
+EPOCH_DAY_SQL = "CAST(julianday({col}) - 2440587.5 AS INTEGER)"
+# Inverse of EPOCH_DAY_SQL, back to YYYY-MM-DD.
+DAY_DATE_SQL = "date({col} + 2440587.5)"
+DAY_TABLES = {"meals": "date", "water": "date", "targets": "date_from"}
+
+
+def _migration_7(conn: sqlite3.Connection) -> None:
+    # Integer day keys with covering indexes, so range scans read the index
+    # in order. The TEXT dates stay the source of truth: inserts set ``day``
+    # directly, and triggers repair it for writers that only set the date.
+    # (A generated column would be simpler, but SQLite never treats an index
+    # on a virtual column as covering.)
+    for table, col in DAY_TABLES.items():
+        expr = EPOCH_DAY_SQL.format(col=f"NEW.{col}")
+        # Existing rows are filled by the queued "{table}_day" backfills.
+        conn.execute(f"ALTER TABLE {table} ADD COLUMN day INTEGER")
+        for event in ("INSERT", f"UPDATE OF {col}"):
+            name = event.split()[0].lower()
+            conn.execute(
+                f"CREATE TRIGGER trg_{table}_{name}_day AFTER {event} ON {table} "
+                f"WHEN NEW.day IS NOT {expr} BEGIN "
+                f"UPDATE {table} SET day = {expr} WHERE id = NEW.id; END"
+            )
+    macros = ", ".join(MACRO_FIELDS)
+    conn.execute(f"CREATE INDEX idx_meals_day ON meals(day, time, id, {macros})")
+    conn.execute("CREATE INDEX idx_water_day ON water(day, time, id, amount_ml)")
+    conn.execute("CREATE INDEX idx_targets_day ON targets(day)")
+
+
+# Tables whose row counts are kept in ``row_counts`` (see get_db_stats).
+COUNTED_TABLES = ("meals", "water", "targets")
+
+
+def _migration_8(conn: sqlite3.Connection) -> None:
+    # Counters kept up to date by triggers, so `nutri info` reads a few rows
+    # instead of scanning meals. meal_days also answers "days tracked" and
+    # "since" (its smallest key).
+    conn.execute(
+        "CREATE TABLE row_counts (name TEXT PRIMARY KEY, n INTEGER NOT NULL) "
+        "WITHOUT ROWID"
+    )
+    conn.execute(
+        "CREATE TABLE meal_days (date TEXT PRIMARY KEY, meals INTEGER NOT NULL) "
+        "WITHOUT ROWID"
+    )
+    add_day = (
+        "INSERT OR IGNORE INTO meal_days (date, meals) VALUES (NEW.date, 0); "
+        "UPDATE meal_days SET meals = meals + 1 WHERE date = NEW.date;"
+    )
+    drop_day = (
+        "UPDATE meal_days SET meals = meals - 1 WHERE date = OLD.date; "
+        "DELETE FROM meal_days WHERE date = OLD.date AND meals <= 0;"
+    )
+    for table in (*COUNTED_TABLES, "meal_days"):
+        extra = table == "meals"
+        conn.execute(
+            f"CREATE TRIGGER trg_{table}_insert_count AFTER INSERT ON {table} BEGIN "
+            f"UPDATE row_counts SET n = n + 1 WHERE name = '{table}'; "
+            f"{add_day if extra else ''} END"
+        )
+        conn.execute(
+            f"CREATE TRIGGER trg_{table}_delete_count AFTER DELETE ON {table} BEGIN "
+            f"UPDATE row_counts SET n = n - 1 WHERE name = '{table}'; "
+            f"{drop_day if extra else ''} END"
+        )
+    conn.execute(
+        "CREATE TRIGGER trg_meals_update_count AFTER UPDATE OF date ON meals "
+        f"WHEN OLD.date IS NOT NEW.date BEGIN {drop_day} {add_day} END"
+    )
+    refresh_counters(conn)
+
+
+def refresh_counters(conn: sqlite3.Connection) -> None:
+    """Recount ``row_counts`` and ``meal_days`` from the base tables."""
+    conn.execute("DELETE FROM meal_days")
+    conn.execute(
+        "INSERT INTO meal_days (date, meals) SELECT date, COUNT(*) FROM meals "
+        "GROUP BY date"
+    )
+    counts = [
+        (t, conn.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0])
+        for t in (*COUNTED_TABLES, "meal_days")
+    ]
+    conn.executemany(
+        "INSERT OR REPLACE INTO row_counts (name, n) VALUES (?, ?)", counts
+    )
+
+
+def _migration_9(conn: sqlite3.Connection) -> None:
+    # Extra nutrients live in a side table keyed by (meal_id, code), so the
+    # meals row and idx_meals_day stay narrow. ``nutrients`` is the registry
+    # of known codes.
+    conn.execute(
+        "CREATE TABLE nutrients (code TEXT PRIMARY KEY, name TEXT NOT NULL, "
+        "unit TEXT NOT NULL) WITHOUT ROWID"
+    )
+    conn.executemany(
+        "INSERT INTO nutrients (code, name, unit) VALUES (?, ?, ?)",
+        [(code, name, unit) for code, (name, unit) in EXTRA_NUTRIENTS.items()],
+    )
+    conn.execute(
+        """
+        CREATE TABLE meal_nutrients (
+            meal_id     INTEGER NOT NULL,
+            code        TEXT NOT NULL,
+            amount      REAL NOT NULL,
+            PRIMARY KEY (meal_id, code)
+        ) WITHOUT ROWID
+        """
+    )
+    conn.execute(
+        "CREATE TRIGGER trg_meals_delete_nutrients AFTER DELETE ON meals BEGIN "
+        "DELETE FROM meal_nutrients WHERE meal_id = OLD.id; END"
+    )
+
+
+def _migration_10(conn: sqlite3.Connection) -> None:
+    # Hash of the normalized description for near-duplicate checks. It is
+    # computed in Python (insert_meal/update_meal), so there is no repair
+    # trigger; rows written elsewhere keep NULL until `nutri dedupe` fills
+    # them. The index answers "same day and description" with one seek.
+    conn.execute("ALTER TABLE meals ADD COLUMN desc_key INTEGER")
+    conn.execute(
+        "CREATE INDEX idx_meals_dedupe ON meals(day, desc_key, time, calories)"
+    )
+
+
+# Recomputes one day's row of day_totals from meals; {day} is an expression.
+DAY_TOTALS_REFRESH = (
+    "DELETE FROM day_totals WHERE day = {day}; "
+    "INSERT INTO day_totals (day, meals, {cols}) "
+    "SELECT day, COUNT(*), {sums} FROM meals WHERE day = {day} GROUP BY day;"
+)
+
+
+def _day_totals_refresh(day: str) -> str:
+    return DAY_TOTALS_REFRESH.format(
+        day=day,
+        cols=", ".join(MACRO_FIELDS),
+        sums=", ".join(f"TOTAL({f})" for f in MACRO_FIELDS),
+    )
+
+
+def _migration_11(conn: sqlite3.Connection) -> None:
+    # Per-day meal totals for streaks and adherence. Any write to a meal
+    # recomputes the (few) meals of the days it touches, so the cache is
+    # always exact and never needs a full rebuild.
+    macros = ", ".join(f"{f} REAL NOT NULL" for f in MACRO_FIELDS)
+    conn.execute(
+        f"CREATE TABLE day_totals (day INTEGER PRIMARY KEY, "
+        f"meals INTEGER NOT NULL, {macros})"
+    )
+    conn.execute(
+        f"INSERT INTO day_totals (day, meals, {', '.join(MACRO_FIELDS)}) "
+        f"SELECT day, COUNT(*), {', '.join(f'TOTAL({f})' for f in MACRO_FIELDS)} "
+        "FROM meals WHERE day IS NOT NULL GROUP BY day"
+    )
+    conn.execute(
+        "CREATE TRIGGER trg_meals_insert_totals AFTER INSERT ON meals BEGIN "
+        f"{_day_totals_refresh('NEW.day')} END"
+    )
+    conn.execute(
+        "CREATE TRIGGER trg_meals_delete_totals AFTER DELETE ON meals BEGIN "
+        f"{_day_totals_refresh('OLD.day')} END"
+    )
+    moved = _day_totals_refresh("NEW.day").replace(
+        "= NEW.day", "= NEW.day AND NEW.day IS NOT OLD.day"
+    )
+    conn.execute(
+        f"CREATE TRIGGER trg_meals_update_totals AFTER UPDATE OF day, "
+        f"{', '.join(MACRO_FIELDS)} ON meals BEGIN "
+        f"{_day_totals_refresh('OLD.day')} {moved} END"
+    )
+
+
 MIGRATIONS: dict[int, Callable[[sqlite3.Connection], None]] = {
     1: _migration_1,
+    2: _migration_2,
+    3: _migration_3,
+    4: _migration_4,
+    5: _migration_5,
+    6: _migration_6,
+    7: _migration_7,
+    8: _migration_8,
+    9: _migration_9,
+    10: _migration_10,
+    11: _migration_11,
 }
 
+BACKFILLS: dict[str, Backfill] = {
+    f"{table}_day": Backfill(table, f"day = {EPOCH_DAY_SQL.format(col=col)}")
+    for table, col in DAY_TABLES.items()
+}
+BACKFILLS["meals_desc_key"] = Backfill(
+    "meals", "desc_key = nutri_desc_key(description)"
+)
+# Backfills queued by a schema version, run in batches after it commits.
+MIGRATION_BACKFILLS: dict[int, tuple[str, ...]] = {
+    7: tuple(f"{table}_day" for table in DAY_TABLES),
+    10: ("meals_desc_key",),
+}
+
+
+def new_uid() -> str:
+    return uuid.uuid4().hex
+
+
+def utc_now() -> str:
+    """Current UTC time in SQLite's datetime('now') format."""
+    return datetime.now(timezone.utc).strftime("%Y-%m-%d %H:%M:%S")
+
 
 def insert_meal(conn: sqlite3.Connection, **kwargs) -> int:
+    kwargs.setdefault("uid", new_uid())
+    kwargs.setdefault("day", epoch_day(kwargs["date"]))
+    kwargs.setdefault("desc_key", description_key(kwargs.get("description")))
     cols = list(kwargs.keys())
     placeholders = ", ".join(["?"] * len(cols))
     col_names = ", ".join(cols)
@@ -130,6 +834,10 @@ def insert_meal(conn: sqlite3.Connection, **kwargs) -> int:
 def update_meal(conn: sqlite3.Connection, meal_id: int, **kwargs) -> bool:
     if not kwargs:
         return False
+    if "date" in kwargs:
+        kwargs["day"] = epoch_day(kwargs["date"])
+    if "description" in kwargs:
+        kwargs["desc_key"] = description_key(kwargs["description"])
     kwargs["updated_at"] = "datetime('now')"
     sets: list[str] = []
     vals: list[object] = []
@@ -158,14 +866,185 @@ def confirm_meal(conn: sqlite3.Connection, meal_id: int) -> bool:
     return update_meal(conn, meal_id, confirmed=1)
 
 
+def _meal_filter(
+    ids: list[int] | None = None,
+    date_from: str | None = None,
+    date_to: str | None = None,
+    source: str | None = None,
+    confidence: str | None = None,
+    unconfirmed: bool = False,
+) -> tuple[str, list]:
+    clauses: list[str] = []
+    params: list = []
+    if ids is not None:
+        clauses.append(f"id IN ({', '.join('?' * len(ids))})")
+        params += ids
+    if date_from is not None:
+        clauses.append("day >= ?")
+        params.append(epoch_day(date_from))
+    if date_to is not None:
+        clauses.append("day <= ?")
+        params.append(epoch_day(date_to))
+    if source is not None:
+        clauses.append("source = ?")
+        params.append(source)
+    if confidence is not None:
+        clauses.append("confidence = ?")
+        params.append(confidence)
+    if unconfirmed:
+        clauses.append("NOT confirmed")
+    if not clauses:
+        raise ValueError("Bulk operations need at least one filter.")
+    return " AND ".join(clauses), params
+
+
+def select_meal_ids(conn: sqlite3.Connection, **filters) -> list[int]:
+    where, params = _meal_filter(**filters)
+    rows = conn.execute(f"SELECT id FROM meals WHERE {where} ORDER BY id", params)
+    return [r[0] for r in rows]
+
+
+def update_meals(
+    conn: sqlite3.Connection, updates: dict[str, object], **filters
+) -> list[int]:
+    """Apply ``updates`` to every meal matching ``filters`` in one statement.
+
+    Returns the ids of the updated meals.
+    """
+    if not updates:
+        return []
+    if "description" in updates:
+        updates = {**updates, "desc_key": description_key(updates["description"])}
+    where, params = _meal_filter(**filters)
+    sets = ", ".join(f"{k} = ?" for k in updates)
+    rows = conn.execute(
+        f"UPDATE meals SET {sets}, updated_at = datetime('now') "
+        f"WHERE {where} RETURNING id",
+        [*updates.values(), *params],
+    ).fetchall()
+    conn.commit()
+    return sorted(r[0] for r in rows)
+
+
+def delete_meals(conn: sqlite3.Connection, **filters) -> list[int]:
+    """Delete every meal matching ``filters`` in one statement; returns their ids."""
+    where, params = _meal_filter(**filters)
+    rows = conn.execute(f"DELETE FROM meals WHERE {where} RETURNING id", params)
+    ids = sorted(r[0] for r in rows.fetchall())
+    conn.commit()
+    return ids
+
+
 def get_meal(conn: sqlite3.Connection, meal_id: int) -> dict | None:
-    row = conn.execute("SELECT * FROM meals WHERE id = ?", (meal_id,)).fetchone()
+    """A meal by id; archived meals are found too, marked ``archived``."""
+    row = conn.execute("SELECT * FROM main.meals WHERE id = ?", (meal_id,)).fetchone()
+    if row is None and has_archive(conn):
+        row = conn.execute(
+            f"SELECT * FROM {ARCHIVE_SCHEMA}.meals WHERE id = ?", (meal_id,)
+        ).fetchone()
+        return {**dict(row), "archived": True} if row else None
     return dict(row) if row else None
 
 
+def find_duplicate_meal(
+    conn: sqlite3.Connection,
+    date: str,
+    time: str | None,
+    description: str,
+    calories: float,
+    window: int = DUPLICATE_WINDOW_MIN,
+    tolerance: float = DUPLICATE_CAL_TOLERANCE,
+) -> dict | None:
+    """The earliest logged meal that the given one would duplicate, if any.
+
+    One seek on idx_meals_dedupe (day, desc_key) finds the candidates; the
+    time window and calorie tolerance are then checked on those few rows.
+    """
+    new = {"time": time, "calories": calories}
+    rows = conn.execute(
+        "SELECT id, time, calories FROM meals WHERE day = ? AND desc_key = ? "
+        "ORDER BY id",
+        (epoch_day(date), description_key(description)),
+    ).fetchall()
+    for r in rows:
+        if is_near_duplicate(dict(r), new, window, tolerance):
+            return get_meal(conn, r["id"])
+    return None
+
+
+def insert_meal_checked(
+    conn: sqlite3.Connection,
+    on_duplicate: str = "warn",
+    window: int = DUPLICATE_WINDOW_MIN,
+    tolerance: float = DUPLICATE_CAL_TOLERANCE,
+    **kwargs,
+) -> tuple[int | None, dict | None]:
+    """``insert_meal`` under a near-duplicate policy.
+
+    ``skip`` leaves out a meal that duplicates one already logged, ``warn``
+    inserts it anyway and ``insert`` does not check. Check and insert share
+    one write transaction, so two identical submissions racing each other
+    cannot both pass. Returns ``(meal_id, duplicate)``; ``meal_id`` is None
+    when the meal was skipped.
+    """
+    if on_duplicate == "insert":
+        return insert_meal(conn, **kwargs), None
+    with write_transaction(conn):
+        duplicate = find_duplicate_meal(
+            conn,
+            kwargs["date"],
+            kwargs.get("time"),
+            kwargs["description"],
+            kwargs["calories"],
+            window,
+            tolerance,
+        )
+        if duplicate and on_duplicate == "skip":
+            return None, duplicate
+        return insert_meal(conn, **kwargs), duplicate
+
+
+def find_duplicate_meals(
+    conn: sqlite3.Connection,
+    date_from: str,
+    date_to: str,
+    window: int = DUPLICATE_WINDOW_MIN,
+    tolerance: float = DUPLICATE_CAL_TOLERANCE,
+) -> dict[int, int]:
+    """``{duplicate_id: kept_id}`` for near-duplicate meals in a range.
+
+    Read-only, so ``nutri dedupe --dry-run`` never writes. One pass reads
+    the range in idx_meals_day order and groups each day's meals by their
+    description key (computed for rows other tools wrote without one). In
+    each group the earliest meal is kept and later ones that match a kept
+    meal are duplicates.
+    """
+    duplicates: dict[int, int] = {}
+    day = None
+    kept: dict[str, list[dict]] = {}
+    for r in conn.execute(
+        "SELECT id, day, time, calories, desc_key, description FROM meals "
+        "WHERE day BETWEEN ? AND ? ORDER BY day, time, id",
+        (epoch_day(date_from), epoch_day(date_to)),
+    ):
+        if r["day"] != day:
+            day, kept = r["day"], {}
+        meal = {"id": r["id"], "time": r["time"], "calories": r["calories"]}
+        group = kept.setdefault(r["desc_key"] or description_key(r["description"]), [])
+        match = next(
+            (k for k in group if is_near_duplicate(k, meal, window, tolerance)), None
+        )
+        if match is None:
+            group.append(meal)
+        else:
+            duplicates[meal["id"]] = match["id"]
+    return dict(sorted(duplicates.items()))
+
+
 def get_meals_by_date(conn: sqlite3.Connection, date: str) -> list[dict]:
+    src = _meals_source(conn, date, date)
     rows = conn.execute(
-        "SELECT * FROM meals WHERE date = ? ORDER BY time, id", (date,)
+        f"SELECT * FROM {src} WHERE day = ? ORDER BY time, id", (epoch_day(date),)
     ).fetchall()
     return [dict(r) for r in rows]
 
@@ -173,14 +1052,415 @@ def get_meals_by_date(conn: sqlite3.Connection, date: str) -> list[dict]:
 def get_meals_in_range(
     conn: sqlite3.Connection, date_from: str, date_to: str
 ) -> list[dict]:
+    """Meals in a range, read in idx_meals_day order (no sort step)."""
+    src = _meals_source(conn, date_from, date_to)
+    rows = conn.execute(
+        f"SELECT * FROM {src} WHERE day BETWEEN ? AND ? ORDER BY day, time, id",
+        (epoch_day(date_from), epoch_day(date_to)),
+    ).fetchall()
+    return [dict(r) for r in rows]
+
+
+def get_meal_months(
+    conn: sqlite3.Connection, date_from: str, date_to: str
+) -> dict[str, int]:
+    """``{"YYYY-MM": meals}`` for months in a range that have meals."""
+    src = _meals_source(conn, date_from, date_to)
+    rows = conn.execute(
+        f"SELECT substr(date, 1, 7) AS month, COUNT(*) AS meals FROM {src} "
+        "WHERE day BETWEEN ? AND ? GROUP BY month ORDER BY month",
+        (epoch_day(date_from), epoch_day(date_to)),
+    ).fetchall()
+    return {r["month"]: r["meals"] for r in rows}
+
+
+def iter_meal_rows(
+    conn: sqlite3.Connection, columns: tuple[str, ...], date_from: str, date_to: str
+) -> sqlite3.Cursor:
+    """Cursor over plain tuples of ``columns`` in (day, time, id) order.
+
+    Meant for ``fetchmany`` streaming, so large ranges never sit in memory.
+    """
+    src = _meals_source(conn, date_from, date_to)
+    cur = conn.cursor()
+    cur.row_factory = None
+    return cur.execute(
+        f"SELECT {', '.join(columns)} FROM {src} "
+        "WHERE day BETWEEN ? AND ? ORDER BY day, time, id",
+        (epoch_day(date_from), epoch_day(date_to)),
+    )
+
+
+def iter_meal_macros_in_range(
+    conn: sqlite3.Connection, date_from: str, date_to: str
+) -> Iterator[sqlite3.Row]:
+    """Stream (date, macros...) rows ordered by date without materializing them.
+
+    Only columns of idx_meals_day are read, so this is an index-only scan.
+    """
+    cols = ", ".join(MACRO_FIELDS)
+    src = _meals_source(conn, date_from, date_to)
+    return iter(
+        conn.execute(
+            f"SELECT {DAY_DATE_SQL.format(col='day')} AS date, {cols} FROM {src} "
+            "WHERE day BETWEEN ? AND ? ORDER BY day, time, id",
+            (epoch_day(date_from), epoch_day(date_to)),
+        )
+    )
+
+
+def _range_where(
+    date_from: str, date_to: str, between: tuple[str, str] | None = None
+) -> tuple[str, list[object]]:
+    where = "date >= ? AND date <= ?"
+    params: list[object] = [date_from, date_to]
+    if between:
+        start, end = between
+        joiner = "AND" if start <= end else "OR"
+        where += f" AND (time >= ? {joiner} time <= ?)"
+        params += [start, end]
+    return where, params
+
+
+BREAKDOWN_KEYS = {
+    "meal_type": "meal_type",
+    "hour": "CAST(substr(time, 1, 2) AS INTEGER)",
+}
+
+
+def get_meal_breakdown(
+    conn: sqlite3.Connection,
+    date_from: str,
+    date_to: str,
+    by: str,
+    between: tuple[str, str] | None = None,
+    nutrients: list[str] | None = None,
+) -> tuple[list[dict], list[dict]]:
+    """Aggregate meals per (date, key) and per key, grouped in SQL.
+
+    ``between`` is an inclusive HH:MM window; a start after the end wraps
+    around midnight (e.g. 21:00-02:00). With ``nutrients`` each cell and
+    total also gets a ``nutrients`` dict of those extra nutrient sums.
+    """
+    key = BREAKDOWN_KEYS[by]
+    src = _meals_source(conn, date_from, date_to)
+    where, params = _range_where(date_from, date_to, between)
+    sums = ", ".join(f"SUM({f}) AS {f}" for f in MACRO_FIELDS)
+    order = key
+    if by == "meal_type":
+        whens = " ".join(f"WHEN '{m}' THEN {i}" for i, m in enumerate(MEAL_TYPES))
+        order = f"CASE meal_type {whens} ELSE {len(MEAL_TYPES)} END"
+    cells = conn.execute(
+        f"SELECT date, {key} AS key, COUNT(*) AS meals, {sums} FROM {src} "
+        f"WHERE {where} GROUP BY date, {key} ORDER BY date, {order}",
+        params,
+    ).fetchall()
+    totals = conn.execute(
+        f"SELECT {key} AS key, COUNT(*) AS meals, COUNT(DISTINCT date) AS days, "
+        f"{sums} FROM {src} WHERE {where} GROUP BY {key} ORDER BY {order}",
+        params,
+    ).fetchall()
+    cells = [dict(r) for r in cells]
+    totals = [dict(r) for r in totals]
+    if nutrients:
+        # One extra grouped join; the macro sums above never touch the side table.
+        nsrc = _nutrients_source(conn, date_from, date_to)
+        marks = ", ".join("?" * len(nutrients))
+        rows = conn.execute(
+            f"SELECT date, {key} AS key, meal_nutrients.code AS code, "
+            f"SUM(amount) AS amount FROM {src} JOIN {nsrc} "
+            f"ON meal_nutrients.meal_id = meals.id "
+            f"WHERE {where} AND meal_nutrients.code IN ({marks}) "
+            f"GROUP BY date, {key}, meal_nutrients.code",
+            [*params, *nutrients],
+        ).fetchall()
+        attach_breakdown_nutrients(cells, totals, rows, nutrients)
+    return cells, totals
+
+
+def attach_breakdown_nutrients(
+    cells: list[dict], totals: list[dict], rows: Iterable, codes: list[str]
+) -> None:
+    """Add ``nutrients`` to breakdown cells and totals.
+
+    ``rows`` are mappings with ``date``, ``key``, ``code`` and ``amount``,
+    one per (date, key, code); missing codes count as 0.
+    """
+    by_cell: dict[tuple, dict[str, float]] = {}
+    by_key: dict[object, dict[str, float]] = {}
+    for r in rows:
+        by_cell.setdefault((r["date"], r["key"]), {})[r["code"]] = r["amount"]
+        per_key = by_key.setdefault(r["key"], {})
+        per_key[r["code"]] = per_key.get(r["code"], 0.0) + r["amount"]
+    for cell in cells:
+        amounts = by_cell.get((cell["date"], cell["key"]), {})
+        cell["nutrients"] = {c: amounts.get(c, 0.0) for c in codes}
+    for total in totals:
+        amounts = by_key.get(total["key"], {})
+        total["nutrients"] = {c: amounts.get(c, 0.0) for c in codes}
+
+
+# ── cached day totals ────────────────────────────────────────────────────────
+
+
+def _day_totals_source(conn: sqlite3.Connection, where: str = "") -> str:
+    """FROM-clause source for ``day_totals``, including archived days.
+
+    The archive is a regular nutri database whose own triggers keep its
+    ``day_totals`` in step with its meals, while the main cache only covers
+    main meals (triggers cannot read another database). A day with meals in
+    both adds the two rows. ``where`` (e.g. a day range) is applied to both
+    caches, since SQLite does not push it into the grouped union.
+    """
+    if not has_archive(conn):
+        return "day_totals"
+    cols = ", ".join(MACRO_FIELDS)
+    sums = ", ".join(f"SUM({f}) AS {f}" for f in MACRO_FIELDS)
+    cond = f" WHERE {where}" if where else ""
+    return (
+        f"(SELECT day, SUM(meals) AS meals, {sums} FROM ("
+        f"SELECT day, meals, {cols} FROM main.day_totals{cond} UNION ALL "
+        f"SELECT day, meals, {cols} FROM {ARCHIVE_SCHEMA}.day_totals{cond}) "
+        "GROUP BY day)"
+    )
+
+
+def get_cached_day_totals(
+    conn: sqlite3.Connection, date_from: str, date_to: str
+) -> dict[str, dict]:
+    """Per-day ``{"meals": n, "totals": {...}}`` read from ``day_totals``.
+
+    Same shape as ``queries.day_totals_in_range`` but one primary-key range
+    scan over the trigger-maintained cache instead of reading every meal.
+    """
+    rows = conn.execute(
+        f"SELECT {DAY_DATE_SQL.format(col='day')} AS date, meals, "
+        f"{', '.join(MACRO_FIELDS)} "
+        f"FROM {_day_totals_source(conn, 'day BETWEEN :start AND :stop')} "
+        "WHERE day BETWEEN :start AND :stop ORDER BY day",
+        {"start": epoch_day(date_from), "stop": epoch_day(date_to)},
+    ).fetchall()
+    return {
+        r["date"]: {"meals": r["meals"], "totals": {f: r[f] for f in MACRO_FIELDS}}
+        for r in rows
+    }
+
+
+def get_tracked_span(conn: sqlite3.Connection) -> tuple[str, str] | None:
+    """First and last day with meals or water, or None for an empty log."""
+    row = conn.execute(
+        f"SELECT {DAY_DATE_SQL.format(col='MIN(day)')}, "
+        f"{DAY_DATE_SQL.format(col='MAX(day)')} FROM ("
+        f"SELECT day FROM {_day_totals_source(conn)} UNION ALL "
+        "SELECT day FROM water WHERE day IS NOT NULL)"
+    ).fetchone()
+    return (row[0], row[1]) if row[0] else None
+
+
+# ── target adherence ─────────────────────────────────────────────────────────
+
+TARGET_FIELDS = ("calories", "protein_g", "carbs_g", "fat_g", "fiber_g")
+# How a day meets its target: calories must land within the tolerance, the
+# other fields must reach the goal (the opposite of `query --below`).
+TARGET_RULES = {"calories": "within"}
+
+
+def target_rule(field: str) -> str:
+    return TARGET_RULES.get(field, "at_least")
+
+
+def _target_days_sql(conn: sqlite3.Connection, field: str) -> str:
+    # Each target applies from its day until the next one (the latest entry
+    # wins within a day), like get_target_for_date. Days come from the
+    # trigger-maintained day_totals, so no meal is read.
+    if field not in TARGET_FIELDS:
+        raise ValueError(f"No targets for field: {field}.")
+    if target_rule(field) == "within":
+        hit = f"ABS(d.{field} - t.goal) <= t.goal * :tolerance"
+    else:
+        hit = f"d.{field} >= t.goal"
+    source = _day_totals_source(conn, "day BETWEEN :day_from AND :day_to")
+    return (
+        "WITH timeline AS ("
+        f"SELECT day AS start, LEAD(day) OVER (ORDER BY day) AS stop, {field} AS goal "
+        "FROM targets WHERE id IN (SELECT MAX(id) FROM targets GROUP BY day)), "
+        f"days AS (SELECT d.day AS day, d.{field} AS total, t.goal AS goal, "
+        f"{hit} AS hit FROM {source} AS d JOIN timeline AS t "
+        "ON d.day >= t.start AND (t.stop IS NULL OR d.day < t.stop) "
+        "WHERE d.day BETWEEN :day_from AND :day_to AND t.goal > 0) "
+    )
+
+
+def _target_days_params(
+    date_from: str | None, date_to: str | None, tolerance: float
+) -> dict:
+    return {
+        "day_from": epoch_day(date_from) if date_from else -(2**31),
+        "day_to": epoch_day(date_to) if date_to else 2**31,
+        "tolerance": tolerance,
+    }
+
+
+def get_target_hits(
+    conn: sqlite3.Connection,
+    field: str,
+    date_from: str | None,
+    date_to: str | None,
+    tolerance: float,
+) -> list[dict]:
+    """Days with meals and a target for ``field``: total, goal and ``hit``."""
+    rows = conn.execute(
+        _target_days_sql(conn, field)
+        + f"SELECT {DAY_DATE_SQL.format(col='day')} AS date, total, goal, hit "
+        "FROM days ORDER BY day",
+        _target_days_params(date_from, date_to, tolerance),
+    ).fetchall()
+    return [{**dict(r), "hit": bool(r["hit"])} for r in rows]
+
+
+def get_hit_streaks(
+    conn: sqlite3.Connection,
+    field: str,
+    date_from: str | None,
+    date_to: str | None,
+    tolerance: float,
+) -> list[dict]:
+    """Runs of consecutive days that hit the target, oldest first.
+
+    Gaps and islands: ``day - ROW_NUMBER()`` is constant within a run of
+    consecutive hit days. A day without meals or without a target ends a run.
+    """
     rows = conn.execute(
-        "SELECT * FROM meals WHERE date >= ? AND date <= ? ORDER BY date, time, id",
-        (date_from, date_to),
+        _target_days_sql(conn, field)
+        + ", runs AS (SELECT day, day - ROW_NUMBER() OVER (ORDER BY day) AS grp "
+        "FROM days WHERE hit) "
+        f"SELECT {DAY_DATE_SQL.format(col='MIN(day)')} AS start, "
+        f"{DAY_DATE_SQL.format(col='MAX(day)')} AS end, COUNT(*) AS days "
+        "FROM runs GROUP BY grp ORDER BY MIN(day)",
+        _target_days_params(date_from, date_to, tolerance),
     ).fetchall()
     return [dict(r) for r in rows]
 
 
+# ── extra nutrients ──────────────────────────────────────────────────────────
+
+
+def get_nutrients(conn: sqlite3.Connection) -> list[dict]:
+    """The nutrient registry: built-in and locally added codes."""
+    rows = conn.execute("SELECT code, name, unit FROM nutrients ORDER BY code")
+    return [dict(r) for r in rows]
+
+
+def add_nutrient(conn: sqlite3.Connection, code: str, name: str, unit: str) -> None:
+    conn.execute(
+        "INSERT INTO nutrients (code, name, unit) VALUES (?, ?, ?) "
+        "ON CONFLICT(code) DO UPDATE SET name = excluded.name, unit = excluded.unit",
+        (code, name, unit),
+    )
+    conn.commit()
+
+
+def resolve_nutrient_codes(conn: sqlite3.Connection, spec: str) -> list[str]:
+    """Registered codes for a comma-separated list, or every code for ``all``."""
+    known = [r["code"] for r in get_nutrients(conn)]
+    if spec.strip().lower() == "all":
+        return known
+    codes = list(dict.fromkeys(c.strip().lower() for c in spec.split(",") if c.strip()))
+    unknown = [c for c in codes if c not in known]
+    if unknown or not codes:
+        raise ValueError(
+            f"Unknown nutrient: {', '.join(unknown) or spec}. "
+            "See `nutri nutrients list`."
+        )
+    return codes
+
+
+def set_meal_nutrients(
+    conn: sqlite3.Connection, meal_id: int, amounts: dict[str, float | None]
+) -> None:
+    """Upsert extra nutrient amounts for a meal; ``None`` removes a code."""
+    conn.executemany(
+        "INSERT INTO meal_nutrients (meal_id, code, amount) VALUES (?, ?, ?) "
+        "ON CONFLICT DO UPDATE SET amount = excluded.amount",
+        [(meal_id, c, a) for c, a in amounts.items() if a is not None],
+    )
+    conn.executemany(
+        "DELETE FROM meal_nutrients WHERE meal_id = ? AND code = ?",
+        [(meal_id, c) for c, a in amounts.items() if a is None],
+    )
+    conn.commit()
+
+
+def get_meal_nutrients(conn: sqlite3.Connection, meal_id: int) -> dict[str, float]:
+    rows = conn.execute(
+        "SELECT code, amount FROM meal_nutrients WHERE meal_id = ? ORDER BY code",
+        (meal_id,),
+    )
+    return {r["code"]: r["amount"] for r in rows}
+
+
+def get_meal_nutrients_in_range(
+    conn: sqlite3.Connection, date_from: str, date_to: str, codes: list[str]
+) -> dict[int, dict[str, float]]:
+    """``{meal_id: {code: amount}}`` for meals in a range with any of ``codes``."""
+    rows = _nutrient_rows(
+        conn,
+        "meals.id AS meal_id, meal_nutrients.code AS code, amount",
+        "ORDER BY meals.day, meals.time, meals.id",
+        date_from,
+        date_to,
+        codes,
+    )
+    result: dict[int, dict[str, float]] = {}
+    for r in rows:
+        result.setdefault(r["meal_id"], {})[r["code"]] = r["amount"]
+    return result
+
+
+def get_nutrient_totals_in_range(
+    conn: sqlite3.Connection, date_from: str, date_to: str, codes: list[str]
+) -> dict[str, dict[str, float]]:
+    """Per-day sums of ``codes`` for days with any of them, grouped in SQL."""
+    rows = _nutrient_rows(
+        conn,
+        f"{DAY_DATE_SQL.format(col='meals.day')} AS date, "
+        "meal_nutrients.code AS code, SUM(amount) AS amount",
+        "GROUP BY meals.day, meal_nutrients.code ORDER BY meals.day",
+        date_from,
+        date_to,
+        codes,
+    )
+    result: dict[str, dict[str, float]] = {}
+    for r in rows:
+        result.setdefault(r["date"], {})[r["code"]] = r["amount"]
+    return result
+
+
+def _nutrient_rows(
+    conn: sqlite3.Connection,
+    select: str,
+    tail: str,
+    date_from: str,
+    date_to: str,
+    codes: list[str],
+) -> list[sqlite3.Row]:
+    # Meals in range come from idx_meals_day; each one is then a primary-key
+    # lookup on (meal_id, code) in the side table.
+    src = _meals_source(conn, date_from, date_to)
+    nsrc = _nutrients_source(conn, date_from, date_to)
+    marks = ", ".join("?" * len(codes))
+    return conn.execute(
+        f"SELECT {select} FROM {src} JOIN {nsrc} "
+        "ON meal_nutrients.meal_id = meals.id "
+        f"WHERE meals.day BETWEEN ? AND ? AND meal_nutrients.code IN ({marks}) {tail}",
+        (epoch_day(date_from), epoch_day(date_to), *codes),
+    ).fetchall()
+
+
 def insert_target(conn: sqlite3.Connection, **kwargs) -> int:
+    kwargs.setdefault("uid", new_uid())
+    kwargs.setdefault("day", epoch_day(kwargs["date_from"]))
+    kwargs.setdefault("updated_at", utc_now())
     cols = list(kwargs.keys())
     placeholders = ", ".join(["?"] * len(cols))
     col_names = ", ".join(cols)
@@ -194,18 +1474,23 @@ def insert_target(conn: sqlite3.Connection, **kwargs) -> int:
 
 def get_target_for_date(conn: sqlite3.Connection, date: str) -> dict | None:
     row = conn.execute(
-        "SELECT * FROM targets WHERE date_from <= ? ORDER BY date_from DESC LIMIT 1",
-        (date,),
+        "SELECT * FROM targets WHERE day <= ? ORDER BY day DESC LIMIT 1",
+        (epoch_day(date),),
     ).fetchone()
     return dict(row) if row else None
 
 
 def get_all_targets(conn: sqlite3.Connection) -> list[dict]:
-    rows = conn.execute("SELECT * FROM targets ORDER BY date_from DESC").fetchall()
+    rows = conn.execute(
+        "SELECT * FROM targets ORDER BY date_from DESC, id DESC"
+    ).fetchall()
     return [dict(r) for r in rows]
 
 
 def insert_water(conn: sqlite3.Connection, **kwargs) -> int:
+    kwargs.setdefault("uid", new_uid())
+    kwargs.setdefault("day", epoch_day(kwargs["date"]))
+    kwargs.setdefault("updated_at", utc_now())
     cols = list(kwargs.keys())
     placeholders = ", ".join(["?"] * len(cols))
     col_names = ", ".join(cols)
@@ -219,29 +1504,556 @@ def insert_water(conn: sqlite3.Connection, **kwargs) -> int:
 
 def get_water_by_date(conn: sqlite3.Connection, date: str) -> list[dict]:
     rows = conn.execute(
-        "SELECT * FROM water WHERE date = ? ORDER BY time, id", (date,)
+        "SELECT * FROM water WHERE day = ? ORDER BY time, id", (epoch_day(date),)
+    ).fetchall()
+    return [dict(r) for r in rows]
+
+
+def get_water_total(conn: sqlite3.Connection, date: str) -> float:
+    row = conn.execute(
+        "SELECT COALESCE(SUM(amount_ml), 0) FROM water WHERE day = ?",
+        (epoch_day(date),),
+    ).fetchone()
+    return float(row[0])
+
+
+def get_water_totals_in_range(
+    conn: sqlite3.Connection, date_from: str, date_to: str
+) -> dict[str, float]:
+    """Per-day water totals, summed in SQL from idx_water_day alone."""
+    rows = conn.execute(
+        f"SELECT {DAY_DATE_SQL.format(col='day')} AS date, "
+        "SUM(amount_ml) AS amount_ml FROM water "
+        "WHERE day BETWEEN ? AND ? GROUP BY day ORDER BY day",
+        (epoch_day(date_from), epoch_day(date_to)),
+    ).fetchall()
+    return {r["date"]: r["amount_ml"] for r in rows}
+
+
+def get_water_by_hour(
+    conn: sqlite3.Connection,
+    date_from: str,
+    date_to: str,
+    between: tuple[str, str] | None = None,
+) -> list[dict]:
+    """Water per (date, hour), with the same HH:MM window rules as meals."""
+    where, params = _range_where(date_from, date_to, between)
+    hour = BREAKDOWN_KEYS["hour"]
+    rows = conn.execute(
+        f"SELECT date, {hour} AS key, SUM(amount_ml) AS water_ml FROM water "
+        f"WHERE {where} GROUP BY date, {hour} ORDER BY date, {hour}",
+        params,
+    ).fetchall()
+    return [dict(r) for r in rows]
+
+
+def get_data_version(conn: sqlite3.Connection) -> int:
+    """Changes whenever another connection commits to the database."""
+    return conn.execute("PRAGMA data_version").fetchone()[0]
+
+
+def get_last_change_seq(conn: sqlite3.Connection) -> int:
+    return conn.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+
+
+def get_changes_since(
+    conn: sqlite3.Connection, seq: int, tables: tuple[str, ...] = SYNC_TABLES
+) -> list[dict]:
+    marks = ", ".join("?" * len(tables))
+    rows = conn.execute(
+        f"SELECT * FROM changes WHERE seq > ? AND tbl IN ({marks}) ORDER BY seq",
+        (seq, *tables),
     ).fetchall()
     return [dict(r) for r in rows]
 
 
-def get_db_stats(conn: sqlite3.Connection) -> dict:
-    meal_count = conn.execute("SELECT COUNT(*) FROM meals").fetchone()[0]
-    days_tracked = conn.execute("SELECT COUNT(DISTINCT date) FROM meals").fetchone()[0]
-    first_date = conn.execute("SELECT MIN(date) FROM meals").fetchone()[0]
-    water_entries = conn.execute("SELECT COUNT(*) FROM water").fetchone()[0]
-    target_count = conn.execute("SELECT COUNT(*) FROM targets").fetchone()[0]
+def get_row(conn: sqlite3.Connection, table: str, row_id: int) -> dict | None:
+    row = conn.execute(f"SELECT * FROM {table} WHERE id = ?", (row_id,)).fetchone()
+    return dict(row) if row else None
+
+
+def get_db_stats(conn: sqlite3.Connection, exact: bool = False) -> dict:
+    """Row counts and date coverage.
+
+    Reads the trigger-maintained counters; ``exact`` recounts from the base
+    tables instead (a full scan of meals).
+    """
+    if exact:
+        meal_count = conn.execute("SELECT COUNT(*) FROM meals").fetchone()[0]
+        days_tracked = conn.execute(
+            "SELECT COUNT(DISTINCT date) FROM meals"
+        ).fetchone()[0]
+        first_date = conn.execute("SELECT MIN(date) FROM meals").fetchone()[0]
+        water_entries = conn.execute("SELECT COUNT(*) FROM water").fetchone()[0]
+        target_count = conn.execute("SELECT COUNT(*) FROM targets").fetchone()[0]
+    else:
+        counts = dict(conn.execute("SELECT name, n FROM row_counts").fetchall())
+        meal_count = counts.get("meals", 0)
+        days_tracked = counts.get("meal_days", 0)
+        first_date = conn.execute("SELECT MIN(date) FROM meal_days").fetchone()[0]
+        water_entries = counts.get("water", 0)
+        target_count = counts.get("targets", 0)
     schema_version = conn.execute("PRAGMA user_version").fetchone()[0]
-    db_path = None
-    for row in conn.execute("PRAGMA database_list").fetchall():
-        if row["name"] == "main":
-            db_path = row["file"]
-            break
+    db_path = get_main_db_path(conn)
     return {
-        "db_path": db_path or str(get_db_path()),
+        "db_path": str(db_path or get_db_path()),
         "schema_version": schema_version,
         "meals": meal_count,
         "days_tracked": days_tracked,
         "since": first_date,
         "water_entries": water_entries,
         "targets": target_count,
+        "archived_years": list_archive_years(conn),
+    }
+
+
+def get_storage_stats(conn: sqlite3.Connection, objects: bool = False) -> dict:
+    """Page and file sizes; with ``objects``, per table/index sizes.
+
+    Object sizes come from the ``dbstat`` virtual table, which walks every
+    page, and are ``None`` when SQLite was built without it.
+    """
+    page_size = conn.execute("PRAGMA page_size").fetchone()[0]
+    page_count = conn.execute("PRAGMA page_count").fetchone()[0]
+    stats: dict = {
+        "page_size": page_size,
+        "page_count": page_count,
+        "freelist_count": conn.execute("PRAGMA freelist_count").fetchone()[0],
+        **get_file_sizes(conn),
+    }
+    if objects:
+        try:
+            rows = conn.execute(
+                "SELECT s.name, COALESCE(m.type, 'table') AS type, "
+                "COALESCE(m.tbl_name, s.name) AS tbl_name, s.pageno AS pages, "
+                "s.pgsize AS bytes FROM dbstat('main', 1) AS s "
+                "LEFT JOIN sqlite_schema AS m ON m.name = s.name "
+                "ORDER BY s.pgsize DESC, s.name"
+            ).fetchall()
+            stats["objects"] = [
+                {
+                    "name": r["name"],
+                    "type": r["type"],
+                    "table": r["tbl_name"],
+                    "pages": r["pages"],
+                    "bytes": r["bytes"],
+                }
+                for r in rows
+            ]
+        except sqlite3.OperationalError:
+            stats["objects"] = None
+    return stats
+
+
+# ── maintenance & archives ───────────────────────────────────────────────────
+
+
+ARCHIVE_SCHEMA = "archive"
+
+
+def archive_path(db_path: Path) -> Path:
+    return db_path.with_name(f"{db_path.stem}-archive{db_path.suffix}")
+
+
+def attach_archive(
+    conn: sqlite3.Connection, read_only: bool = False, immutable: bool = False
+) -> bool:
+    """Attach the archive next to the main file, if there is one.
+
+    Connections attach it when they are opened, because SQLite cannot
+    attach inside a transaction. Returns whether it is attached.
+    """
+    if has_archive(conn):
+        return True
+    path = get_main_db_path(conn)
+    if path is None or not archive_path(path).is_file():
+        return False
+    target = str(archive_path(path))
+    if read_only:
+        target = archive_path(path).resolve().as_uri() + "?mode=ro"
+        if immutable:
+            target += "&immutable=1"
+    conn.execute(f"ATTACH DATABASE ? AS {ARCHIVE_SCHEMA}", (target,))
+    return True
+
+
+def has_archive(conn: sqlite3.Connection) -> bool:
+    return any(
+        r["name"] == ARCHIVE_SCHEMA for r in conn.execute("PRAGMA database_list")
+    )
+
+
+def list_archive_years(conn: sqlite3.Connection) -> list[int]:
+    if not has_archive(conn):
+        return []
+    rows = conn.execute(
+        f"SELECT DISTINCT substr(date, 1, 4) FROM {ARCHIVE_SCHEMA}.meals ORDER BY 1"
+    )
+    return [int(r[0]) for r in rows if r[0].isdigit()]
+
+
+def _table_columns(
+    conn: sqlite3.Connection, table: str, schema: str = "main"
+) -> list[str]:
+    return [r["name"] for r in conn.execute(f"PRAGMA {schema}.table_info({table})")]
+
+
+def _archive_overlaps(conn: sqlite3.Connection, date_from: str, date_to: str) -> bool:
+    if not has_archive(conn):
+        return False
+    # Two seeks on idx_meals_date, so ranges past the archive skip the UNION.
+    first, last = conn.execute(
+        f"SELECT MIN(date), MAX(date) FROM {ARCHIVE_SCHEMA}.meals"
+    ).fetchone()
+    return first is not None and first <= date_to and last >= date_from
+
+
+def _meals_source(conn: sqlite3.Connection, date_from: str, date_to: str) -> str:
+    """FROM-clause source for meals in a range, including archived ones.
+
+    Returns plain ``meals`` when the archive does not overlap the range;
+    otherwise both are combined with UNION ALL. Columns missing from an
+    older archive are filled with NULL.
+    """
+    if not _archive_overlaps(conn, date_from, date_to):
+        return "meals"
+    cols = _table_columns(conn, "meals")
+    have = set(_table_columns(conn, "meals", ARCHIVE_SCHEMA))
+    missing = {"day": f"{EPOCH_DAY_SQL.format(col='date')} AS day"}
+    select = ", ".join(c if c in have else missing.get(c, f"NULL AS {c}") for c in cols)
+    return (
+        f"(SELECT {', '.join(cols)} FROM main.meals UNION ALL "
+        f"SELECT {select} FROM {ARCHIVE_SCHEMA}.meals) AS meals"
+    )
+
+
+def _nutrients_source(conn: sqlite3.Connection, date_from: str, date_to: str) -> str:
+    """``meal_nutrients`` counterpart of ``_meals_source``.
+
+    An archive created before extra nutrients existed has no side table.
+    """
+    if not _archive_overlaps(conn, date_from, date_to) or not _table_columns(
+        conn, "meal_nutrients", ARCHIVE_SCHEMA
+    ):
+        return "meal_nutrients"
+    return (
+        "(SELECT meal_id, code, amount FROM main.meal_nutrients UNION ALL "
+        f"SELECT meal_id, code, amount FROM {ARCHIVE_SCHEMA}.meal_nutrients) "
+        "AS meal_nutrients"
+    )
+
+
+def archive_meals_before(conn: sqlite3.Connection, before: str) -> dict[str, int]:
+    """Move meals dated before ``before`` into the archive database.
+
+    The archive is a regular nutri database next to the main file, and one
+    file however many years it holds. Archived meals stay in range reads but
+    are read-only. Rows are copied with INSERT OR REPLACE before being
+    deleted, so re-running after an interruption is safe. Returns the
+    number of meals moved per year.
+    """
+    path = get_main_db_path(conn)
+    if path is None:
+        raise RuntimeError("Archiving requires a file-backed database.")
+    where = "date < ? AND substr(date, 1, 4) GLOB '[0-9][0-9][0-9][0-9]'"
+    moved = {
+        r[0]: r[1]
+        for r in conn.execute(
+            f"SELECT substr(date, 1, 4), COUNT(*) FROM main.meals WHERE {where} "
+            "GROUP BY 1 ORDER BY 1",
+            (before,),
+        )
+    }
+    if not moved:
+        return {}
+    # Create the archive (or bring its schema up to date) before attaching.
+    get_connection(archive_path(path)).close()
+    attach_archive(conn)
+    cols = ", ".join(_table_columns(conn, "meals"))
+    with write_transaction(conn):
+        last_seq = conn.execute("SELECT MAX(seq) FROM main.changes").fetchone()[0]
+        conn.execute(
+            f"INSERT OR REPLACE INTO {ARCHIVE_SCHEMA}.meals ({cols}) "
+            f"SELECT {cols} FROM main.meals WHERE {where}",
+            (before,),
+        )
+        conn.execute(
+            f"INSERT OR REPLACE INTO {ARCHIVE_SCHEMA}.meal_nutrients "
+            "(meal_id, code, amount) SELECT n.meal_id, n.code, n.amount "
+            "FROM main.meal_nutrients AS n JOIN main.meals ON main.meals.id = "
+            f"n.meal_id WHERE {where}",
+            (before,),
+        )
+        # The archive's own triggers fill its day_totals, and the main
+        # triggers drop these days from the main cache (_day_totals_source).
+        conn.execute(f"DELETE FROM main.meals WHERE {where}", (before,))
+        # Archiving is local housekeeping, not a deletion to sync to peers.
+        conn.execute(
+            "UPDATE main.changes SET origin = 'archive' WHERE seq > ?",
+            (last_seq or 0,),
+        )
+    return moved
+
+
+def checkpoint_wal(conn: sqlite3.Connection, mode: str = "TRUNCATE") -> dict:
+    busy, wal_pages, checkpointed = conn.execute(
+        f"PRAGMA wal_checkpoint({mode})"
+    ).fetchone()
+    return {
+        "busy": bool(busy),
+        "wal_pages": wal_pages,
+        "checkpointed_pages": checkpointed,
+    }
+
+
+def optimize_db(conn: sqlite3.Connection) -> dict:
+    """Refresh planner statistics (full ANALYZE only if none exist yet)."""
+    has_stats = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'"
+    ).fetchone()
+    if not has_stats:
+        conn.execute("ANALYZE")
+    conn.execute("PRAGMA optimize")
+    conn.commit()
+    return {"analyzed": not has_stats}
+
+
+def vacuum_db(conn: sqlite3.Connection, pages: int | None = None) -> dict:
+    """Reclaim free pages.
+
+    Databases created before incremental auto-vacuum was enabled get a
+    one-time full VACUUM to switch modes; afterwards only up to ``pages``
+    free pages (default: all) are released per run.
+    """
+    free_before = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+        conn.execute("PRAGMA auto_vacuum=INCREMENTAL")
+        conn.execute("VACUUM")
+        mode = "full"
+    else:
+        conn.execute(f"PRAGMA incremental_vacuum({int(pages or 0)})").fetchall()
+        mode = "incremental"
+    free_after = conn.execute("PRAGMA freelist_count").fetchone()[0]
+    return {"mode": mode, "freed_pages": free_before - free_after}
+
+
+def get_file_sizes(conn: sqlite3.Connection) -> dict:
+    path = get_main_db_path(conn)
+    if path is None:
+        return {"db_bytes": 0, "wal_bytes": 0}
+    wal = path.with_name(path.name + "-wal")
+    return {
+        "db_bytes": path.stat().st_size if path.exists() else 0,
+        "wal_bytes": wal.stat().st_size if wal.exists() else 0,
+    }
+
+
+# ── backup & restore ─────────────────────────────────────────────────────────
+
+BACKUP_PAGES = 256
+BACKUP_SLEEP = 0.005
+
+
+def integrity_check(conn: sqlite3.Connection, quick: bool = False) -> str:
+    """Return "ok" or the problems reported by SQLite, one per line."""
+    pragma = "quick_check" if quick else "integrity_check"
+    rows = conn.execute(f"PRAGMA {pragma}").fetchall()
+    return "\n".join(str(r[0]) for r in rows)
+
+
+def backup_db(
+    conn: sqlite3.Connection,
+    dest: Path,
+    pages: int = BACKUP_PAGES,
+    sleep: float = BACKUP_SLEEP,
+    vacuum_into: bool = False,
+) -> dict:
+    """Write an online snapshot of the database to ``dest``.
+
+    The default mode copies ``pages`` pages per step through the SQLite backup
+    API and sleeps ``sleep`` seconds between steps, so the source is only read
+    in short bursts and concurrent writers keep making progress.
+    ``vacuum_into`` writes a compacted copy with ``VACUUM INTO`` instead.
+    An archive is snapshotted the same way to ``archive_path(dest)``. The
+    snapshots are checked and only then moved into place.
+    """
+    dest = dest.expanduser()
+    dest.parent.mkdir(parents=True, exist_ok=True)
+    started = time.perf_counter()
+    targets = {"main": dest}
+    if has_archive(conn):
+        targets[ARCHIVE_SCHEMA] = archive_path(dest)
+    partials: dict[Path, Path] = {}
+    steps = 0
+    try:
+        for schema, path in targets.items():
+            partial = path.with_name(path.name + ".partial")
+            partials[path] = partial
+            steps += _snapshot(conn, schema, partial, pages, sleep, vacuum_into)
+    except BaseException:
+        for partial in partials.values():
+            partial.unlink(missing_ok=True)
+        raise
+    for path, partial in partials.items():
+        partial.replace(path)
+    if ARCHIVE_SCHEMA not in targets:
+        # A stale archive beside the file would be restored with it.
+        archive_path(dest).unlink(missing_ok=True)
+    return {
+        "path": str(dest),
+        "archive": str(targets[ARCHIVE_SCHEMA]) if ARCHIVE_SCHEMA in targets else None,
+        "mode": "vacuum-into" if vacuum_into else "backup",
+        "bytes": sum(path.stat().st_size for path in targets.values()),
+        "steps": steps,
+        "seconds": round(time.perf_counter() - started, 3),
+    }
+
+
+def _snapshot(
+    conn: sqlite3.Connection,
+    schema: str,
+    partial: Path,
+    pages: int,
+    sleep: float,
+    vacuum_into: bool,
+) -> int:
+    """Copy one attached database to ``partial`` and check it; returns the steps."""
+    partial.unlink(missing_ok=True)
+    steps = 0
+    if vacuum_into:
+        conn.execute(f"VACUUM {schema} INTO ?", (str(partial),))
+        steps = 1
+    else:
+
+        def progress(status: int, remaining: int, total: int) -> None:
+            nonlocal steps
+            steps += 1
+            if remaining and sleep:
+                time.sleep(sleep)
+
+        target = sqlite3.connect(str(partial))
+        try:
+            conn.backup(target, pages=pages, progress=progress, name=schema)
+        finally:
+            target.close()
+
+    check_conn = sqlite3.connect(str(partial))
+    try:
+        check = integrity_check(check_conn, quick=True)
+    finally:
+        check_conn.close()
+    if check != "ok":
+        raise RuntimeError(f"Backup failed integrity check: {check}")
+    return steps
+
+
+def backup_file_name(conn: sqlite3.Connection) -> str:
+    """Timestamped file name for backups written into a directory."""
+    path = get_main_db_path(conn) or get_db_path()
+    stamp = datetime.now().strftime("%Y%m%d-%H%M%S")
+    return f"{path.stem}-{stamp}{path.suffix or '.db'}"
+
+
+def prune_backups(directory: Path, stem: str, keep: int) -> list[str]:
+    """Delete all but the newest ``keep`` timestamped backups of ``stem``."""
+    backups = sorted(
+        p
+        for p in directory.glob(f"{glob.escape(stem)}-*")
+        if p.name[len(stem) + 1 : len(stem) + 16].replace("-", "").isdigit()
+        and not p.name.endswith(".partial")
+    )
+    backups = [p for p in backups if not p.stem.endswith("-archive")]
+    removed = backups[: max(len(backups) - keep, 0)]
+    for p in removed:
+        p.unlink()
+        archive_path(p).unlink(missing_ok=True)
+    return [str(p) for p in removed]
+
+
+def _check_snapshot(src: Path) -> int:
+    """Integrity and schema checks for a snapshot; returns its schema version."""
+    src_conn = sqlite3.connect(str(src))
+    try:
+        check = integrity_check(src_conn)
+        if check != "ok":
+            raise RuntimeError(f"Backup failed integrity check: {check}")
+        tables = {
+            r[0]
+            for r in src_conn.execute(
+                "SELECT name FROM sqlite_master WHERE type='table'"
+            )
+        }
+        if not {"meals", "targets", "water"} <= tables:
+            raise RuntimeError(f"{src} is not a nutri database.")
+        version = src_conn.execute("PRAGMA user_version").fetchone()[0]
+    finally:
+        src_conn.close()
+    if version > SCHEMA_VERSION:
+        raise RuntimeError(
+            f"Backup schema version {version} is newer than this CLI "
+            f"(max {SCHEMA_VERSION}). Please update nutri."
+        )
+    return version
+
+
+def _copy_snapshot(src: Path, conn: sqlite3.Connection) -> None:
+    src_conn = sqlite3.connect(str(src))
+    try:
+        src_conn.backup(conn)
+    finally:
+        src_conn.close()
+
+
+def restore_db(conn: sqlite3.Connection, src: Path) -> dict:
+    """Replace the database behind ``conn`` with the snapshot at ``src``.
+
+    The snapshot must pass a full integrity check and look like a nutri
+    database; older snapshots are migrated after the copy. An archive
+    snapshot next to ``src`` is restored with it; without one, the current
+    archive is emptied, so archived meals never outlive the restore.
+    """
+    src = src.expanduser()
+    if not src.exists():
+        raise RuntimeError(f"Backup not found: {src}")
+    version = _check_snapshot(src)
+    archive_src = archive_path(src)
+    path = get_main_db_path(conn)
+    if archive_src.is_file():
+        _check_snapshot(archive_src)
+        if path is None:
+            raise RuntimeError(
+                "The backup has archived meals; restore it into a database file."
+            )
+
+    _copy_snapshot(src, conn)
+    if archive_src.is_file():
+        archive_conn = sqlite3.connect(str(archive_path(path)))
+        try:
+            _copy_snapshot(archive_src, archive_conn)
+        finally:
+            archive_conn.close()
+        attach_archive(conn)
+    elif has_archive(conn):
+        with conn:
+            conn.execute(f"DELETE FROM {ARCHIVE_SCHEMA}.meals")
+            if _table_columns(conn, "meal_nutrients", ARCHIVE_SCHEMA):
+                conn.execute(f"DELETE FROM {ARCHIVE_SCHEMA}.meal_nutrients")
+
+    _ensure_schema(conn)
+    check = integrity_check(conn)
+    if check != "ok":
+        raise RuntimeError(f"Restored database failed integrity check: {check}")
+    archived = (
+        conn.execute(f"SELECT COUNT(*) FROM {ARCHIVE_SCHEMA}.meals").fetchone()[0]
+        if has_archive(conn)
+        else 0
+    )
+    return {
+        "restored_from": str(src),
+        "schema_version": SCHEMA_VERSION,
+        "migrated_from": version,
+        "meals": conn.execute("SELECT COUNT(*) FROM main.meals").fetchone()[0],
+        "archived_meals": archived,
+        "water_entries": conn.execute("SELECT COUNT(*) FROM water").fetchone()[0],
+        "targets": conn.execute("SELECT COUNT(*) FROM targets").fetchone()[0],
     }
@@ -0,0 +1,119 @@
+"""Optional DuckDB engine for per-day meal aggregation.
+
+``query --engine duckdb`` attaches the SQLite file read-only to an
+in-process DuckDB and computes per-day meal counts and macro totals with
+its vectorized executor. Each day's values are added in the same order as
+the SQLite path (time, then id) starting from 0.0, so the floating-point
+results are identical, not just close. DuckDB is an optional dependency:
+``pip install 'nutri-cli[duckdb]'``.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+from pathlib import Path
+
+from .db import archive_path, get_main_db_path, has_archive
+from .models import MACRO_FIELDS, epoch_day
+
+
+class EngineUnavailable(RuntimeError):
+    """The requested engine cannot run here (missing package or extension)."""
+
+
+def _extension_package_path(duckdb) -> Path | None:
+    # Offline installs can ship the extension as a Python package instead.
+    try:
+        import duckdb_extension_sqlite_scanner as ext
+    except ImportError:
+        return None
+    path = (
+        Path(ext.__file__).parent
+        / "extensions"
+        / f"v{duckdb.__version__}"
+        / "sqlite_scanner.duckdb_extension"
+    )
+    return path if path.exists() else None
+
+
+def connect_duckdb():
+    """An in-memory DuckDB connection with the sqlite extension loaded."""
+    try:
+        import duckdb
+    except ImportError:
+        raise EngineUnavailable(
+            "The duckdb engine needs the duckdb package: "
+            "pip install 'nutri-cli[duckdb]'."
+        ) from None
+    duck = duckdb.connect()
+    packaged = _extension_package_path(duckdb)
+    attempts = [f"LOAD '{packaged}'"] if packaged else []
+    attempts += ["LOAD sqlite", "INSTALL sqlite"]
+    for statement in attempts:
+        try:
+            duck.execute(statement)
+            if statement == "INSTALL sqlite":
+                duck.execute("LOAD sqlite")
+            return duck
+        except duckdb.Error:
+            continue
+    duck.close()
+    raise EngineUnavailable(
+        "DuckDB could not load its sqlite extension. Run once with network "
+        "access or install duckdb-extension-sqlite-scanner."
+    )
+
+
+def _day_totals_sql(sources: list[str]) -> str:
+    # Each day's meals are collected once in (time, id) order, and every
+    # field is then folded left to right from 0.0 like Python's sum.
+    fields = ", ".join(f"'{f}': COALESCE({f}, 0)::DOUBLE" for f in MACRO_FIELDS)
+    sums = ", ".join(
+        f"list_reduce(list_prepend(0.0::DOUBLE, list_transform(m, lambda x: x.{f})), "
+        f"lambda a, b: a + b) AS {f}"
+        for f in MACRO_FIELDS
+    )
+    return (
+        f"WITH days AS (SELECT day, list({{{fields}}} ORDER BY time NULLS FIRST, id) AS m "
+        f"FROM ({' UNION ALL '.join(sources)}) WHERE day BETWEEN ? AND ? GROUP BY day) "
+        "SELECT CAST(DATE '1970-01-01' + CAST(day AS INTEGER) AS VARCHAR) AS date, "
+        f"len(m) AS meals, {sums} FROM days ORDER BY day"
+    )
+
+
+def duckdb_day_totals(
+    conn: sqlite3.Connection, date_from: str, date_to: str
+) -> dict[str, dict]:
+    """Per-day ``{"meals": n, "totals": {...}}`` computed by DuckDB.
+
+    Same shape and values as ``queries.day_totals_in_range``; the archive is
+    attached and included as well.
+    """
+    path = get_main_db_path(conn)
+    if path is None:
+        raise EngineUnavailable("The duckdb engine needs a file-backed database.")
+    duck = connect_duckdb()
+    try:
+        sources = []
+        files = [path, archive_path(path)] if has_archive(conn) else [path]
+        for i, file in enumerate(files):
+            quoted = str(file).replace("'", "''")
+            duck.execute(f"ATTACH '{quoted}' AS src{i} (TYPE sqlite, READ_ONLY)")
+            # An archive written by an older version may lack the day column.
+            day = (
+                "day"
+                if i == 0
+                else "date_diff('day', DATE '1970-01-01', TRY_CAST(date AS DATE))"
+            )
+            sources.append(
+                f"SELECT {day} AS day, time, id, {', '.join(MACRO_FIELDS)} "
+                f"FROM src{i}.meals"
+            )
+        rows = duck.execute(
+            _day_totals_sql(sources), [epoch_day(date_from), epoch_day(date_to)]
+        ).fetchall()
+    finally:
+        duck.close()
+    return {
+        r[0]: {"meals": r[1], "totals": dict(zip(MACRO_FIELDS, r[2:]))} for r in rows
+    }
@@ -0,0 +1,215 @@
+"""Run read-only queries across many nutri databases in a process pool.
+
+Each database is opened read-only in a worker process and summarized with
+the regular ``queries``/``db`` functions. A failing database becomes an
+error row instead of aborting the run. Workers return small, mergeable
+partials (sums, day counts, serialized quantile sketches), so combined
+averages and percentiles are computed without shipping per-day data back.
+"""
+
+from __future__ import annotations
+
+import glob
+import os
+from concurrent.futures import FIRST_COMPLETED, Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Callable, Iterable
+
+from . import db, queries
+from .models import MACRO_FIELDS
+from .stats import QuantileSketch, exact_quantile
+
+# Submitted-but-unfinished databases per worker; bounds memory for huge fleets.
+QUEUE_PER_WORKER = 4
+
+
+def expand(pattern: str) -> list[Path]:
+    """Database files matching a glob (``**`` recurses), sorted."""
+    matches = glob.glob(os.path.expanduser(pattern), recursive=True)
+    return sorted(Path(m) for m in matches if Path(m).is_file())
+
+
+def default_jobs() -> int:
+    return os.cpu_count() or 1
+
+
+# ── workers (module level so they can be pickled) ────────────────────────────
+
+
+def info_worker(path: str) -> dict:
+    conn = db.get_read_connection(Path(path))
+    try:
+        stats = db.get_db_stats(conn)
+        storage = db.get_storage_stats(conn)
+    finally:
+        conn.close()
+    return {
+        "meals": stats["meals"],
+        "days_tracked": stats["days_tracked"],
+        "since": stats["since"],
+        "water_entries": stats["water_entries"],
+        "targets": stats["targets"],
+        "schema_version": stats["schema_version"],
+        "db_bytes": storage["db_bytes"],
+        "wal_bytes": storage["wal_bytes"],
+    }
+
+
+def query_worker(path: str, date_from: str, date_to: str) -> dict:
+    conn = db.get_read_connection(Path(path))
+    try:
+        result = queries.range_summary(conn, date_from, date_to, avg=True)
+    finally:
+        conn.close()
+    sketches = {f: QuantileSketch() for f in queries.DISTRIBUTION_FIELDS}
+    sums = {f: 0.0 for f in MACRO_FIELDS}
+    for day in result["daily"].values():
+        if not day["meals"]:
+            continue
+        for f in MACRO_FIELDS:
+            sums[f] += day["totals"][f]
+        for f, sketch in sketches.items():
+            sketch.add(day["totals"][f])
+    return {
+        "days": result["days"],
+        "total_meals": result["total_meals"],
+        "water_days": result["water_days"],
+        "total_water_ml": result["total_water_ml"],
+        "averages": result["averages"],
+        "_sums": sums,
+        "_sketches": {f: s.to_dict() for f, s in sketches.items()},
+    }
+
+
+def _call(worker: Callable[..., dict], path: str, args: tuple) -> dict:
+    # Runs in the worker process: any failure becomes this database's row.
+    try:
+        return {"db": path, **worker(path, *args)}
+    except Exception as e:
+        return {"db": path, "error": f"{type(e).__name__}: {e}"}
+
+
+def run(
+    paths: Iterable[Path],
+    worker: Callable[..., dict],
+    args: tuple = (),
+    jobs: int | None = None,
+) -> list[dict]:
+    """``worker(path, *args)`` for every database, in path order.
+
+    At most ``jobs`` databases are processed at once and only a few more
+    are queued, so thousands of files do not pile up in memory.
+    """
+    jobs = max(1, jobs or default_jobs())
+    results: dict[str, dict] = {}
+    order: list[str] = []
+    pending: dict[Future, str] = {}
+
+    def collect(done: Iterable[Future]) -> None:
+        for future in done:
+            path = pending.pop(future)
+            try:
+                results[path] = future.result()
+            except Exception as e:
+                # The worker process itself died (e.g. killed or crashed).
+                results[path] = {"db": path, "error": f"{type(e).__name__}: {e}"}
+
+    pool = ProcessPoolExecutor(max_workers=jobs)
+    try:
+        for p in paths:
+            path = str(p)
+            order.append(path)
+            try:
+                future = pool.submit(_call, worker, path, args)
+            except BrokenProcessPool:
+                # A dead worker takes the whole pool down: every database
+                # still queued in it fails, and the rest run in a new pool.
+                collect(wait(pending).done)
+                pool.shutdown()
+                pool = ProcessPoolExecutor(max_workers=jobs)
+                future = pool.submit(_call, worker, path, args)
+            pending[future] = path
+            if len(pending) >= jobs * QUEUE_PER_WORKER:
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                collect(done)
+        while pending:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            collect(done)
+    finally:
+        pool.shutdown()
+    return [results[path] for path in order]
+
+
+# ── merging ──────────────────────────────────────────────────────────────────
+
+
+def merge_info(rows: list[dict]) -> dict:
+    ok = [r for r in rows if "error" not in r]
+    sinces = [r["since"] for r in ok if r["since"]]
+    return {
+        "databases": len(rows),
+        "failed": len(rows) - len(ok),
+        **{
+            key: sum(r[key] for r in ok)
+            for key in (
+                "meals",
+                "days_tracked",
+                "water_entries",
+                "targets",
+                "db_bytes",
+                "wal_bytes",
+            )
+        },
+        "since": min(sinces) if sinces else None,
+    }
+
+
+def merge_query(rows: list[dict]) -> dict:
+    """Combined totals, per-day averages across every database's days, and
+    percentiles of daily totals (from merged sketches) and of per-database
+    daily averages."""
+    ok = [r for r in rows if "error" not in r]
+    days = sum(r["days"] for r in ok)
+    water_days = sum(r["water_days"] for r in ok)
+    water_total = sum(r["total_water_ml"] for r in ok)
+    sketches = {f: QuantileSketch() for f in queries.DISTRIBUTION_FIELDS}
+    sums = {f: 0.0 for f in MACRO_FIELDS}
+    for r in ok:
+        for f in MACRO_FIELDS:
+            sums[f] += r["_sums"][f]
+        for f, data in r["_sketches"].items():
+            sketches[f].merge(QuantileSketch.from_dict(data))
+    averages = {f: round(sums[f] / days, 1) if days else 0.0 for f in MACRO_FIELDS}
+    averages["water_ml"] = round(water_total / water_days, 1) if water_days else 0.0
+    active = [r for r in ok if r["days"]]
+    return {
+        "databases": len(rows),
+        "failed": len(rows) - len(ok),
+        "days": days,
+        "total_meals": sum(r["total_meals"] for r in ok),
+        "total_water_ml": water_total,
+        "averages": averages,
+        "method": "exact" if all(s.is_exact for s in sketches.values()) else "sketch",
+        "daily_percentiles": {
+            f: {
+                f"p{round(q * 100)}": round(s.quantile(q), 1)
+                for q in queries.PERCENTILES
+            }
+            for f, s in sketches.items()
+        },
+        "db_average_percentiles": {
+            f: {
+                f"p{round(q * 100)}": round(
+                    exact_quantile([r["averages"][f] for r in active], q), 1
+                )
+                for q in queries.PERCENTILES
+            }
+            for f in queries.DISTRIBUTION_FIELDS
+        },
+    }
+
+
+def public_rows(rows: list[dict]) -> list[dict]:
+    """Per-database rows without the internal merge partials."""
+    return [{k: v for k, v in r.items() if not k.startswith("_")} for r in rows]
@@ -6,6 +6,7 @@ import json
 
 
 MEAL_TYPE_ORDER = {"breakfast": 0, "lunch": 1, "dinner": 2, "snack": 3}
+TREND_UNITS = {"calories": "kcal", "sodium_mg": "mg", "water_ml": "ml"}
 
 
 def output_json(data: dict | list) -> str:
@@ -25,6 +26,10 @@ def format_meal_row(m: dict) -> str:
     return f"  {mt:<12}│ {desc:<32}│ {cal:>6.0f} kcal │ P: {p:>5.1f}g │ C: {c:>5.1f}g │ F: {f:>5.1f}g{conf}"
 
 
+def format_id_list(ids: list[int]) -> str:
+    return ", ".join(f"#{i}" for i in ids) if ids else "none"
+
+
 def format_day_table(summary: dict) -> str:
     lines: list[str] = []
     meals = sorted(
@@ -57,6 +62,9 @@ def format_day_table(summary: dict) -> str:
                 f"  {'Remaining':<12}│ {'':<32}│ {rem['calories'] or 0:>6.0f} kcal │ P: {rem['protein_g'] or 0:>5.1f}g │ C: {rem['carbs_g'] or 0:>5.1f}g │ F: {rem['fat_g'] or 0:>5.1f}g"
             )
 
+    if summary.get("nutrient_totals"):
+        lines.append(f"  Extras: {format_nutrient_amounts(summary['nutrient_totals'])}")
+
     if summary.get("water_ml", 0) > 0:
         lines.append(f"\n  Water: {summary['water_ml'] / 1000:.1f}L")
 
@@ -68,18 +76,28 @@ def format_range_table(result: dict) -> str:
     lines.append(
         f"  Range: {result['date_from']} to {result['date_to']} ({result['days']} days, {result['total_meals']} meals)"
     )
+    if result.get("total_water_ml"):
+        lines.append(
+            f"  Water: {result['total_water_ml'] / 1000:.1f}L over {result['water_days']} days"
+        )
     lines.append("")
 
     if "averages" in result:
         a = result["averages"]
         lines.append(
-            f"  Average: {a['calories']:.0f} kcal │ P: {a['protein_g']:.1f}g │ C: {a['carbs_g']:.1f}g │ F: {a['fat_g']:.1f}g"
+            f"  Average: {a['calories']:.0f} kcal │ P: {a['protein_g']:.1f}g │ C: {a['carbs_g']:.1f}g │ F: {a['fat_g']:.1f}g │ Water: {a.get('water_ml', 0) / 1000:.1f}L"
+        )
+
+    if result.get("nutrient_averages"):
+        lines.append(
+            f"  Extras: {format_nutrient_amounts(result['nutrient_averages'])}"
         )
 
     if "trend" in result:
         tr = result["trend"]
+        unit = TREND_UNITS.get(tr.get("field", "calories"), "g")
         lines.append(
-            f"  Trend: {tr['direction']} {tr['change_per_week']:+.0f} kcal/week ({tr['start']:.0f} -> {tr['end']:.0f})"
+            f"  Trend: {tr['direction']} {tr['change_per_week']:+.0f} {unit}/week ({tr['start']:.0f} -> {tr['end']:.0f})"
         )
 
     if "below_target_days" in result:
@@ -93,21 +111,101 @@ def format_range_table(result: dict) -> str:
         else:
             lines.append("  All days are within target!")
 
+    if "distribution" in result:
+        dist = result["distribution"]
+        pct = dist["daily_percentiles"]
+        lines.append(f"\n  Daily distribution ({dist['method']}):")
+        lines.append(
+            f"    Calories  p10 {pct['calories']['p10']:>6.0f} │ p50 {pct['calories']['p50']:>6.0f} │ p90 {pct['calories']['p90']:>6.0f}"
+        )
+        lines.append(
+            f"    Protein   p10 {pct['protein_g']['p10']:>5.1f}g │ p50 {pct['protein_g']['p50']:>5.1f}g │ p90 {pct['protein_g']['p90']:>5.1f}g"
+        )
+        for field, label in (("calories", "Calories"), ("protein_g", "Protein")):
+            w = dist["within_target"][field]
+            if w["days"]:
+                lines.append(
+                    f"    {label:<9} within ±{dist['tolerance'] * 100:.0f}% of target: {w['within']}/{w['days']} days ({w['share'] * 100:.0f}%)"
+                )
+        lines.append("  Meal sizes:")
+        for b in dist["meal_size_histogram"]:
+            if b["max"] is None:
+                label = f"{b['min']:.0f}+"
+            else:
+                label = f"{b['min']:.0f}-{b['max']:.0f}"
+            lines.append(f"    {label:>9} kcal │ {b['count']}")
+
+    if "breakdown" in result:
+        bd = result["breakdown"]
+        window = f" {bd['between'][0]}-{bd['between'][1]}" if bd["between"] else ""
+        lines.append(f"\n  By {bd['by'].replace('_', ' ')}{window}:")
+        if not bd["totals"]:
+            lines.append("    No meals.")
+        for t in bd["totals"]:
+            if bd["by"] == "hour" and t["key"] is not None:
+                label = f"{t['key']:02d}:00"
+            else:
+                label = str(t["key"] or "?").capitalize()
+            lines.append(
+                f"    {label:<10}│ {t['meals']:>4} meals │ {t['days']:>4} days │ {t['calories']:>7.0f} kcal │ P: {t['protein_g']:>6.1f}g"
+            )
+
     if (
         "daily" in result
         and "averages" not in result
         and "trend" not in result
         and "below_target_days" not in result
+        and "distribution" not in result
+        and "breakdown" not in result
     ):
         for d, info in sorted(result["daily"].items()):
             t = info["totals"]
+            water = info.get("water_ml") or 0
+            water_str = f" │ W: {water / 1000:.1f}L" if water else ""
             lines.append(
-                f"  {d} │ {info['meals']} meals │ {t['calories']:>6.0f} kcal │ P: {t['protein_g']:>5.1f}g │ C: {t['carbs_g']:>5.1f}g │ F: {t['fat_g']:>5.1f}g"
+                f"  {d} │ {info['meals']} meals │ {t['calories']:>6.0f} kcal │ P: {t['protein_g']:>5.1f}g │ C: {t['carbs_g']:>5.1f}g │ F: {t['fat_g']:>5.1f}g{water_str}"
             )
 
     return "\n".join(lines)
 
 
+def format_nutrient_amounts(amounts: dict[str, float]) -> str:
+    return " │ ".join(f"{code} {value:.1f}" for code, value in amounts.items())
+
+
+def format_nutrients_table(rows: list[dict]) -> str:
+    if not rows:
+        return "  No nutrients registered."
+    return "\n".join(f"  {r['code']:<20}{r['name']:<20}{r['unit']}" for r in rows)
+
+
+def format_streaks_table(result: dict) -> str:
+    lines = [f"  Streaks as of {result['date']}:"]
+    for field, s in result["fields"].items():
+        current = f"{s['current']} days"
+        if s["current"]:
+            current += f" since {s['current_start']}"
+            if not s["hit_today"]:
+                current += " (today not hit yet)"
+        longest = f"{s['longest']} days"
+        if s["longest"]:
+            longest += f" ({s['longest_start']} to {s['longest_end']})"
+        lines.append(f"    {field:<10}│ current: {current} │ longest: {longest}")
+    return "\n".join(lines)
+
+
+def format_adherence_table(result: dict) -> str:
+    lines = [f"  Adherence {result['date_from']} to {result['date_to']}:"]
+    for field, a in result["fields"].items():
+        if not a["days"]:
+            lines.append(f"    {field:<10}│ no days with meals and a target")
+            continue
+        lines.append(
+            f"    {field:<10}│ {a['share'] * 100:>5.1f}% │ {a['hit']}/{a['days']} days hit"
+        )
+    return "\n".join(lines)
+
+
 def format_targets_table(targets: list[dict]) -> str:
     if not targets:
         return "  No targets set."
@@ -162,4 +260,140 @@ def format_info_table(stats: dict) -> str:
         f"  {stats['meals']} meals │ {stats['days_tracked']} days │ Since: {stats['since'] or 'n/a'}",
         f"  {stats['water_entries']} water entries │ {stats['targets']} targets",
     ]
+    if stats.get("archived_years"):
+        years = ", ".join(str(y) for y in stats["archived_years"])
+        lines.append(f"  Archived years: {years}")
+    storage = stats.get("storage")
+    if storage:
+        lines.append(
+            f"  Storage: {storage['db_bytes'] / 1024:.0f} KiB ({storage['page_count']} pages × {storage['page_size']} B) │ Free pages: {storage['freelist_count']} │ WAL: {storage['wal_bytes'] / 1024:.0f} KiB"
+        )
+        if "objects" in storage and storage["objects"] is None:
+            lines.append("  Object sizes unavailable (SQLite built without dbstat).")
+        for obj in storage.get("objects") or []:
+            lines.append(
+                f"    {obj['name'][:40]:<41}{obj['type']:<6}{obj['bytes'] / 1024:>10.0f} KiB"
+            )
+    return "\n".join(lines)
+
+
+def format_maintenance_table(result: dict) -> str:
+    before, after = result["before"], result["after"]
+    lines: list[str] = []
+    if "archived" in result:
+        moved = result["archived"]
+        if moved:
+            for year, n in moved.items():
+                lines.append(f"  Archived {n} meals from {year}")
+        else:
+            lines.append("  Nothing to archive.")
+    opt = "ANALYZE + optimize" if result["optimize"]["analyzed"] else "optimize"
+    lines.append(f"  Statistics: {opt}")
+    if result.get("change_log_compacted"):
+        lines.append(
+            f"  Change log: {result['change_log_compacted']} superseded entries removed"
+        )
+    vac = result["vacuum"]
+    lines.append(f"  Vacuum ({vac['mode']}): {vac['freed_pages']} pages freed")
+    ckpt = result["checkpoint"]
+    busy = " (busy, retry later)" if ckpt["busy"] else ""
+    lines.append(f"  WAL checkpoint: {ckpt['checkpointed_pages']} pages{busy}")
+    lines.append(
+        f"  Size: {before['db_bytes'] / 1024:.0f} KiB + WAL {before['wal_bytes'] / 1024:.0f} KiB -> {after['db_bytes'] / 1024:.0f} KiB + WAL {after['wal_bytes'] / 1024:.0f} KiB"
+    )
+    return "\n".join(lines)
+
+
+def format_watch_event(event: dict) -> str:
+    if event["event"] == "status":
+        s, delta = event["status"], event["delta"]
+        changed = ", ".join(f"{k} {v:+g}" for k, v in delta.items())
+        return (
+            f"  status  {s['date']}: {s['totals']['calories']:.0f} kcal, {s['water_ml'] / 1000:.1f}L water"
+            + (f" ({changed})" if changed else "")
+        )
+    label = f"  {event['event']:<8}{event['table']} #{event['id']}"
+    row = event["row"]
+    if row is None:
+        return label
+    if event["table"] == "water":
+        return f"{label}: {row['amount_ml']:.0f} ml on {row['date']} {row['time']}"
+    return f"{label}: {row['date']} {row['time']}\n{format_meal_row(row)}"
+
+
+def format_foods_table(foods: list[dict]) -> str:
+    if not foods:
+        return "  No foods found."
+    lines = ["  Per 100 g:"]
+    for f in foods:
+        name = f["name"] if not f.get("brand") else f"{f['name']} ({f['brand']})"
+        lines.append(
+            f"  #{f['id']:<7} {name[:40]:<41}│ {f['calories']:>6.0f} kcal │ P: {f['protein_g']:>5.1f}g │ C: {f['carbs_g']:>5.1f}g │ F: {f['fat_g']:>5.1f}g"
+        )
+    return "\n".join(lines)
+
+
+def format_migration_plan(plan: dict) -> str:
+    lines: list[str] = []
+    if plan["pending_versions"]:
+        versions = ", ".join(f"v{v}" for v in plan["pending_versions"])
+        lines.append(
+            f"  Schema v{plan['schema_version']} -> v{plan['target_version']}: {versions}"
+        )
+    else:
+        lines.append(f"  Schema v{plan['schema_version']} is up to date")
+    for w in plan["backfills"]:
+        eta = f", ~{w['seconds']:.1f}s" if "seconds" in w else ""
+        resumed = f" ({w['resumed']} done)" if w["resumed"] else ""
+        lines.append(f"  Backfill {w['name']}: {w['rows']} rows{resumed}{eta}")
+    if "estimated_seconds" in plan:
+        lines.append(f"  Estimated: ~{plan['estimated_seconds']:.1f}s")
+    return "\n".join(lines)
+
+
+def _fleet_name(path: str) -> str:
+    # Client databases usually differ by directory, not file name.
+    parts = path.replace("\\", "/").rsplit("/", 2)
+    return "/".join(parts[-2:])[-40:]
+
+
+def format_fleet_info(rows: list[dict], combined: dict) -> str:
+    lines: list[str] = []
+    for r in rows:
+        name = _fleet_name(r["db"])
+        if "error" in r:
+            lines.append(f"  {name:<41}error: {r['error']}")
+            continue
+        lines.append(
+            f"  {name:<41}{r['meals']:>8} meals │ {r['days_tracked']:>5} days │ {r['db_bytes'] / 1024:>8.0f} KiB"
+        )
+    c = combined
+    lines.append(
+        f"\n  {c['databases']} databases ({c['failed']} failed): {c['meals']} meals │ {c['days_tracked']} days │ {c['water_entries']} water entries │ {c['db_bytes'] / 1024:.0f} KiB │ Since: {c['since'] or 'n/a'}"
+    )
+    return "\n".join(lines)
+
+
+def format_fleet_query(rows: list[dict], combined: dict) -> str:
+    lines = [f"  Range: {combined['date_from']} to {combined['date_to']}"]
+    for r in rows:
+        name = _fleet_name(r["db"])
+        if "error" in r:
+            lines.append(f"  {name:<41}error: {r['error']}")
+            continue
+        a = r["averages"]
+        lines.append(
+            f"  {name:<41}{r['days']:>4} days │ {a['calories']:>6.0f} kcal │ P: {a['protein_g']:>5.1f}g"
+        )
+    c = combined
+    a = c["averages"]
+    lines.append(
+        f"\n  {c['databases']} databases ({c['failed']} failed), {c['days']} days, {c['total_meals']} meals"
+    )
+    lines.append(
+        f"  Average: {a['calories']:.0f} kcal │ P: {a['protein_g']:.1f}g │ C: {a['carbs_g']:.1f}g │ F: {a['fat_g']:.1f}g │ Water: {a['water_ml'] / 1000:.1f}L"
+    )
+    for f, pct in c["daily_percentiles"].items():
+        values = " │ ".join(f"{k}: {v:.0f}" for k, v in pct.items())
+        lines.append(f"  Daily {f}: {values}")
     return "\n".join(lines)
@@ -0,0 +1,41 @@
+"""JSON manifests kept next to incrementally written output files.
+
+A manifest maps each output file (or partition) to a fingerprint of what was
+written, so the next run can skip unchanged outputs. It is stored as
+``{"version": 1, <section>: {...}}`` and replaced atomically.
+"""
+
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+
+VERSION = 1
+
+
+def load(path: Path, section: str) -> dict:
+    """The ``section`` entries of the manifest; empty if missing or unreadable."""
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+    except (OSError, ValueError):
+        return {}
+    entries = data.get(section) if isinstance(data, dict) else None
+    return entries if isinstance(entries, dict) else {}
+
+
+def save(path: Path, section: str, entries: dict) -> None:
+    write_atomic(
+        path,
+        json.dumps(
+            {"version": VERSION, section: dict(sorted(entries.items()))}, indent=2
+        )
+        + "\n",
+    )
+
+
+def write_atomic(path: Path, content: str) -> None:
+    """Write via a temporary sibling so readers never see a partial file."""
+    tmp = path.with_name(f".{path.name}.tmp")
+    tmp.write_text(content, encoding="utf-8")
+    os.replace(tmp, path)
@@ -0,0 +1,388 @@
+"""Opt-in command metrics, kept in a small SQLite store next to the database.
+
+With ``NUTRI_METRICS=1`` every command records its wall time and the time
+spent in SQLite as histograms, the number of statements run and rows
+returned, and the database/WAL size afterwards. ``nutri metrics`` renders
+the store as OpenMetrics text or JSON. Without the variable nothing is
+measured and connections are plain ``sqlite3`` connections.
+"""
+
+from __future__ import annotations
+
+import math
+import os
+import sqlite3
+import time
+from functools import cache
+from pathlib import Path
+
+METRICS_ENV = "NUTRI_METRICS"
+PREFIX = "nutri_"
+
+# Upper bounds in seconds; the last bucket catches everything.
+LATENCY_BUCKETS = (
+    0.001,
+    0.005,
+    0.01,
+    0.025,
+    0.05,
+    0.1,
+    0.25,
+    0.5,
+    1.0,
+    2.5,
+    5.0,
+    10.0,
+    math.inf,
+)
+
+HISTOGRAMS = {
+    "command_duration_seconds": "Wall time per command.",
+    "sql_duration_seconds": "Time spent executing SQL and fetching rows per command.",
+}
+COUNTERS = {
+    "sql_statements": "SQL statements executed.",
+    "sql_rows": "Rows returned by SQL statements.",
+}
+GAUGES = {
+    "db_bytes": "Size of the database file after the last recorded command.",
+    "wal_bytes": "Size of the write-ahead log after the last recorded command.",
+}
+
+STORE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS histogram_buckets (
+    metric  TEXT NOT NULL,
+    command TEXT NOT NULL,
+    le      REAL NOT NULL,
+    count   INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (metric, command, le)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS histogram_sums (
+    metric  TEXT NOT NULL,
+    command TEXT NOT NULL,
+    count   INTEGER NOT NULL DEFAULT 0,
+    sum     REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (metric, command)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS counters (
+    metric  TEXT NOT NULL,
+    command TEXT NOT NULL,
+    value   REAL NOT NULL DEFAULT 0,
+    PRIMARY KEY (metric, command)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS gauges (
+    metric     TEXT PRIMARY KEY,
+    value      REAL NOT NULL,
+    updated_at TEXT NOT NULL DEFAULT (datetime('now'))
+) WITHOUT ROWID;
+"""
+
+
+def enabled() -> bool:
+    return os.environ.get(METRICS_ENV, "").strip().lower() not in (
+        "",
+        "0",
+        "false",
+        "no",
+        "off",
+    )
+
+
+def metrics_path(db_path: Path) -> Path:
+    """The metrics store for a database, e.g. ``nutrition-metrics.db``."""
+    return db_path.with_name(f"{db_path.stem}-metrics.db")
+
+
+# ── collection ───────────────────────────────────────────────────────────────
+
+
+class _Frame:
+    __slots__ = ("command", "started", "sql_seconds", "statements", "rows")
+
+    def __init__(self, command: str) -> None:
+        self.command = command
+        self.started = time.perf_counter()
+        self.sql_seconds = 0.0
+        self.statements = 0
+        self.rows = 0
+
+
+# Commands currently running. `nutri exec` nests one frame per batch line,
+# and SQL work counts towards every frame on the stack.
+_frames: list[_Frame] = []
+
+
+def _add(seconds: float, statements: int = 0, rows: int = 0) -> None:
+    for frame in _frames:
+        frame.sql_seconds += seconds
+        frame.statements += statements
+        frame.rows += rows
+
+
+class MeteredCursor(sqlite3.Cursor):
+    def execute(self, sql, parameters=()):
+        start = time.perf_counter()
+        try:
+            return super().execute(sql, parameters)
+        finally:
+            _add(time.perf_counter() - start, statements=1)
+
+    def executemany(self, sql, seq_of_parameters):
+        start = time.perf_counter()
+        try:
+            return super().executemany(sql, seq_of_parameters)
+        finally:
+            _add(time.perf_counter() - start, statements=1)
+
+    def executescript(self, sql_script):
+        start = time.perf_counter()
+        try:
+            return super().executescript(sql_script)
+        finally:
+            _add(time.perf_counter() - start, statements=1)
+
+    def fetchone(self):
+        start = time.perf_counter()
+        row = super().fetchone()
+        _add(time.perf_counter() - start, rows=row is not None)
+        return row
+
+    def fetchmany(self, size=None):
+        start = time.perf_counter()
+        rows = super().fetchmany(self.arraysize if size is None else size)
+        _add(time.perf_counter() - start, rows=len(rows))
+        return rows
+
+    def fetchall(self):
+        start = time.perf_counter()
+        rows = super().fetchall()
+        _add(time.perf_counter() - start, rows=len(rows))
+        return rows
+
+    def __next__(self):
+        start = time.perf_counter()
+        try:
+            row = super().__next__()
+        except StopIteration:
+            _add(time.perf_counter() - start)
+            raise
+        _add(time.perf_counter() - start, rows=1)
+        return row
+
+
+class _MeteredConnection:
+    """Mixin routing every statement through ``MeteredCursor``."""
+
+    def cursor(self, factory=None):
+        return super().cursor(factory or MeteredCursor)
+
+    def execute(self, sql, parameters=()):
+        return self.cursor().execute(sql, parameters)
+
+    def executemany(self, sql, seq_of_parameters):
+        return self.cursor().executemany(sql, seq_of_parameters)
+
+    def executescript(self, sql_script):
+        return self.cursor().executescript(sql_script)
+
+
+@cache
+def metered(factory: type[sqlite3.Connection]) -> type[sqlite3.Connection]:
+    """A subclass of ``factory`` that reports SQL time and rows read."""
+    return type(f"Metered{factory.__name__}", (_MeteredConnection, factory), {})
+
+
+def start_command(command: str) -> None:
+    _frames.append(_Frame(command))
+
+
+def label_command(command: str) -> None:
+    """Rename the innermost command, e.g. once a sub-command is known."""
+    if _frames:
+        _frames[-1].command = command
+
+
+def finish_command(db_path: Path) -> None:
+    if not _frames:
+        return
+    frame = _frames.pop()
+    duration = time.perf_counter() - frame.started
+    wal = db_path.with_name(db_path.name + "-wal")
+    sizes = {
+        "db_bytes": db_path.stat().st_size if db_path.exists() else 0,
+        "wal_bytes": wal.stat().st_size if wal.exists() else 0,
+    }
+    try:
+        record(metrics_path(db_path), frame, duration, sizes)
+    except (sqlite3.Error, OSError):
+        # Metrics are best effort and must never fail the command itself.
+        pass
+
+
+# ── store ────────────────────────────────────────────────────────────────────
+
+
+def _open_store(path: Path) -> sqlite3.Connection:
+    path.parent.mkdir(parents=True, exist_ok=True)
+    conn = sqlite3.connect(str(path), timeout=1.0)
+    conn.row_factory = sqlite3.Row
+    conn.executescript(STORE_SCHEMA)
+    return conn
+
+
+def _bucket(value: float) -> float:
+    return next(le for le in LATENCY_BUCKETS if value <= le)
+
+
+def record(path: Path, frame: _Frame, duration: float, sizes: dict) -> None:
+    conn = _open_store(path)
+    try:
+        with conn:
+            for metric, value in (
+                ("command_duration_seconds", duration),
+                ("sql_duration_seconds", frame.sql_seconds),
+            ):
+                conn.execute(
+                    "INSERT INTO histogram_buckets (metric, command, le, count) "
+                    "VALUES (?, ?, ?, 1) ON CONFLICT DO UPDATE SET count = count + 1",
+                    (metric, frame.command, _bucket(value)),
+                )
+                conn.execute(
+                    "INSERT INTO histogram_sums (metric, command, count, sum) "
+                    "VALUES (?, ?, 1, ?) ON CONFLICT DO UPDATE SET "
+                    "count = count + 1, sum = sum + excluded.sum",
+                    (metric, frame.command, value),
+                )
+            for metric, value in (
+                ("sql_statements", frame.statements),
+                ("sql_rows", frame.rows),
+            ):
+                conn.execute(
+                    "INSERT INTO counters (metric, command, value) VALUES (?, ?, ?) "
+                    "ON CONFLICT DO UPDATE SET value = value + excluded.value",
+                    (metric, frame.command, value),
+                )
+            conn.executemany(
+                "INSERT OR REPLACE INTO gauges (metric, value) VALUES (?, ?)",
+                list(sizes.items()),
+            )
+    finally:
+        conn.close()
+
+
+def reset(path: Path) -> None:
+    if path.exists():
+        path.unlink()
+
+
+def load(path: Path) -> dict:
+    """The store as nested dicts; an absent store reads as empty."""
+    data: dict = {
+        "histograms": {m: {} for m in HISTOGRAMS},
+        "counters": {m: {} for m in COUNTERS},
+        "gauges": {},
+    }
+    if not path.exists():
+        return data
+    conn = _open_store(path)
+    try:
+        for row in conn.execute(
+            "SELECT metric, command, count, sum FROM histogram_sums "
+            "ORDER BY metric, command"
+        ):
+            data["histograms"].setdefault(row["metric"], {})[row["command"]] = {
+                "count": row["count"],
+                "sum": row["sum"],
+                "buckets": {le: 0 for le in LATENCY_BUCKETS},
+            }
+        for row in conn.execute(
+            "SELECT metric, command, le, count FROM histogram_buckets"
+        ):
+            series = data["histograms"].get(row["metric"], {}).get(row["command"])
+            if series is not None and row["le"] in series["buckets"]:
+                series["buckets"][row["le"]] = row["count"]
+        for row in conn.execute(
+            "SELECT metric, command, value FROM counters ORDER BY metric, command"
+        ):
+            data["counters"].setdefault(row["metric"], {})[row["command"]] = row[
+                "value"
+            ]
+        for row in conn.execute("SELECT metric, value FROM gauges ORDER BY metric"):
+            data["gauges"][row["metric"]] = row["value"]
+    finally:
+        conn.close()
+    return data
+
+
+# ── rendering ────────────────────────────────────────────────────────────────
+
+
+def _le(value: float) -> str:
+    return "+Inf" if math.isinf(value) else repr(value)
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _label(command: str) -> str:
+    escaped = command.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+    return f'command="{escaped}"'
+
+
+def to_openmetrics(data: dict) -> str:
+    lines: list[str] = []
+    for metric, help_text in HISTOGRAMS.items():
+        name = PREFIX + metric
+        lines += [f"# TYPE {name} histogram", f"# HELP {name} {help_text}"]
+        for command, series in data["histograms"].get(metric, {}).items():
+            label = _label(command)
+            cumulative = 0
+            for le, count in series["buckets"].items():
+                cumulative += count
+                lines.append(f'{name}_bucket{{{label},le="{_le(le)}"}} {cumulative}')
+            lines.append(f"{name}_count{{{label}}} {series['count']}")
+            lines.append(f"{name}_sum{{{label}}} {_number(series['sum'])}")
+    for metric, help_text in COUNTERS.items():
+        name = PREFIX + metric
+        lines += [f"# TYPE {name} counter", f"# HELP {name} {help_text}"]
+        for command, value in data["counters"].get(metric, {}).items():
+            lines.append(f"{name}_total{{{_label(command)}}} {_number(value)}")
+    for metric, help_text in GAUGES.items():
+        if metric not in data["gauges"]:
+            continue
+        name = PREFIX + metric
+        lines += [f"# TYPE {name} gauge", f"# HELP {name} {help_text}"]
+        lines.append(f"{name} {_number(data['gauges'][metric])}")
+    lines.append("# EOF")
+    return "\n".join(lines)
+
+
+def to_json(data: dict) -> dict:
+    """Per-command summary with cumulative buckets keyed by upper bound."""
+    commands: dict[str, dict] = {}
+    for metric, by_command in data["histograms"].items():
+        for command, series in by_command.items():
+            cumulative = 0
+            buckets = {}
+            for le, count in series["buckets"].items():
+                cumulative += count
+                buckets[_le(le)] = cumulative
+            commands.setdefault(command, {})[metric] = {
+                "count": series["count"],
+                "sum": round(series["sum"], 6),
+                "avg": round(series["sum"] / series["count"], 6)
+                if series["count"]
+                else 0.0,
+                "buckets": buckets,
+            }
+    for metric, by_command in data["counters"].items():
+        for command, value in by_command.items():
+            commands.setdefault(command, {})[metric] = int(value)
+    return {
+        "commands": dict(sorted(commands.items())),
+        **{m: int(data["gauges"][m]) for m in GAUGES if m in data["gauges"]},
+    }
@@ -3,7 +3,9 @@
 from __future__ import annotations
 
 from datetime import date, datetime, timedelta
+import hashlib
 import re
+import unicodedata
 
 
 MEAL_TYPES = ("breakfast", "lunch", "dinner", "snack")
@@ -18,6 +20,30 @@ MACRO_FIELDS = (
     "sugar_g",
     "sodium_mg",
 )
+# Built-in extra nutrients, stored per meal in the ``meal_nutrients`` side
+# table instead of as meal columns. Codes carry their unit like the macros;
+# more can be registered per database (``nutri nutrients add``).
+EXTRA_NUTRIENTS = {
+    "saturated_fat_g": ("Saturated fat", "g"),
+    "cholesterol_mg": ("Cholesterol", "mg"),
+    "potassium_mg": ("Potassium", "mg"),
+    "calcium_mg": ("Calcium", "mg"),
+    "iron_mg": ("Iron", "mg"),
+    "magnesium_mg": ("Magnesium", "mg"),
+    "caffeine_mg": ("Caffeine", "mg"),
+    "alcohol_g": ("Alcohol", "g"),
+    "vitamin_a_ug": ("Vitamin A", "ug"),
+    "vitamin_c_mg": ("Vitamin C", "mg"),
+    "vitamin_d_ug": ("Vitamin D", "ug"),
+    "vitamin_b12_ug": ("Vitamin B12", "ug"),
+}
+
+EPOCH_ORDINAL = date(1970, 1, 1).toordinal()
+
+# Near-duplicate meals: same date, times at most this many minutes apart,
+# the same normalized description and calories within this fraction.
+DUPLICATE_WINDOW_MIN = 15
+DUPLICATE_CAL_TOLERANCE = 0.05
 
 
 def today_str() -> str:
@@ -36,6 +62,67 @@ def parse_iso_date(value: str) -> str:
         raise ValueError(f"Invalid date: {value}. Use format YYYY-MM-DD.") from e
 
 
+def epoch_day(value: str) -> int:
+    """Days since 1970-01-01 for a YYYY-MM-DD date (the DB's integer day key)."""
+    return date.fromisoformat(value).toordinal() - EPOCH_ORDINAL
+
+
+def parse_hhmm(value: str) -> str:
+    """Validate HH:MM and return it zero-padded."""
+    try:
+        return datetime.strptime(value, "%H:%M").strftime("%H:%M")
+    except ValueError as e:
+        raise ValueError(f"Invalid time: {value}. Use format HH:MM.") from e
+
+
+def normalize_description(value: str) -> str:
+    """Case, accents, punctuation and spacing folded away for duplicate checks."""
+    text = unicodedata.normalize("NFKD", value.casefold())
+    text = "".join(c for c in text if not unicodedata.combining(c))
+    return " ".join(re.sub(r"[\W_]+", " ", text).split())
+
+
+def description_key(value: str | None) -> int | None:
+    """Signed 64-bit hash of the normalized description (the DB's desc_key)."""
+    if value is None:
+        return None
+    digest = hashlib.blake2b(
+        normalize_description(value).encode("utf-8"), digest_size=8
+    ).digest()
+    return int.from_bytes(digest, "big", signed=True)
+
+
+def minutes_of(value: str | None) -> int | None:
+    """Minutes since midnight for HH:MM, or None."""
+    if not value:
+        return None
+    try:
+        hours, minutes = value.split(":")[:2]
+        return int(hours) * 60 + int(minutes)
+    except ValueError:
+        return None
+
+
+def is_near_duplicate(
+    a: dict,
+    b: dict,
+    window: int = DUPLICATE_WINDOW_MIN,
+    tolerance: float = DUPLICATE_CAL_TOLERANCE,
+) -> bool:
+    """Whether two meals with the same date and desc_key look like one meal.
+
+    Times must both be missing or at most ``window`` minutes apart, and
+    calories within ``tolerance`` of the larger value.
+    """
+    ta, tb = minutes_of(a.get("time")), minutes_of(b.get("time"))
+    if (ta is None) != (tb is None):
+        return False
+    if ta is not None and abs(ta - tb) > window:
+        return False
+    ca, cb = a.get("calories") or 0, b.get("calories") or 0
+    return abs(ca - cb) <= max(abs(ca), abs(cb)) * tolerance
+
+
 def parse_duration(spec: str) -> tuple[str, str]:
     """Parse a duration spec like '7d', '30d' into (date_from, date_to) strings."""
     m = re.match(r"^(\d+)d$", spec)
@@ -65,6 +152,36 @@ def compute_totals(meals: list[dict]) -> dict:
     return totals
 
 
+def compute_nutrient_totals(meals: list[dict], codes: list[str]) -> dict:
+    """Sum up extra nutrients (each meal's ``nutrients`` dict) like compute_totals."""
+    totals = {c: 0.0 for c in codes}
+    for m in meals:
+        amounts = m.get("nutrients") or {}
+        for c in codes:
+            totals[c] += amounts.get(c, 0) or 0
+    return totals
+
+
+def parse_nutrient_amounts(values: list[str]) -> dict[str, float | None]:
+    """Parse ``code=amount`` pairs; an empty amount (``code=``) means remove."""
+    amounts: dict[str, float | None] = {}
+    for value in values:
+        code, sep, amount = value.partition("=")
+        code = code.strip().lower()
+        if not sep or not code:
+            raise ValueError(f"Invalid nutrient: {value}. Use format code=amount.")
+        if not amount.strip():
+            amounts[code] = None
+            continue
+        try:
+            amounts[code] = float(amount)
+        except ValueError as e:
+            raise ValueError(f"Invalid amount for {code}: {amount}.") from e
+        if amounts[code] < 0:
+            raise ValueError(f"Invalid amount for {code}: {amount}.")
+    return amounts
+
+
 def compute_remaining(totals: dict, target: dict | None) -> dict | None:
     """Compute remaining macros given totals and a target."""
     if not target:
@@ -81,9 +198,13 @@ def compute_remaining(totals: dict, target: dict | None) -> dict | None:
 
 def compute_daily_averages(meals_by_date: dict[str, list[dict]]) -> dict:
     """Compute daily averages across multiple days."""
-    if not meals_by_date:
+    return average_day_totals([compute_totals(m) for m in meals_by_date.values()])
+
+
+def average_day_totals(day_totals: list[dict]) -> dict:
+    """Average of per-day totals, rounded to one decimal."""
+    if not day_totals:
         return {f: 0.0 for f in MACRO_FIELDS}
-    day_totals = [compute_totals(meals) for meals in meals_by_date.values()]
     n = len(day_totals)
     avg: dict[str, float] = {}
     for f in MACRO_FIELDS:
@@ -102,14 +223,15 @@ def group_meals_by_date(meals: list[dict]) -> dict[str, list[dict]]:
 
 def compute_trend(meals_by_date: dict[str, list[dict]], field: str) -> dict:
     """Compute a simple linear trend for a field across days."""
-    if len(meals_by_date) < 2:
-        return {"direction": "→", "change_per_week": 0, "start": 0, "end": 0}
-
     dates_sorted = sorted(meals_by_date.keys())
-    daily_vals = []
-    for d in dates_sorted:
-        totals = compute_totals(meals_by_date[d])
-        daily_vals.append(totals.get(field, 0))
+    daily_vals = [compute_totals(meals_by_date[d]).get(field, 0) for d in dates_sorted]
+    return compute_series_trend(daily_vals)
+
+
+def compute_series_trend(daily_vals: list[float]) -> dict:
+    """Linear trend over an ordered series of per-day values."""
+    if len(daily_vals) < 2:
+        return {"direction": "→", "change_per_week": 0, "start": 0, "end": 0}
 
     n = len(daily_vals)
     # Simple linear regression
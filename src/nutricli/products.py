@@ -0,0 +1,181 @@
+"""Barcode product store fed from offline product dumps.
+
+Dumps can be several GB, so imports stream the (optionally gzipped) CSV and
+commit in fixed-size chunks. Each chunk commit also records how many rows of
+the file have been processed, so an interrupted import resumes where it
+stopped instead of starting over.
+"""
+
+from __future__ import annotations
+
+import csv
+import gzip
+import sqlite3
+import time
+from pathlib import Path
+from typing import Callable, TextIO
+
+from .models import MACRO_FIELDS
+
+IMPORT_CHUNK = 10_000
+# Product dumps carry very long free-text fields (ingredients etc.).
+FIELD_SIZE_LIMIT = 16 * 1024 * 1024
+
+PRODUCT_COLUMNS = ("barcode", "name", "brand", "serving_g", *MACRO_FIELDS)
+
+# Accepted header names per column, with a factor to convert into our units.
+# The second name of each entry is the Open Food Facts export column.
+COLUMN_ALIASES: dict[str, tuple[tuple[str, float], ...]] = {
+    "barcode": (("barcode", 1), ("code", 1), ("ean", 1)),
+    "name": (("name", 1), ("product_name", 1)),
+    "brand": (("brand", 1), ("brands", 1)),
+    "serving_g": (("serving_g", 1), ("serving_quantity", 1)),
+    "calories": (("calories", 1), ("energy-kcal_100g", 1)),
+    "protein_g": (("protein_g", 1), ("proteins_100g", 1)),
+    "carbs_g": (("carbs_g", 1), ("carbohydrates_100g", 1)),
+    "fat_g": (("fat_g", 1), ("fat_100g", 1)),
+    "fiber_g": (("fiber_g", 1), ("fiber_100g", 1)),
+    "sugar_g": (("sugar_g", 1), ("sugars_100g", 1)),
+    "sodium_mg": (("sodium_mg", 1), ("sodium_100g", 1000)),
+}
+TEXT_COLUMNS = ("barcode", "name", "brand")
+
+
+def _open_dump(path: Path) -> TextIO:
+    if path.suffix == ".gz":
+        return gzip.open(path, "rt", encoding="utf-8", newline="")
+    return open(path, encoding="utf-8", newline="")
+
+
+def _column_map(header: list[str]) -> list[tuple[int, float] | None]:
+    positions = {name.strip(): i for i, name in enumerate(header)}
+    mapping: list[tuple[int, float] | None] = []
+    for col in PRODUCT_COLUMNS:
+        found = next(
+            ((positions[n], f) for n, f in COLUMN_ALIASES[col] if n in positions),
+            None,
+        )
+        mapping.append(found)
+    if mapping[0] is None:
+        raise ValueError("Dump needs a barcode column (barcode, code or ean).")
+    return mapping
+
+
+def _parse_row(row: list[str], mapping: list[tuple[int, float] | None]) -> tuple:
+    values: list[object] = []
+    for col, spec in zip(PRODUCT_COLUMNS, mapping):
+        raw = row[spec[0]].strip() if spec and spec[0] < len(row) else ""
+        if col in TEXT_COLUMNS:
+            values.append(raw or None)
+            continue
+        try:
+            values.append(round(float(raw) * spec[1], 3) if raw else None)
+        except ValueError:
+            # Dumps are messy; an unreadable value is treated as unknown.
+            values.append(None)
+    return tuple(values)
+
+
+def _upsert_sql() -> str:
+    cols = ", ".join(PRODUCT_COLUMNS)
+    data = PRODUCT_COLUMNS[1:]
+    sets = ", ".join(f"{c} = excluded.{c}" for c in data)
+    current = ", ".join(data)
+    incoming = ", ".join(f"excluded.{c}" for c in data)
+    # Unchanged rows are left alone, so re-imports only write what changed.
+    return (
+        f"INSERT INTO products ({cols}) VALUES ({', '.join('?' * len(PRODUCT_COLUMNS))}) "
+        f"ON CONFLICT(barcode) DO UPDATE SET {sets}, updated_at = datetime('now') "
+        f"WHERE ({current}) IS NOT ({incoming})"
+    )
+
+
+def import_products(
+    conn: sqlite3.Connection,
+    path: Path,
+    chunk_size: int = IMPORT_CHUNK,
+    restart: bool = False,
+    progress: Callable[[int, float], None] | None = None,
+) -> dict:
+    """Stream a product dump into ``products``, upserting changed rows.
+
+    ``progress`` is called after every committed chunk with the number of
+    rows processed and the current rows-per-second rate.
+    """
+    csv.field_size_limit(FIELD_SIZE_LIMIT)
+    stat = path.stat()
+    key = str(path.resolve())
+    state = conn.execute(
+        "SELECT size, mtime, rows, done FROM import_state WHERE path = ?", (key,)
+    ).fetchone()
+    resume = (
+        not restart
+        and state is not None
+        and not state["done"]
+        and state["size"] == stat.st_size
+        and state["mtime"] == stat.st_mtime
+    )
+    skip = state["rows"] if resume else 0
+    with conn:
+        conn.execute(
+            "INSERT INTO import_state (path, size, mtime, rows, done) "
+            "VALUES (?, ?, ?, ?, 0) ON CONFLICT(path) DO UPDATE SET "
+            "size = excluded.size, mtime = excluded.mtime, rows = excluded.rows, "
+            "done = 0",
+            (key, stat.st_size, stat.st_mtime, skip),
+        )
+
+    sql = _upsert_sql()
+    started = time.monotonic()
+    rows = changed = invalid = 0
+    batch: list[tuple] = []
+
+    def flush(done: bool = False) -> None:
+        nonlocal changed
+        with conn:
+            before = conn.total_changes
+            conn.executemany(sql, batch)
+            changed += conn.total_changes - before
+            conn.execute(
+                "UPDATE import_state SET rows = ?, done = ? WHERE path = ?",
+                (skip + rows, int(done), key),
+            )
+        batch.clear()
+        if progress:
+            progress(skip + rows, rows / max(time.monotonic() - started, 1e-9))
+
+    with _open_dump(path) as f:
+        header_line = f.readline()
+        delimiter = "\t" if "\t" in header_line else ","
+        mapping = _column_map(next(csv.reader([header_line], delimiter=delimiter)))
+        reader = csv.reader(f, delimiter=delimiter)
+        for _ in zip(range(skip), reader):
+            pass
+        for raw in reader:
+            rows += 1
+            record = _parse_row(raw, mapping)
+            if record[0] is None:
+                invalid += 1
+                continue
+            batch.append(record)
+            if len(batch) >= chunk_size:
+                flush()
+    flush(done=True)
+
+    seconds = time.monotonic() - started
+    return {
+        "file": str(path),
+        "resumed_from": skip,
+        "rows": rows,
+        "upserted": changed,
+        "invalid": invalid,
+        "seconds": round(seconds, 2),
+        "rows_per_sec": round(rows / seconds) if seconds > 0 else rows,
+    }
+
+
+def get_product(conn: sqlite3.Connection, barcode: str) -> dict | None:
+    row = conn.execute(
+        "SELECT * FROM products WHERE barcode = ?", (barcode.strip(),)
+    ).fetchone()
+    return dict(row) if row else None
@@ -1,95 +1,213 @@
-"""Query helpers that combine db and model operations."""
+"""Query helpers that combine storage reads and model operations.
+
+Every function takes a ``sqlite3.Connection`` or any ``storage.Storage``.
+"""
 
 from __future__ import annotations
 
-import sqlite3
+from datetime import date as _date, timedelta
 
-from .db import (
-    get_meals_by_date,
-    get_meals_in_range,
-    get_target_for_date,
-    get_water_by_date,
-)
+from .db import target_rule
 from .models import (
+    average_day_totals,
     compute_totals,
+    compute_nutrient_totals,
     compute_remaining,
-    compute_daily_averages,
-    group_meals_by_date,
-    compute_trend,
+    compute_series_trend,
     MACRO_FIELDS,
+    MEAL_TYPES,
 )
+from .stats import Histogram, QuantileSketch
+from .storage import SQLiteStorage, StorageLike, as_storage
 
+DISTRIBUTION_FIELDS = ("calories", "protein_g")
+PERCENTILES = (0.1, 0.5, 0.9)
+TARGET_TOLERANCE = 0.1
 
-def day_summary(conn: sqlite3.Connection, date: str) -> dict:
-    """Full summary for a single day: meals, totals, target, remaining, water."""
-    meals = get_meals_by_date(conn, date)
+
+def day_summary(
+    conn: StorageLike,
+    date: str,
+    water_entries: bool = True,
+    nutrients: list[str] | None = None,
+) -> dict:
+    """Full summary for a single day: meals, totals, target, remaining, water.
+
+    With ``water_entries=False`` only the water total is fetched (one aggregate
+    query) and ``water_entries`` is omitted. ``nutrients`` adds those extra
+    nutrients to each meal and as ``nutrient_totals``.
+    """
+    store = as_storage(conn)
+    meals = store.get_meals_by_date(date)
     totals = compute_totals(meals)
-    target = get_target_for_date(conn, date)
+    target = store.get_target_for_date(date)
     remaining = compute_remaining(totals, target)
-    water = get_water_by_date(conn, date)
-    water_total = sum(w["amount_ml"] for w in water)
 
-    return {
+    summary = {
         "date": date,
         "meals": meals,
         "totals": totals,
         "target": target,
         "remaining": remaining,
-        "water_ml": water_total,
-        "water_entries": water,
     }
+    if nutrients:
+        extras = store.get_meal_nutrients_in_range(date, date, nutrients)
+        for m in meals:
+            m["nutrients"] = extras.get(m["id"], {})
+        summary["nutrient_totals"] = compute_nutrient_totals(meals, nutrients)
+    if water_entries:
+        water = store.get_water_by_date(date)
+        summary["water_ml"] = sum(w["amount_ml"] for w in water)
+        summary["water_entries"] = water
+    else:
+        summary["water_ml"] = store.get_water_total(date)
+    return summary
+
+
+def day_totals_in_range(
+    conn: StorageLike, date_from: str, date_to: str
+) -> dict[str, dict]:
+    """Per-day ``{"meals": n, "totals": {...}}`` for days with meals.
+
+    Streams the index-only macro rows in (day, time, id) order and adds them
+    up the same way as ``compute_totals``.
+    """
+    store = as_storage(conn)
+    days: dict[str, dict] = {}
+    current: dict | None = None
+    current_date = None
+    for row in store.iter_meal_macros_in_range(date_from, date_to):
+        if row["date"] != current_date:
+            current_date = row["date"]
+            current = days[current_date] = {
+                "meals": 0,
+                "totals": {f: 0.0 for f in MACRO_FIELDS},
+            }
+        current["meals"] += 1
+        totals = current["totals"]
+        for f in MACRO_FIELDS:
+            totals[f] += row[f] or 0
+    return days
 
 
 def range_summary(
-    conn: sqlite3.Connection,
+    conn: StorageLike,
     date_from: str,
     date_to: str,
     avg: bool = False,
     trend_field: str | None = None,
     below_field: str | None = None,
+    percentiles: bool = False,
+    by: str | None = None,
+    between: tuple[str, str] | None = None,
+    engine: str = "sqlite",
+    nutrients: list[str] | None = None,
 ) -> dict:
-    """Summary over a date range with optional aggregations."""
-    meals = get_meals_in_range(conn, date_from, date_to)
-    by_date = group_meals_by_date(meals)
+    """Summary over a date range with optional aggregations.
+
+    ``engine="duckdb"`` computes the per-day meal totals with DuckDB (see
+    ``engines``); the result is identical. It needs a SQLite database file.
+    Water, targets, percentiles, breakdowns and extra nutrients always come
+    from ``conn``.
+
+    ``nutrients`` (registered extra nutrient codes) adds their per-day sums
+    to ``daily``, to the breakdown and, with ``avg``, ``nutrient_averages``.
+    Without it the side table is never read.
+
+    ``between`` (``HH:MM`` start and end) only narrows the breakdown, which
+    defaults to ``by="hour"``; counts, averages, trend, ``below_target_days``
+    and ``daily`` always cover whole days.
+    """
+    store = as_storage(conn)
+    if engine == "duckdb":
+        from .engines import EngineUnavailable, duckdb_day_totals
+
+        if not isinstance(store, SQLiteStorage):
+            raise EngineUnavailable("The duckdb engine needs a SQLite database.")
+        days = duckdb_day_totals(store.conn, date_from, date_to)
+    else:
+        days = day_totals_in_range(store, date_from, date_to)
+    water_by_date = store.get_water_totals_in_range(date_from, date_to)
+    water_total = sum(water_by_date.values())
+    extras = (
+        store.get_nutrient_totals_in_range(date_from, date_to, nutrients)
+        if nutrients
+        else {}
+    )
 
     result: dict = {
         "date_from": date_from,
         "date_to": date_to,
-        "days": len(by_date),
-        "total_meals": len(meals),
+        "days": len(days),
+        "total_meals": sum(d["meals"] for d in days.values()),
+        "water_days": len(water_by_date),
+        "total_water_ml": water_total,
     }
 
     if avg:
-        result["averages"] = compute_daily_averages(by_date)
+        result["averages"] = average_day_totals([d["totals"] for d in days.values()])
+        result["averages"]["water_ml"] = (
+            round(water_total / len(water_by_date), 1) if water_by_date else 0.0
+        )
+        if nutrients:
+            # Same denominator as the macro averages: days with meals.
+            result["nutrient_averages"] = {
+                c: round(sum(e.get(c, 0.0) for e in extras.values()) / len(days), 1)
+                if days
+                else 0.0
+                for c in nutrients
+            }
 
+    if trend_field == "water_ml":
+        result["trend"] = compute_series_trend(list(water_by_date.values()))
+    elif trend_field:
+        result["trend"] = compute_series_trend(
+            [days[d]["totals"].get(trend_field, 0) for d in sorted(days)]
+        )
     if trend_field:
-        result["trend"] = compute_trend(by_date, trend_field)
+        result["trend"]["field"] = trend_field
 
     if below_field:
-        result["below_target_days"] = _days_below_target(conn, by_date, below_field)
+        result["below_target_days"] = _days_below_target(store, days, below_field)
+
+    if percentiles:
+        result["distribution"] = distribution_summary(store, date_from, date_to)
 
-    # Per-day breakdown
+    if by or between:
+        result["breakdown"] = breakdown_summary(
+            store, date_from, date_to, by or "hour", between, nutrients
+        )
+
+    # Per-day breakdown (days with meals or water)
+    empty = {"meals": 0, "totals": compute_totals([])}
     result["daily"] = {}
-    for d in sorted(by_date.keys()):
-        day_meals = by_date[d]
+    for d in sorted(days.keys() | water_by_date.keys()):
+        day = days.get(d, empty)
         result["daily"][d] = {
-            "meals": len(day_meals),
-            "totals": compute_totals(day_meals),
+            "meals": day["meals"],
+            "totals": dict(day["totals"]),
+            "water_ml": water_by_date.get(d, 0.0),
         }
+        if nutrients:
+            amounts = extras.get(d, {})
+            result["daily"][d]["nutrients"] = {
+                c: amounts.get(c, 0.0) for c in nutrients
+            }
 
     return result
 
 
 def _days_below_target(
-    conn: sqlite3.Connection, by_date: dict[str, list[dict]], field: str
+    conn: StorageLike, days: dict[str, dict], field: str
 ) -> list[dict]:
     """Find days where a macro field was below target."""
+    store = as_storage(conn)
     below = []
-    for d in sorted(by_date.keys()):
-        target = get_target_for_date(conn, d)
+    for d in sorted(days.keys()):
+        target = store.get_target_for_date(d)
         if not target or target.get(field) is None:
             continue
-        totals = compute_totals(by_date[d])
+        totals = days[d]["totals"]
         if totals.get(field, 0) < target[field]:
             below.append(
                 {
@@ -102,14 +220,170 @@ def _days_below_target(
     return below
 
 
-def status_summary(conn: sqlite3.Connection, date: str) -> dict:
+def distribution_summary(
+    conn: StorageLike,
+    date_from: str,
+    date_to: str,
+    tolerance: float = TARGET_TOLERANCE,
+) -> dict:
+    """Daily percentiles, meal-size histogram and target adherence.
+
+    Computed in a single pass over meals ordered by date, holding only the
+    current day's running totals plus bounded-size sketches.
+    """
+    store = as_storage(conn)
+    sketches = {f: QuantileSketch() for f in DISTRIBUTION_FIELDS}
+    meal_sizes = Histogram()
+    within = {f: {"days": 0, "within": 0} for f in DISTRIBUTION_FIELDS}
+    # Targets ascending by (date_from, id), so the latest entry of a day wins
+    # as in get_target_for_date; the range is walked forward only once.
+    timeline = sorted(store.get_all_targets(), key=lambda t: (t["date_from"], t["id"]))
+    target_idx = -1
+
+    def close_day(day: str, totals: dict[str, float]) -> None:
+        nonlocal target_idx
+        while (
+            target_idx + 1 < len(timeline)
+            and timeline[target_idx + 1]["date_from"] <= day
+        ):
+            target_idx += 1
+        target = timeline[target_idx] if target_idx >= 0 else None
+        for f in DISTRIBUTION_FIELDS:
+            sketches[f].add(totals[f])
+            goal = target.get(f) if target else None
+            if goal:
+                within[f]["days"] += 1
+                if abs(totals[f] - goal) <= goal * tolerance:
+                    within[f]["within"] += 1
+
+    current: str | None = None
+    totals: dict[str, float] = {}
+    for row in store.iter_meal_macros_in_range(date_from, date_to):
+        if row["date"] != current:
+            if current is not None:
+                close_day(current, totals)
+            current = row["date"]
+            totals = {f: 0.0 for f in DISTRIBUTION_FIELDS}
+        for f in DISTRIBUTION_FIELDS:
+            totals[f] += row[f] or 0
+        meal_sizes.add(row["calories"] or 0)
+    if current is not None:
+        close_day(current, totals)
+
+    return {
+        "method": "exact" if all(s.is_exact for s in sketches.values()) else "sketch",
+        "daily_percentiles": {
+            f: {f"p{round(q * 100)}": round(s.quantile(q), 1) for q in PERCENTILES}
+            for f, s in sketches.items()
+        },
+        "meal_size_histogram": meal_sizes.to_list(),
+        "tolerance": tolerance,
+        "within_target": {
+            f: {
+                **w,
+                "share": round(w["within"] / w["days"], 3) if w["days"] else None,
+            }
+            for f, w in within.items()
+        },
+    }
+
+
+def breakdown_summary(
+    conn: StorageLike,
+    date_from: str,
+    date_to: str,
+    by: str,
+    between: tuple[str, str] | None = None,
+    nutrients: list[str] | None = None,
+) -> dict:
+    """Heatmap-ready meal breakdown by meal type or hour of day."""
+    store = as_storage(conn)
+    cells, totals = store.get_meal_breakdown(date_from, date_to, by, between, nutrients)
+    if by == "hour":
+        keys: list = list(range(24))
+    else:
+        keys = list(MEAL_TYPES)
+    keys += [t["key"] for t in totals if t["key"] not in keys]
+    result = {
+        "by": by,
+        "between": list(between) if between else None,
+        "keys": keys,
+        "dates": list(dict.fromkeys(c["date"] for c in cells)),
+        "cells": cells,
+        "totals": totals,
+    }
+    if by == "hour":
+        result["water"] = store.get_water_by_hour(date_from, date_to, between)
+    return result
+
+
+def adherence_summary(
+    conn: StorageLike,
+    fields: list[str],
+    date_from: str,
+    date_to: str,
+    tolerance: float = TARGET_TOLERANCE,
+) -> dict:
+    """Share of tracked days (meals and a target) that hit each field's target."""
+    store = as_storage(conn)
+    result: dict = {
+        "date_from": date_from,
+        "date_to": date_to,
+        "tolerance": tolerance,
+        "fields": {},
+    }
+    for field in fields:
+        days = store.get_target_hits(field, date_from, date_to, tolerance)
+        hit = sum(d["hit"] for d in days)
+        result["fields"][field] = {
+            "rule": target_rule(field),
+            "days": len(days),
+            "hit": hit,
+            "missed": len(days) - hit,
+            "share": round(hit / len(days), 3) if days else None,
+        }
+    return result
+
+
+def streaks_summary(
+    conn: StorageLike,
+    fields: list[str],
+    date: str,
+    tolerance: float = TARGET_TOLERANCE,
+) -> dict:
+    """Current and longest runs of days hitting each field's target.
+
+    A run still counts as current if it ended yesterday, since ``date``
+    itself may not be complete yet.
+    """
+    store = as_storage(conn)
+    yesterday = (_date.fromisoformat(date) - timedelta(days=1)).isoformat()
+    result: dict = {"date": date, "tolerance": tolerance, "fields": {}}
+    for field in fields:
+        runs = store.get_hit_streaks(field, None, date, tolerance)
+        last = runs[-1] if runs else None
+        current = last if last and last["end"] >= yesterday else None
+        longest = max(runs, key=lambda r: (r["days"], r["end"])) if runs else None
+        result["fields"][field] = {
+            "rule": target_rule(field),
+            "current": current["days"] if current else 0,
+            "current_start": current["start"] if current else None,
+            "hit_today": bool(last and last["end"] == date),
+            "longest": longest["days"] if longest else 0,
+            "longest_start": longest["start"] if longest else None,
+            "longest_end": longest["end"] if longest else None,
+        }
+    return result
+
+
+def status_summary(conn: StorageLike, date: str) -> dict:
     """Quick status for coach integration."""
-    meals = get_meals_by_date(conn, date)
+    store = as_storage(conn)
+    meals = store.get_meals_by_date(date)
     totals = compute_totals(meals)
-    target = get_target_for_date(conn, date)
+    target = store.get_target_for_date(date)
     remaining = compute_remaining(totals, target)
-    water = get_water_by_date(conn, date)
-    water_total = sum(w["amount_ml"] for w in water)
+    water_total = store.get_water_total(date)
 
     return {
         "date": date,
@@ -0,0 +1,345 @@
+"""Weekly and monthly report files built from one aggregation pass.
+
+All per-day totals for the whole range come from the ``day_totals`` cache
+and one water query, and are bucketed into ISO weeks or calendar months in
+Python. Each period is rendered to Markdown, HTML or JSON and written by a
+thread pool. A manifest in the output directory remembers a fingerprint of
+every report's input, so a rerun only rewrites periods whose data (or the
+target in effect) changed.
+"""
+
+from __future__ import annotations
+
+import bisect
+import calendar
+import hashlib
+import html
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from pathlib import Path
+from typing import Callable
+
+from . import db, manifest
+from .storage import StorageLike, as_storage
+from .models import MACRO_FIELDS, average_day_totals, epoch_day
+
+PERIODS = ("week", "month")
+EXTENSIONS = {"markdown": "md", "html": "html", "json": "json"}
+MANIFEST_NAME = ".nutri-reports.json"
+# Bump when the rendered output changes so existing reports are rewritten.
+RENDER_VERSION = 1
+
+# Columns shown in rendered reports; JSON carries every macro.
+COLUMNS = {
+    "calories": ("Calories", "kcal"),
+    "protein_g": ("Protein", "g"),
+    "carbs_g": ("Carbs", "g"),
+    "fat_g": ("Fat", "g"),
+    "fiber_g": ("Fiber", "g"),
+}
+
+
+# ── periods ──────────────────────────────────────────────────────────────────
+
+
+def period_bounds(day: date, period: str) -> tuple[str, date, date]:
+    """Key, first and last day of the week or month containing ``day``."""
+    if period == "week":
+        start = day - timedelta(days=day.weekday())
+        year, week, _ = day.isocalendar()
+        return f"{year}-W{week:02d}", start, start + timedelta(days=6)
+    if period == "month":
+        last = calendar.monthrange(day.year, day.month)[1]
+        return (
+            f"{day.year}-{day.month:02d}",
+            day.replace(day=1),
+            day.replace(day=last),
+        )
+    raise ValueError(f"Unknown period: {period}.")
+
+
+def _target_lookup(store: StorageLike) -> Callable[[str], dict | None]:
+    # Latest entry wins within a day, like the adherence queries.
+    timeline = sorted(
+        as_storage(store).get_all_targets(),
+        key=lambda t: (epoch_day(t["date_from"]), t["id"]),
+    )
+    starts = [epoch_day(t["date_from"]) for t in timeline]
+
+    def target_for(day: str) -> dict | None:
+        i = bisect.bisect_right(starts, epoch_day(day))
+        return timeline[i - 1] if i else None
+
+    return target_for
+
+
+def _hit(field: str, total: float, goal: float, tolerance: float) -> bool:
+    if db.target_rule(field) == "within":
+        return abs(total - goal) <= goal * tolerance
+    return total >= goal
+
+
+def collect(
+    conn: StorageLike,
+    period: str,
+    date_from: str,
+    date_to: str,
+    tolerance: float,
+) -> list[dict]:
+    """Summaries for every week or month overlapping the range that has meals
+    or water, oldest first. The range is widened to whole periods."""
+    _, start, _ = period_bounds(date.fromisoformat(date_from), period)
+    _, _, end = period_bounds(date.fromisoformat(date_to), period)
+    store = as_storage(conn)
+    days = store.get_cached_day_totals(start.isoformat(), end.isoformat())
+    water = store.get_water_totals_in_range(start.isoformat(), end.isoformat())
+    target_for = _target_lookup(store)
+
+    buckets: dict[str, dict] = {}
+    for d in sorted(days.keys() | water.keys()):
+        key, first, last = period_bounds(date.fromisoformat(d), period)
+        bucket = buckets.setdefault(
+            key,
+            {
+                "period": period,
+                "key": key,
+                "date_from": first.isoformat(),
+                "date_to": last.isoformat(),
+                "daily": [],
+            },
+        )
+        day = days.get(d)
+        bucket["daily"].append(
+            {
+                "date": d,
+                "meals": day["meals"] if day else 0,
+                "totals": dict(day["totals"])
+                if day
+                else {f: 0.0 for f in MACRO_FIELDS},
+                "water_ml": water.get(d, 0.0),
+            }
+        )
+    return [_summarize(b, target_for, tolerance) for b in buckets.values()]
+
+
+def _summarize(
+    bucket: dict, target_for: Callable[[str], dict | None], tolerance: float
+) -> dict:
+    tracked = [d for d in bucket["daily"] if d["meals"]]
+    watered = [d for d in bucket["daily"] if d["water_ml"]]
+    water_total = sum(d["water_ml"] for d in watered)
+    averages = average_day_totals([d["totals"] for d in tracked])
+    averages["water_ml"] = round(water_total / len(watered), 1) if watered else 0.0
+
+    hits: dict[str, dict] = {}
+    for d in tracked:
+        target = target_for(d["date"])
+        if not target:
+            continue
+        for f in db.TARGET_FIELDS:
+            goal = target.get(f)
+            if not goal or goal <= 0:
+                continue
+            h = hits.setdefault(f, {"days": 0, "hit": 0})
+            h["days"] += 1
+            h["hit"] += _hit(f, d["totals"][f], goal, tolerance)
+
+    target = target_for(bucket["date_to"])
+    return {
+        **{k: v for k, v in bucket.items() if k != "daily"},
+        "days": len(tracked),
+        "total_meals": sum(d["meals"] for d in tracked),
+        "water_days": len(watered),
+        "total_water_ml": water_total,
+        "totals": {
+            f: round(sum(d["totals"][f] for d in tracked), 1) for f in MACRO_FIELDS
+        },
+        "averages": averages,
+        "target": {f: target.get(f) for f in db.TARGET_FIELDS} if target else None,
+        "target_hits": hits,
+        "tolerance": tolerance,
+        "daily": bucket["daily"],
+    }
+
+
+# ── rendering ────────────────────────────────────────────────────────────────
+
+
+def _title(summary: dict) -> str:
+    kind = "Week" if summary["period"] == "week" else "Month"
+    return f"{kind} {summary['key']} ({summary['date_from']} to {summary['date_to']})"
+
+
+def _overview(summary: dict) -> str:
+    text = f"{summary['days']} days tracked, {summary['total_meals']} meals"
+    if summary["water_days"]:
+        text += (
+            f", water {summary['total_water_ml'] / 1000:.1f} L "
+            f"over {summary['water_days']} days"
+        )
+    return text + "."
+
+
+def _amount(field: str, value: float | None) -> str:
+    if value is None:
+        return "–"
+    unit = COLUMNS[field][1]
+    return f"{value:.0f} {unit}" if unit == "kcal" else f"{value:.1f} {unit}"
+
+
+def _table_rows(summary: dict) -> tuple[list[str], list[list[str]], list[list[str]]]:
+    """Column labels plus summary and daily rows as display strings."""
+    header = [*(label for label, _ in COLUMNS.values()), "Water"]
+    a = summary["averages"]
+    rows = [
+        [
+            "Average",
+            *(_amount(f, a[f]) for f in COLUMNS),
+            f"{a['water_ml'] / 1000:.1f} L",
+        ]
+    ]
+    if summary["target"]:
+        t = summary["target"]
+        rows.append(["Target", *(_amount(f, t.get(f)) for f in COLUMNS), ""])
+    daily = [
+        [
+            f"{d['date']} ({d['meals']} meals)",
+            *(_amount(f, d["totals"][f]) for f in COLUMNS),
+            f"{d['water_ml'] / 1000:.1f} L",
+        ]
+        for d in summary["daily"]
+    ]
+    return header, rows, daily
+
+
+def _hit_lines(summary: dict) -> list[str]:
+    return [
+        f"{COLUMNS[f][0]}: {h['hit']}/{h['days']} days on target"
+        for f, h in summary["target_hits"].items()
+    ]
+
+
+def render_markdown(summary: dict) -> str:
+    header, rows, daily = _table_rows(summary)
+
+    def table(first: str, body: list[list[str]]) -> list[str]:
+        return [
+            "| " + " | ".join([first, *header]) + " |",
+            "|---|" + "---:|" * len(header),
+            *("| " + " | ".join(r) + " |" for r in body),
+        ]
+
+    lines = [f"# {_title(summary)}", "", _overview(summary), "", *table("", rows)]
+    hits = _hit_lines(summary)
+    if hits:
+        lines += ["", *(f"- {h}" for h in hits)]
+    lines += ["", "## Daily", "", *table("Date", daily)]
+    return "\n".join(lines) + "\n"
+
+
+def render_html(summary: dict) -> str:
+    header, rows, daily = _table_rows(summary)
+    e = html.escape
+
+    def table(first: str, body: list[list[str]]) -> str:
+        head = "".join(f"<th>{e(h)}</th>" for h in [first, *header])
+        cells = "".join(
+            "<tr>" + "".join(f"<td>{e(c)}</td>" for c in r) + "</tr>" for r in body
+        )
+        return f"<table><thead><tr>{head}</tr></thead><tbody>{cells}</tbody></table>"
+
+    hits = "".join(f"<li>{e(h)}</li>" for h in _hit_lines(summary))
+    return (
+        "<!DOCTYPE html>\n"
+        f'<html><head><meta charset="utf-8"><title>{e(_title(summary))}</title>'
+        "<style>body{font-family:sans-serif}td,th{padding:2px 8px}"
+        "td{text-align:right}td:first-child{text-align:left}</style></head>"
+        f"<body><h1>{e(_title(summary))}</h1><p>{e(_overview(summary))}</p>"
+        f"{table('', rows)}{f'<ul>{hits}</ul>' if hits else ''}"
+        f"<h2>Daily</h2>{table('Date', daily)}</body></html>\n"
+    )
+
+
+def render_json(summary: dict) -> str:
+    return json.dumps(summary, ensure_ascii=False, indent=2) + "\n"
+
+
+RENDERERS: dict[str, Callable[[dict], str]] = {
+    "markdown": render_markdown,
+    "html": render_html,
+    "json": render_json,
+}
+
+
+# ── writing ──────────────────────────────────────────────────────────────────
+
+
+def report_name(summary: dict, fmt: str) -> str:
+    return f"{summary['key']}.{EXTENSIONS[fmt]}"
+
+
+def fingerprint(summary: dict, fmt: str) -> str:
+    """Hash of everything a report is rendered from."""
+    data = json.dumps(
+        {"render": RENDER_VERSION, "format": fmt, "summary": summary},
+        sort_keys=True,
+    )
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+def load_manifest(out_dir: Path) -> dict[str, str]:
+    """Report file name -> fingerprint from the last run; empty if unreadable."""
+    return manifest.load(out_dir / MANIFEST_NAME, "reports")
+
+
+def _render_and_write(summary: dict, fmt: str, path: Path) -> None:
+    manifest.write_atomic(path, RENDERERS[fmt](summary))
+
+
+def write_reports(
+    summaries: list[dict],
+    out_dir: Path,
+    fmt: str,
+    jobs: int | None = None,
+    force: bool = False,
+) -> dict:
+    """Render and write every summary that changed since the last run.
+
+    A report is skipped when its file exists and the manifest holds the same
+    fingerprint. The manifest is saved even if a write fails, so finished
+    reports are not redone.
+    """
+    out_dir.mkdir(parents=True, exist_ok=True)
+    fingerprints = load_manifest(out_dir)
+    todo: list[tuple[dict, str, str]] = []
+    unchanged = 0
+    for s in summaries:
+        name = report_name(s, fmt)
+        fp = fingerprint(s, fmt)
+        if not force and fingerprints.get(name) == fp and (out_dir / name).exists():
+            unchanged += 1
+        else:
+            todo.append((s, name, fp))
+
+    written: list[str] = []
+    try:
+        with ThreadPoolExecutor(max_workers=jobs) as pool:
+            futures = [
+                (name, fp, pool.submit(_render_and_write, s, fmt, out_dir / name))
+                for s, name, fp in todo
+            ]
+            for name, fp, future in futures:
+                future.result()
+                fingerprints[name] = fp
+                written.append(name)
+    finally:
+        if written:
+            manifest.save(out_dir / MANIFEST_NAME, "reports", fingerprints)
+    return {
+        "output": str(out_dir),
+        "format": fmt,
+        "periods": len(summaries),
+        "written": written,
+        "unchanged": unchanged,
+    }
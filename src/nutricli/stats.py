@@ -0,0 +1,172 @@
+"""Streaming distribution helpers (quantiles, histograms) with bounded memory."""
+
+from __future__ import annotations
+
+import math
+
+EXACT_LIMIT = 2048
+RELATIVE_ACCURACY = 0.01
+MAX_BUCKETS = 2048
+MEAL_SIZE_EDGES = (200.0, 400.0, 600.0, 800.0, 1000.0)
+
+
+def exact_quantile(values: list[float], q: float) -> float:
+    """Quantile with linear interpolation between closest ranks."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    pos = q * (len(ordered) - 1)
+    lo = math.floor(pos)
+    hi = math.ceil(pos)
+    if lo == hi:
+        return ordered[lo]
+    return ordered[lo] + (ordered[hi] - ordered[lo]) * (pos - lo)
+
+
+class QuantileSketch:
+    """Mergeable quantile estimator.
+
+    Keeps raw values while there are at most ``exact_limit`` of them, so small
+    ranges get exact quantiles. Beyond that it switches to log-spaced buckets
+    (relative error ``relative_accuracy``) whose count is capped, so memory
+    stays bounded no matter how many values are added.
+    """
+
+    def __init__(
+        self,
+        exact_limit: int = EXACT_LIMIT,
+        relative_accuracy: float = RELATIVE_ACCURACY,
+        max_buckets: int = MAX_BUCKETS,
+    ) -> None:
+        self.exact_limit = exact_limit
+        self.relative_accuracy = relative_accuracy
+        self.max_buckets = max_buckets
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self._values: list[float] | None = []
+        self._buckets: dict[int, int] = {}
+        self._zero_count = 0
+        self.count = 0
+
+    @property
+    def is_exact(self) -> bool:
+        return self._values is not None
+
+    def add(self, value: float) -> None:
+        self.count += 1
+        if self._values is not None:
+            self._values.append(value)
+            if len(self._values) > self.exact_limit:
+                self._to_buckets()
+            return
+        self._add_to_bucket(value, 1)
+
+    def merge(self, other: QuantileSketch) -> None:
+        """Fold ``other`` into this sketch (both must share the same accuracy)."""
+        if other._values is not None and self._values is not None:
+            self._values.extend(other._values)
+            self.count += other.count
+            if len(self._values) > self.exact_limit:
+                self._to_buckets()
+            return
+        if self._values is not None:
+            self._to_buckets()
+        self.count += other.count
+        if other._values is not None:
+            for v in other._values:
+                self._add_to_bucket(v, 1)
+            return
+        self._zero_count += other._zero_count
+        for key, n in other._buckets.items():
+            self._buckets[key] = self._buckets.get(key, 0) + n
+        self._collapse()
+
+    def quantile(self, q: float) -> float:
+        if self.count == 0:
+            return 0.0
+        if self._values is not None:
+            return exact_quantile(self._values, q)
+        rank = q * (self.count - 1)
+        seen = self._zero_count
+        if seen > rank:
+            return 0.0
+        for key in sorted(self._buckets):
+            seen += self._buckets[key]
+            if seen > rank:
+                return 2 * self._gamma**key / (self._gamma + 1)
+        return 2 * self._gamma ** max(self._buckets) / (self._gamma + 1)
+
+    def to_dict(self) -> dict:
+        """Serializable form, e.g. for merging results across processes."""
+        return {
+            "exact_limit": self.exact_limit,
+            "relative_accuracy": self.relative_accuracy,
+            "max_buckets": self.max_buckets,
+            "count": self.count,
+            "values": self._values,
+            "zero_count": self._zero_count,
+            "buckets": {str(k): n for k, n in self._buckets.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> QuantileSketch:
+        sketch = cls(
+            exact_limit=data["exact_limit"],
+            relative_accuracy=data["relative_accuracy"],
+            max_buckets=data["max_buckets"],
+        )
+        sketch.count = data["count"]
+        sketch._values = data["values"]
+        sketch._zero_count = data["zero_count"]
+        sketch._buckets = {int(k): n for k, n in data["buckets"].items()}
+        return sketch
+
+    def _to_buckets(self) -> None:
+        values = self._values or []
+        self._values = None
+        for v in values:
+            self._add_to_bucket(v, 1)
+
+    def _add_to_bucket(self, value: float, n: int) -> None:
+        if value <= 0:
+            # Macro totals are never negative; treat them like zero.
+            self._zero_count += n
+            return
+        key = math.ceil(math.log(value) / self._log_gamma)
+        self._buckets[key] = self._buckets.get(key, 0) + n
+        if len(self._buckets) > self.max_buckets:
+            self._collapse()
+
+    def _collapse(self) -> None:
+        # Merge the lowest buckets so the sketch never exceeds max_buckets.
+        while len(self._buckets) > self.max_buckets:
+            lowest, second = sorted(self._buckets)[:2]
+            self._buckets[second] += self._buckets.pop(lowest)
+
+
+class Histogram:
+    """Counts values into fixed bins defined by ascending upper edges."""
+
+    def __init__(self, edges: tuple[float, ...] = MEAL_SIZE_EDGES) -> None:
+        self.edges = edges
+        self.counts = [0] * (len(edges) + 1)
+
+    def add(self, value: float) -> None:
+        for i, edge in enumerate(self.edges):
+            if value < edge:
+                self.counts[i] += 1
+                return
+        self.counts[-1] += 1
+
+    def merge(self, other: Histogram) -> None:
+        for i, n in enumerate(other.counts):
+            self.counts[i] += n
+
+    def to_list(self) -> list[dict]:
+        bins: list[dict] = []
+        lower = 0.0
+        for edge, n in zip(self.edges, self.counts):
+            bins.append({"min": lower, "max": edge, "count": n})
+            lower = edge
+        bins.append({"min": lower, "max": None, "count": self.counts[-1]})
+        return bins
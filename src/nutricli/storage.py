@@ -0,0 +1,545 @@
+"""Storage backends behind ``queries``.
+
+``queries`` reads through the ``Storage`` protocol. A ``sqlite3.Connection``
+(a database file, or the shared in-memory database that
+``NUTRI_DB_PATH=:memory:`` selects) is wrapped in ``SQLiteStorage``, which
+delegates to ``db``. ``MemoryStorage`` keeps meals, water and targets in
+plain Python structures indexed by date, for tests and simulation runs that
+never need SQLite at all::
+
+    store = MemoryStorage()
+    store.insert_target(date_from="2026-01-01", calories=2000)
+    store.insert_meal(date="2026-01-02", description="Oats", calories=450)
+    queries.range_summary(store, "2026-01-01", "2026-01-31", avg=True)
+
+Rows are dicts with the same columns and defaults as the SQLite tables, so
+both backends return the same results.
+"""
+
+from __future__ import annotations
+
+import bisect
+import sqlite3
+from typing import Iterable, Iterator, Protocol, Union, runtime_checkable
+
+from . import db
+from .models import MACRO_FIELDS, MEAL_TYPES, description_key, epoch_day
+
+
+@runtime_checkable
+class Storage(Protocol):
+    """Everything ``queries`` reads. Dates are ``YYYY-MM-DD`` strings."""
+
+    def get_meals_by_date(self, date: str) -> list[dict]: ...
+
+    def iter_meal_macros_in_range(
+        self, date_from: str, date_to: str
+    ) -> Iterator[dict]: ...
+
+    def get_cached_day_totals(
+        self, date_from: str, date_to: str
+    ) -> dict[str, dict]: ...
+
+    def get_meal_breakdown(
+        self,
+        date_from: str,
+        date_to: str,
+        by: str,
+        between: tuple[str, str] | None = None,
+        nutrients: list[str] | None = None,
+    ) -> tuple[list[dict], list[dict]]: ...
+
+    def get_meal_nutrients_in_range(
+        self, date_from: str, date_to: str, codes: list[str]
+    ) -> dict[int, dict[str, float]]: ...
+
+    def get_nutrient_totals_in_range(
+        self, date_from: str, date_to: str, codes: list[str]
+    ) -> dict[str, dict[str, float]]: ...
+
+    def get_target_for_date(self, date: str) -> dict | None: ...
+
+    def get_all_targets(self) -> list[dict]: ...
+
+    def get_target_hits(
+        self,
+        field: str,
+        date_from: str | None,
+        date_to: str | None,
+        tolerance: float,
+    ) -> list[dict]: ...
+
+    def get_hit_streaks(
+        self,
+        field: str,
+        date_from: str | None,
+        date_to: str | None,
+        tolerance: float,
+    ) -> list[dict]: ...
+
+    def get_water_by_date(self, date: str) -> list[dict]: ...
+
+    def get_water_total(self, date: str) -> float: ...
+
+    def get_water_totals_in_range(
+        self, date_from: str, date_to: str
+    ) -> dict[str, float]: ...
+
+    def get_water_by_hour(
+        self,
+        date_from: str,
+        date_to: str,
+        between: tuple[str, str] | None = None,
+    ) -> list[dict]: ...
+
+
+StorageLike = Union[sqlite3.Connection, Storage]
+
+
+def as_storage(source: StorageLike) -> Storage:
+    """``source`` itself, or a ``SQLiteStorage`` around a connection."""
+    if isinstance(source, sqlite3.Connection):
+        return SQLiteStorage(source)
+    return source
+
+
+# ── SQLite ───────────────────────────────────────────────────────────────────
+
+
+class SQLiteStorage:
+    """``Storage`` over a SQLite connection, delegating to ``db``."""
+
+    def __init__(self, conn: sqlite3.Connection) -> None:
+        self.conn = conn
+
+    def close(self) -> None:
+        self.conn.close()
+
+    def get_meals_by_date(self, date):
+        return db.get_meals_by_date(self.conn, date)
+
+    def iter_meal_macros_in_range(self, date_from, date_to):
+        return db.iter_meal_macros_in_range(self.conn, date_from, date_to)
+
+    def get_cached_day_totals(self, date_from, date_to):
+        return db.get_cached_day_totals(self.conn, date_from, date_to)
+
+    def get_meal_breakdown(self, date_from, date_to, by, between=None, nutrients=None):
+        return db.get_meal_breakdown(
+            self.conn, date_from, date_to, by, between, nutrients
+        )
+
+    def get_meal_nutrients_in_range(self, date_from, date_to, codes):
+        return db.get_meal_nutrients_in_range(self.conn, date_from, date_to, codes)
+
+    def get_nutrient_totals_in_range(self, date_from, date_to, codes):
+        return db.get_nutrient_totals_in_range(self.conn, date_from, date_to, codes)
+
+    def get_target_for_date(self, date):
+        return db.get_target_for_date(self.conn, date)
+
+    def get_all_targets(self):
+        return db.get_all_targets(self.conn)
+
+    def get_target_hits(self, field, date_from, date_to, tolerance):
+        return db.get_target_hits(self.conn, field, date_from, date_to, tolerance)
+
+    def get_hit_streaks(self, field, date_from, date_to, tolerance):
+        return db.get_hit_streaks(self.conn, field, date_from, date_to, tolerance)
+
+    def get_water_by_date(self, date):
+        return db.get_water_by_date(self.conn, date)
+
+    def get_water_total(self, date):
+        return db.get_water_total(self.conn, date)
+
+    def get_water_totals_in_range(self, date_from, date_to):
+        return db.get_water_totals_in_range(self.conn, date_from, date_to)
+
+    def get_water_by_hour(self, date_from, date_to, between=None):
+        return db.get_water_by_hour(self.conn, date_from, date_to, between)
+
+
+# ── plain Python ─────────────────────────────────────────────────────────────
+
+# Column defaults of the meals, water and targets tables, in table order.
+# Keep in step with migrations; test_storage compares them with the schema.
+MEAL_COLUMNS = {
+    "id": None,
+    "date": None,
+    "time": None,
+    "meal_type": "snack",
+    "description": None,
+    "calories": None,
+    **{f: 0.0 for f in MACRO_FIELDS if f != "calories"},
+    "confidence": "medium",
+    "confirmed": 0,
+    "source": "vision-ai",
+    "created_at": None,
+    "updated_at": None,
+    "uid": None,
+    "food_id": None,
+    "barcode": None,
+    "day": None,
+    "desc_key": None,
+}
+WATER_COLUMNS = {
+    "id": None,
+    "date": None,
+    "time": None,
+    "amount_ml": None,
+    "created_at": None,
+    "uid": None,
+    "updated_at": None,
+    "day": None,
+}
+TARGET_COLUMNS = {
+    "id": None,
+    "date_from": None,
+    "calories": None,
+    "protein_g": None,
+    "carbs_g": None,
+    "fat_g": None,
+    "fiber_g": None,
+    "note": None,
+    "uid": None,
+    "updated_at": None,
+    "day": None,
+}
+# REAL columns; SQLite stores integers given for them as floats.
+REAL_COLUMNS = {*MACRO_FIELDS, "amount_ml"}
+
+
+def _row(columns: dict, values: dict) -> dict:
+    unknown = values.keys() - columns.keys()
+    if unknown:
+        raise ValueError(f"Unknown column: {', '.join(sorted(unknown))}.")
+    row = {**columns, **values}
+    for k in REAL_COLUMNS & row.keys():
+        if row[k] is not None:
+            row[k] = float(row[k])
+    return row
+
+
+def _time_order(row: dict) -> tuple:
+    # ORDER BY time, id: NULL times first.
+    return (row["time"] is not None, row["time"] or "", row["id"])
+
+
+def _sum(values: Iterable[float | None]) -> float | None:
+    # SQL SUM(): NULLs are skipped, and all-NULL sums to NULL.
+    present = [v for v in values if v is not None]
+    return sum(present) if present else None
+
+
+def _in_window(time: str | None, between: tuple[str, str] | None) -> bool:
+    if not between:
+        return True
+    if time is None:
+        return False
+    start, end = between
+    if start <= end:
+        return start <= time <= end
+    return time >= start or time <= end
+
+
+def _hour(time: str | None) -> int | None:
+    return int(time[:2]) if time else None
+
+
+def _key_order(by: str):
+    if by == "meal_type":
+        return lambda k: (
+            MEAL_TYPES.index(k) if k in MEAL_TYPES else len(MEAL_TYPES),
+            k is not None,
+            k or "",
+        )
+    return lambda k: (k is not None, k or 0)
+
+
+class MemoryStorage:
+    """``Storage`` kept in dicts and date-sorted lists, with the writes a
+    simulation needs. Nothing is persisted; archives do not apply."""
+
+    def __init__(self) -> None:
+        self._meals: dict[int, dict] = {}
+        # date -> that day's rows in (time, id) order; dates kept sorted.
+        self._meals_by_date: dict[str, list[dict]] = {}
+        self._meal_dates: list[str] = []
+        self._water_by_date: dict[str, list[dict]] = {}
+        self._water_dates: list[str] = []
+        # Sorted by (day, id): the latest entry for a day wins.
+        self._targets: list[dict] = []
+        self._nutrients: dict[int, dict[str, float]] = {}
+        self._next_id = {"meals": 1, "water": 1, "targets": 1}
+
+    def _new_id(self, table: str) -> int:
+        new = self._next_id[table]
+        self._next_id[table] = new + 1
+        return new
+
+    @staticmethod
+    def _add_by_date(index: dict[str, list[dict]], dates: list[str], row: dict) -> None:
+        rows = index.get(row["date"])
+        if rows is None:
+            rows = index[row["date"]] = []
+            bisect.insort(dates, row["date"])
+        bisect.insort(rows, row, key=_time_order)
+
+    @staticmethod
+    def _dates_in(dates: list[str], date_from: str | None, date_to: str | None):
+        lo = bisect.bisect_left(dates, date_from) if date_from else 0
+        hi = bisect.bisect_right(dates, date_to) if date_to else len(dates)
+        return dates[lo:hi]
+
+    def _meals_in(self, date_from: str, date_to: str) -> Iterator[dict]:
+        for d in self._dates_in(self._meal_dates, date_from, date_to):
+            yield from self._meals_by_date[d]
+
+    # ── writes ───────────────────────────────────────────────────────────────
+
+    def insert_meal(self, **kwargs) -> int:
+        if kwargs.get("description") is None or kwargs.get("calories") is None:
+            raise ValueError("A meal needs a description and calories.")
+        now = db.utc_now()
+        kwargs.setdefault("uid", db.new_uid())
+        kwargs.setdefault("day", epoch_day(kwargs["date"]))
+        kwargs.setdefault("desc_key", description_key(kwargs.get("description")))
+        kwargs.setdefault("created_at", now)
+        kwargs.setdefault("updated_at", now)
+        row = _row(MEAL_COLUMNS, {**kwargs, "id": self._new_id("meals")})
+        self._meals[row["id"]] = row
+        self._add_by_date(self._meals_by_date, self._meal_dates, row)
+        return row["id"]
+
+    def delete_meal(self, meal_id: int) -> bool:
+        row = self._meals.pop(meal_id, None)
+        if row is None:
+            return False
+        rows = self._meals_by_date[row["date"]]
+        rows.remove(row)
+        if not rows:
+            del self._meals_by_date[row["date"]]
+            self._meal_dates.remove(row["date"])
+        self._nutrients.pop(meal_id, None)
+        return True
+
+    def set_meal_nutrients(
+        self, meal_id: int, amounts: dict[str, float | None]
+    ) -> None:
+        current = self._nutrients.setdefault(meal_id, {})
+        for code, amount in amounts.items():
+            if amount is None:
+                current.pop(code, None)
+            else:
+                current[code] = float(amount)
+
+    def insert_water(self, **kwargs) -> int:
+        kwargs.setdefault("uid", db.new_uid())
+        kwargs.setdefault("day", epoch_day(kwargs["date"]))
+        kwargs.setdefault("created_at", db.utc_now())
+        kwargs.setdefault("updated_at", kwargs["created_at"])
+        row = _row(WATER_COLUMNS, {**kwargs, "id": self._new_id("water")})
+        self._add_by_date(self._water_by_date, self._water_dates, row)
+        return row["id"]
+
+    def insert_target(self, **kwargs) -> int:
+        kwargs.setdefault("uid", db.new_uid())
+        kwargs.setdefault("day", epoch_day(kwargs["date_from"]))
+        kwargs.setdefault("updated_at", db.utc_now())
+        row = _row(TARGET_COLUMNS, {**kwargs, "id": self._new_id("targets")})
+        bisect.insort(self._targets, row, key=lambda t: (t["day"], t["id"]))
+        return row["id"]
+
+    # ── meals ────────────────────────────────────────────────────────────────
+
+    def get_meals_by_date(self, date: str) -> list[dict]:
+        return [dict(m) for m in self._meals_by_date.get(date, [])]
+
+    def iter_meal_macros_in_range(self, date_from: str, date_to: str) -> Iterator[dict]:
+        for m in self._meals_in(date_from, date_to):
+            yield {"date": m["date"], **{f: m[f] for f in MACRO_FIELDS}}
+
+    def get_cached_day_totals(self, date_from: str, date_to: str) -> dict[str, dict]:
+        return {
+            d: self._day_totals(d)
+            for d in self._dates_in(self._meal_dates, date_from, date_to)
+        }
+
+    def _day_totals(self, date: str) -> dict:
+        meals = self._meals_by_date[date]
+        return {
+            "meals": len(meals),
+            "totals": {f: sum(m[f] or 0.0 for m in meals) for f in MACRO_FIELDS},
+        }
+
+    def get_meal_breakdown(
+        self,
+        date_from: str,
+        date_to: str,
+        by: str,
+        between: tuple[str, str] | None = None,
+        nutrients: list[str] | None = None,
+    ) -> tuple[list[dict], list[dict]]:
+        if by not in db.BREAKDOWN_KEYS:
+            raise KeyError(by)
+        cells: dict[tuple, list[dict]] = {}
+        for m in self._meals_in(date_from, date_to):
+            if _in_window(m["time"], between):
+                key = m["meal_type"] if by == "meal_type" else _hour(m["time"])
+                cells.setdefault((m["date"], key), []).append(m)
+        per_key: dict[object, list[dict]] = {}
+        for (_, key), meals in cells.items():
+            per_key.setdefault(key, []).extend(meals)
+        order = _key_order(by)
+
+        def sums(meals: list[dict]) -> dict:
+            return {f: _sum(m[f] for m in meals) for f in MACRO_FIELDS}
+
+        cell_rows = [
+            {"date": d, "key": k, "meals": len(ms), **sums(ms)}
+            for (d, k), ms in sorted(
+                cells.items(), key=lambda i: (i[0][0], order(i[0][1]))
+            )
+        ]
+        total_rows = [
+            {
+                "key": k,
+                "meals": len(ms),
+                "days": len({m["date"] for m in ms}),
+                **sums(ms),
+            }
+            for k, ms in sorted(per_key.items(), key=lambda i: order(i[0]))
+        ]
+        if nutrients:
+            rows = []
+            for (d, k), ms in cells.items():
+                for code in nutrients:
+                    amounts = [
+                        self._nutrients[m["id"]][code]
+                        for m in ms
+                        if code in self._nutrients.get(m["id"], {})
+                    ]
+                    if amounts:
+                        rows.append(
+                            {"date": d, "key": k, "code": code, "amount": sum(amounts)}
+                        )
+            db.attach_breakdown_nutrients(cell_rows, total_rows, rows, nutrients)
+        return cell_rows, total_rows
+
+    # ── extra nutrients ──────────────────────────────────────────────────────
+
+    def get_meal_nutrients_in_range(
+        self, date_from: str, date_to: str, codes: list[str]
+    ) -> dict[int, dict[str, float]]:
+        result: dict[int, dict[str, float]] = {}
+        for m in self._meals_in(date_from, date_to):
+            amounts = self._nutrients.get(m["id"], {})
+            picked = {c: amounts[c] for c in codes if c in amounts}
+            if picked:
+                result[m["id"]] = picked
+        return result
+
+    def get_nutrient_totals_in_range(
+        self, date_from: str, date_to: str, codes: list[str]
+    ) -> dict[str, dict[str, float]]:
+        result: dict[str, dict[str, float]] = {}
+        for m in self._meals_in(date_from, date_to):
+            amounts = self._nutrients.get(m["id"], {})
+            for c in codes:
+                if c in amounts:
+                    day = result.setdefault(m["date"], {})
+                    day[c] = day.get(c, 0.0) + amounts[c]
+        return result
+
+    # ── targets ──────────────────────────────────────────────────────────────
+
+    def get_target_for_date(self, date: str) -> dict | None:
+        i = bisect.bisect_right(self._targets, epoch_day(date), key=lambda t: t["day"])
+        return dict(self._targets[i - 1]) if i else None
+
+    def get_all_targets(self) -> list[dict]:
+        return [
+            dict(t)
+            for t in sorted(
+                self._targets, key=lambda t: (t["date_from"], t["id"]), reverse=True
+            )
+        ]
+
+    def get_target_hits(
+        self,
+        field: str,
+        date_from: str | None,
+        date_to: str | None,
+        tolerance: float,
+    ) -> list[dict]:
+        if field not in db.TARGET_FIELDS:
+            raise ValueError(f"No targets for field: {field}.")
+        within = db.target_rule(field) == "within"
+        days = []
+        for d in self._dates_in(self._meal_dates, date_from, date_to):
+            target = self.get_target_for_date(d)
+            goal = target[field] if target else None
+            if goal is None or goal <= 0:
+                continue
+            total = self._day_totals(d)["totals"][field]
+            hit = abs(total - goal) <= goal * tolerance if within else total >= goal
+            days.append({"date": d, "total": total, "goal": goal, "hit": hit})
+        return days
+
+    def get_hit_streaks(
+        self,
+        field: str,
+        date_from: str | None,
+        date_to: str | None,
+        tolerance: float,
+    ) -> list[dict]:
+        runs: list[dict] = []
+        previous = None
+        for d in self.get_target_hits(field, date_from, date_to, tolerance):
+            if not d["hit"]:
+                continue
+            day = epoch_day(d["date"])
+            if runs and previous == day - 1:
+                runs[-1]["end"] = d["date"]
+                runs[-1]["days"] += 1
+            else:
+                runs.append({"start": d["date"], "end": d["date"], "days": 1})
+            previous = day
+        return runs
+
+    # ── water ────────────────────────────────────────────────────────────────
+
+    def get_water_by_date(self, date: str) -> list[dict]:
+        return [dict(w) for w in self._water_by_date.get(date, [])]
+
+    def get_water_total(self, date: str) -> float:
+        return float(sum(w["amount_ml"] for w in self._water_by_date.get(date, [])))
+
+    def get_water_totals_in_range(
+        self, date_from: str, date_to: str
+    ) -> dict[str, float]:
+        return {
+            d: sum(w["amount_ml"] for w in self._water_by_date[d])
+            for d in self._dates_in(self._water_dates, date_from, date_to)
+        }
+
+    def get_water_by_hour(
+        self,
+        date_from: str,
+        date_to: str,
+        between: tuple[str, str] | None = None,
+    ) -> list[dict]:
+        rows = []
+        for d in self._dates_in(self._water_dates, date_from, date_to):
+            hours: dict[int | None, float] = {}
+            for w in self._water_by_date[d]:
+                if _in_window(w["time"], between):
+                    h = _hour(w["time"])
+                    hours[h] = hours.get(h, 0.0) + w["amount_ml"]
+            order = _key_order("hour")
+            rows += [
+                {"date": d, "key": h, "water_ml": ml}
+                for h, ml in sorted(hours.items(), key=lambda i: order(i[0]))
+            ]
+        return rows
@@ -0,0 +1,304 @@
+"""Delta sync between devices via the trigger-maintained change log.
+
+Each device pushes the rows changed since its last push as a JSONL changeset
+and pulls changesets written by other devices. A transport is either a
+directory (one sub-directory per device, one file per push) or a single file
+that every push appends its changeset to. A changeset that starts after the
+last one applied from its device is refused, so a lost push is never skipped.
+Conflicts are resolved per row by ``updated_at`` with deterministic
+tie-breaking, so every device converges on the same version.
+"""
+
+from __future__ import annotations
+
+import json
+import shutil
+import sqlite3
+from pathlib import Path
+
+from .db import (
+    SCHEMA_VERSION,
+    SYNC_TABLES,
+    _table_columns,
+    new_uid,
+    write_transaction,
+)
+from .models import description_key
+
+# Columns that are local to a database and never exchanged.
+LOCAL_COLUMNS = ("id", "food_id", "desc_key")
+
+
+class SyncError(RuntimeError):
+    """A changeset that cannot be applied safely."""
+
+
+def get_device_id(conn: sqlite3.Connection) -> str:
+    row = conn.execute(
+        "SELECT value FROM sync_state WHERE key = 'device_id'"
+    ).fetchone()
+    if row:
+        return row[0]
+    device_id = new_uid()
+    _set_state(conn, "device_id", device_id)
+    conn.commit()
+    return device_id
+
+
+def _get_state(conn: sqlite3.Connection, key: str, default: str = "0") -> str:
+    row = conn.execute("SELECT value FROM sync_state WHERE key = ?", (key,)).fetchone()
+    return row[0] if row else default
+
+
+def _set_state(conn: sqlite3.Connection, key: str, value: str) -> None:
+    conn.execute(
+        "INSERT INTO sync_state (key, value) VALUES (?, ?) "
+        "ON CONFLICT(key) DO UPDATE SET value = excluded.value",
+        (key, value),
+    )
+
+
+def is_file_transport(target: Path) -> bool:
+    return target.is_file() or (not target.is_dir() and target.suffix != "")
+
+
+def pending_changes(conn: sqlite3.Connection, target: Path) -> int:
+    last = int(_get_state(conn, f"push:{target.resolve()}"))
+    return conn.execute(
+        "SELECT COUNT(*) FROM (SELECT MAX(seq), origin FROM changes "
+        "WHERE seq > ? GROUP BY tbl, uid HAVING origin IS NULL)",
+        (last,),
+    ).fetchone()[0]
+
+
+def push(conn: sqlite3.Connection, target: Path) -> dict:
+    """Write local changes since the last push to ``target``.
+
+    Only change-log entries newer than the last pushed sequence are read, and
+    each row is sent once in its current state (or as a tombstone).
+    """
+    target = target.expanduser()
+    device_id = get_device_id(conn)
+    state_key = f"push:{target.resolve()}"
+    from_seq = int(_get_state(conn, state_key))
+    to_seq = conn.execute("SELECT COALESCE(MAX(seq), 0) FROM changes").fetchone()[0]
+    changes = conn.execute(
+        # Latest entry per row; rows last written by a peer are not echoed.
+        "SELECT tbl, uid, op, changed_at, MAX(seq) AS seq, origin FROM changes "
+        "WHERE seq > ? AND seq <= ? GROUP BY tbl, uid HAVING origin IS NULL "
+        "ORDER BY seq",
+        (from_seq, to_seq),
+    ).fetchall()
+    result = {
+        "device": device_id,
+        "from_seq": from_seq,
+        "to_seq": to_seq,
+        "changes": 0,
+        "file": None,
+    }
+    if not changes:
+        # The state stays put, so the next changeset still starts where the
+        # last written one ended and pulls can check for gaps.
+        return result
+
+    if is_file_transport(target):
+        path = target
+    else:
+        path = target / device_id / f"{to_seq:012d}.jsonl"
+    path.parent.mkdir(parents=True, exist_ok=True)
+    partial = path.with_name(path.name + ".partial")
+    count = 0
+    with open(partial, "w", encoding="utf-8") as f:
+        if path.exists():
+            # A file transport keeps every changeset; the new one is appended.
+            with open(path, encoding="utf-8") as old:
+                shutil.copyfileobj(old, f)
+        header = {
+            "device": device_id,
+            "from_seq": from_seq,
+            "to_seq": to_seq,
+            "schema_version": SCHEMA_VERSION,
+        }
+        f.write(json.dumps(header) + "\n")
+        for change in changes:
+            record = _change_record(conn, change)
+            if record is None:
+                continue
+            f.write(json.dumps(record, ensure_ascii=False) + "\n")
+            count += 1
+    partial.replace(path)
+
+    _set_state(conn, state_key, str(to_seq))
+    conn.commit()
+    result.update(changes=count, file=str(path))
+    return result
+
+
+def _change_record(conn: sqlite3.Connection, change: sqlite3.Row) -> dict | None:
+    table, uid = change["tbl"], change["uid"]
+    if change["op"] == "delete":
+        return {
+            "table": table,
+            "uid": uid,
+            "op": "delete",
+            "updated_at": change["changed_at"],
+        }
+    row = conn.execute(f"SELECT * FROM {table} WHERE uid = ?", (uid,)).fetchone()
+    if row is None:
+        # Removed since, by a change that is not ours to send (e.g. archived).
+        return None
+    data = {k: row[k] for k in row.keys() if k not in LOCAL_COLUMNS}
+    return {
+        "table": table,
+        "uid": uid,
+        "op": "upsert",
+        "updated_at": data.get("updated_at"),
+        "row": data,
+    }
+
+
+def pull(conn: sqlite3.Connection, source: Path) -> dict:
+    """Apply changesets from other devices that have not been applied yet."""
+    source = source.expanduser()
+    device_id = get_device_id(conn)
+    if is_file_transport(source):
+        files = [source] if source.exists() else []
+    else:
+        # Changeset files are named by their last sequence number, so
+        # already-applied ones are skipped without being opened.
+        files = sorted(
+            p
+            for p in source.glob("*/*.jsonl")
+            if p.parent.name != device_id
+            and p.stem.isdigit()
+            and int(p.stem) > int(_get_state(conn, f"pull:{p.parent.name}"))
+        )
+    result = {"device": device_id, "files": 0, "applied": 0, "skipped": 0}
+    for path in files:
+        with open(path, encoding="utf-8") as f:
+            for header, changes in _changesets(f):
+                peer = header["device"]
+                state_key = f"pull:{peer}"
+                last = int(_get_state(conn, state_key))
+                if peer == device_id or header["to_seq"] <= last:
+                    continue
+                if header.get("schema_version", 0) > SCHEMA_VERSION:
+                    raise SyncError(
+                        f"{path} was written by a newer nutri "
+                        f"(schema v{header['schema_version']}); upgrade first."
+                    )
+                if header["from_seq"] > last:
+                    raise SyncError(
+                        f"{path}: changes {last + 1}-{header['from_seq']} of device "
+                        f"{peer} are missing; pull the transport they were pushed to."
+                    )
+                with write_transaction(conn):
+                    for change in changes:
+                        if apply_change(conn, peer, device_id, change):
+                            result["applied"] += 1
+                        else:
+                            result["skipped"] += 1
+                    _set_state(conn, state_key, str(header["to_seq"]))
+                result["files"] += 1
+    return result
+
+
+def _changesets(lines):
+    """Yield ``(header, changes)`` for each changeset in a transport file."""
+    header, changes = None, []
+    for line in lines:
+        if not line.strip():
+            continue
+        record = json.loads(line)
+        if "table" not in record:
+            if header is not None:
+                yield header, changes
+            header, changes = record, []
+        elif header is None:
+            raise ValueError("changes before the changeset header")
+        else:
+            changes.append(record)
+    if header is not None:
+        yield header, changes
+
+
+def _wins(incoming: tuple[str, str, str], local: tuple[str, str, str]) -> bool:
+    """Deterministic last-writer-wins on (updated_at, op, device id).
+
+    At equal timestamps a delete beats an upsert, then the larger device id
+    wins, so both sides of a conflict pick the same outcome.
+    """
+    rank = {"insert": 0, "update": 0, "upsert": 0, "delete": 1}
+    return (incoming[0] or "", rank[incoming[1]], incoming[2]) > (
+        local[0] or "",
+        rank[local[1]],
+        local[2],
+    )
+
+
+def apply_change(
+    conn: sqlite3.Connection, peer: str, device_id: str, change: dict
+) -> bool:
+    """Apply one remote change inside the caller's transaction.
+
+    Change-log entries produced by the apply are tagged with the peer as
+    origin, so they are not pushed back to it.
+    """
+    table, op = change["table"], change["op"]
+    if table not in SYNC_TABLES:
+        return False
+    uid, incoming = change["uid"], (change["updated_at"], change["op"], peer)
+    last_seq = conn.execute("SELECT MAX(seq) FROM changes").fetchone()[0] or 0
+    local = conn.execute(
+        f"SELECT id, updated_at FROM {table} WHERE uid = ?", (uid,)
+    ).fetchone()
+    if local is not None:
+        current = (local["updated_at"], "upsert", device_id)
+    else:
+        tombstone = conn.execute(
+            "SELECT changed_at FROM changes WHERE tbl = ? AND uid = ? "
+            "AND op = 'delete' ORDER BY seq DESC LIMIT 1",
+            (table, uid),
+        ).fetchone()
+        current = (tombstone[0], "delete", device_id) if tombstone else None
+
+    if op == "delete":
+        if local is None or not _wins(incoming, current):
+            return False
+        conn.execute(f"DELETE FROM {table} WHERE id = ?", (local["id"],))
+    else:
+        if current is not None and not _wins(incoming, current):
+            return False
+        known = set(_table_columns(conn, table))
+        row = {k: v for k, v in change["row"].items() if k in known}
+        if "desc_key" in known and "description" in row:
+            row["desc_key"] = description_key(row["description"])
+        cols = list(row)
+        if local is not None:
+            sets = ", ".join(f"{c} = ?" for c in cols)
+            conn.execute(
+                f"UPDATE {table} SET {sets} WHERE id = ?",
+                [*row.values(), local["id"]],
+            )
+        else:
+            conn.execute(
+                f"INSERT INTO {table} ({', '.join(cols)}) "
+                f"VALUES ({', '.join('?' * len(cols))})",
+                list(row.values()),
+            )
+
+    conn.execute(
+        "UPDATE changes SET origin = ?, changed_at = ? WHERE seq > ?",
+        (peer, change["updated_at"], last_seq),
+    )
+    return True
+
+
+def compact_change_log(conn: sqlite3.Connection) -> int:
+    """Drop change-log entries superseded by a newer entry for the same row."""
+    cur = conn.execute(
+        "DELETE FROM changes WHERE seq NOT IN "
+        "(SELECT MAX(seq) FROM changes GROUP BY tbl, uid)"
+    )
+    conn.commit()
+    return cur.rowcount
@@ -0,0 +1,118 @@
+"""Change feed over the trigger-maintained change log.
+
+A watcher keeps one connection open and polls ``PRAGMA data_version``, which
+only moves when another connection commits, so idle polls cost a single
+pragma. New change-log entries are then read by sequence number and turned
+into created/updated/deleted events for meals and water.
+"""
+
+from __future__ import annotations
+
+import sqlite3
+import time
+from typing import Callable, Iterator
+
+from .db import get_changes_since, get_data_version, get_last_change_seq, get_row
+from .models import MACRO_FIELDS, today_str
+from .queries import status_summary
+
+WATCH_TABLES = ("meals", "water")
+POLL_INTERVAL = 0.5
+
+
+def change_events(conn: sqlite3.Connection, since: int) -> tuple[list[dict], int]:
+    """Events for change-log entries after ``since`` and the new high-water mark.
+
+    Entries are coalesced per row, so a row inserted and edited between two
+    polls is reported once as created; a row created and deleted in between
+    is not reported at all.
+    """
+    changes = get_changes_since(conn, since, WATCH_TABLES)
+    if not changes:
+        return [], since
+    per_row: dict[tuple[str, str], dict] = {}
+    for change in changes:
+        key = (change["tbl"], change["uid"] or str(change["row_id"]))
+        entry = per_row.setdefault(key, {"first": change["op"], "seq": 0})
+        entry.update(last=change, seq=change["seq"])
+
+    events = []
+    for entry in sorted(per_row.values(), key=lambda e: e["seq"]):
+        change = entry["last"]
+        if change["op"] == "delete":
+            if entry["first"] == "insert":
+                continue
+            event, row = "deleted", None
+        else:
+            row = get_row(conn, change["tbl"], change["row_id"])
+            if row is None:
+                # Gone again by the time we looked (e.g. archived).
+                continue
+            event = "created" if entry["first"] == "insert" else "updated"
+        events.append(
+            {
+                "seq": change["seq"],
+                "event": event,
+                "table": change["tbl"],
+                "id": change["row_id"],
+                "uid": change["uid"],
+                "origin": change["origin"],
+                "row": row,
+            }
+        )
+    return events, changes[-1]["seq"]
+
+
+def status_delta(previous: dict | None, current: dict) -> dict:
+    """Per-field change of a status summary's totals and water since ``previous``."""
+    if previous is None or previous["date"] != current["date"]:
+        return {}
+    delta = {
+        f: round(current["totals"][f] - previous["totals"][f], 1)
+        for f in MACRO_FIELDS
+        if current["totals"][f] != previous["totals"][f]
+    }
+    if current["meals"] != previous["meals"]:
+        delta["meals"] = current["meals"] - previous["meals"]
+    if current["water_ml"] != previous["water_ml"]:
+        delta["water_ml"] = round(current["water_ml"] - previous["water_ml"], 1)
+    return delta
+
+
+def watch(
+    conn: sqlite3.Connection,
+    since: int | None = None,
+    interval: float = POLL_INTERVAL,
+    status: bool = False,
+    timeout: float | None = None,
+    sleep: Callable[[float], None] = time.sleep,
+) -> Iterator[dict]:
+    """Yield change events as other connections commit them.
+
+    Starts after the current last change unless ``since`` is given. With
+    ``status=True`` a ``status`` event carrying today's summary and its delta
+    follows every batch that changed it. Stops after ``timeout`` seconds.
+    """
+    seq = get_last_change_seq(conn) if since is None else since
+    version = None
+    last_status = status_summary(conn, today_str()) if status else None
+    deadline = time.monotonic() + timeout if timeout is not None else None
+    while True:
+        current = get_data_version(conn)
+        if current != version:
+            version = current
+            events, seq = change_events(conn, seq)
+            yield from events
+            if status and events:
+                summary = status_summary(conn, today_str())
+                if summary != last_status:
+                    yield {
+                        "seq": seq,
+                        "event": "status",
+                        "status": summary,
+                        "delta": status_delta(last_status, summary),
+                    }
+                    last_status = summary
+        if deadline is not None and time.monotonic() >= deadline:
+            return
+        sleep(interval)
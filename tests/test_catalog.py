@@ -0,0 +1,106 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+from typer.testing import CliRunner
+
+from nutricli import catalog, db
+from nutricli.cli import app
+
+
+def _write_csv(path: Path) -> Path:
+    path.write_text(
+        "name,brand,calories,protein_g,carbs_g,fat_g\n"
+        "Rolled oats,,372,13.5,58.7,7\n"
+        "Oat milk,Oatly,46,1,6.6,1.5\n"
+        "Greek yogurt,,97,9,3.6,5\n"
+        ",,1,1,1,1\n",
+        encoding="utf-8",
+    )
+    return path
+
+
+def test_import_and_trigram_search(tmp_path: Path) -> None:
+    conn = db.get_connection(tmp_path / "nutrition.db")
+    rows = catalog.read_foods_csv(_write_csv(tmp_path / "foods.csv"))
+    assert catalog.import_foods(conn, rows) == 3
+
+    assert [f["name"] for f in catalog.search_foods(conn, "oat")] == [
+        "Oat milk",
+        "Rolled oats",
+    ]
+    # Substring and multi-term matches, including the brand column.
+    assert [f["name"] for f in catalog.search_foods(conn, "ogur")] == ["Greek yogurt"]
+    assert [f["name"] for f in catalog.search_foods(conn, "oatly milk")] == [
+        "Oat milk"
+    ]
+    assert catalog.search_foods(conn, 'oat" OR "x') == []
+    plan = " ".join(
+        r[3]
+        for r in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT rowid FROM foods_fts WHERE foods_fts MATCH 'oat'"
+        )
+    )
+    assert "VIRTUAL TABLE INDEX" in plan
+    conn.close()
+
+
+def test_log_food_scales_macros(tmp_path: Path, monkeypatch) -> None:
+    db_path = tmp_path / "nutrition.db"
+    monkeypatch.setenv("NUTRI_DB_PATH", str(db_path))
+    runner = CliRunner()
+    csv_path = _write_csv(tmp_path / "foods.csv")
+    assert runner.invoke(app, ["food", "import", str(csv_path)]).exit_code == 0
+
+    result = runner.invoke(
+        app, ["log", "--food", "rolled oats", "--grams", "80", "--format", "json"]
+    )
+    assert result.exit_code == 0, result.output
+    conn = db.get_connection(db_path)
+    meal = db.get_meal(conn, 1)
+    assert meal["description"] == "Rolled oats (80 g)"
+    assert meal["calories"] == 297.6
+    assert meal["protein_g"] == 10.8
+    assert meal["source"] == "manual"
+    assert meal["food_id"] == catalog.resolve_food(conn, "rolled oats")["id"]
+    conn.close()
+
+    # Explicit macros override the scaled catalog values, the rest still scale.
+    result = runner.invoke(
+        app,
+        [
+            "log",
+            "--food",
+            "rolled oats",
+            "--grams",
+            "80",
+            "--cal",
+            "300",
+            "--protein",
+            "12",
+            "--date",
+            "2026-01-02",
+        ],
+    )
+    assert result.exit_code == 0, result.output
+    conn = db.get_connection(db_path)
+    meal = db.get_meal(conn, 2)
+    assert (meal["calories"], meal["protein_g"]) == (300, 12)
+    assert meal["carbs_g"] == db.get_meal(conn, 1)["carbs_g"]
+    conn.close()
+
+    assert runner.invoke(app, ["log", "--food", "pizza"]).exit_code == 1
+    assert runner.invoke(app, ["log", "--desc", "x"]).exit_code == 1
+
+
+def test_failed_import_rolls_back(tmp_path: Path) -> None:
+    conn = db.get_connection(tmp_path / "nutrition.db")
+    bad = tmp_path / "bad.csv"
+    bad.write_text("name,calories\nApple,52\nPear,lots\n", encoding="utf-8")
+    with pytest.raises(ValueError, match="bad.csv:3"):
+        catalog.import_foods(conn, catalog.read_foods_csv(bad))
+    assert catalog.count_foods(conn) == 0
+    conn.execute("INSERT INTO foods (name) VALUES ('Apple')")
+    assert [f["name"] for f in catalog.search_foods(conn, "apple")] == ["Apple"]
+    conn.close()
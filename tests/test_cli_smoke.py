@@ -6,6 +6,10 @@ import subprocess
 import sys
 from pathlib import Path
 
+from typer.testing import CliRunner
+
+from nutricli.cli import app
+
 
 def _run_cli(args: list[str], env: dict[str, str]) -> subprocess.CompletedProcess[str]:
     cmd = [sys.executable, "-m", "nutricli", *args]
@@ -49,3 +53,21 @@ def test_cli_smoke(tmp_path: Path) -> None:
     result = _run_cli(["day", "today"], env)
     assert result.returncode == 1
     assert "Invalid date: today. Use format YYYY-MM-DD." in result.stderr
+
+
+def test_malformed_dates_exit_cleanly(tmp_path: Path, monkeypatch) -> None:
+    monkeypatch.setenv("NUTRI_DB_PATH", str(tmp_path / "nutrition.db"))
+    runner = CliRunner()
+    for args in (
+        ["query", "--from", "2026-13-01"],
+        ["query", "--from", "2026-01-01", "--to", "2026-02-30"],
+        ["export", "--from", "nope"],
+        ["export", "--from", "nope", "--format", "parquet", "-o", str(tmp_path / "x")],
+        ["log", "--desc", "x", "--cal", "1", "--date", "2026-02-30"],
+        ["adherence", "--from", "2026-1-1"],
+        ["water", "250", "--date", "2026-02-30"],
+        ["status", "--date", "yesterday"],
+    ):
+        result = runner.invoke(app, args)
+        assert result.exit_code == 1, args
+        assert "Invalid date" in result.output, args
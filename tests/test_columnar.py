@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+import pytest
+from typer.testing import CliRunner
+
+from nutricli import columnar, db
+from nutricli.cli import app
+
+
+def _seed(path: Path) -> None:
+    conn = db.get_connection(path)
+    for month in ("01", "02", "03"):
+        for day in ("03", "17"):
+            meal_id = db.insert_meal(
+                conn,
+                date=f"2026-{month}-{day}",
+                time="12:00",
+                description=f"Meal {month}-{day}",
+                calories=500,
+                protein_g=None if day == "17" else 30,
+                confirmed=1,
+            )
+            db.set_meal_nutrients(conn, meal_id, {"caffeine_mg": 80})
+    conn.close()
+
+
+def test_month_partitions_rewrite_only_changed_months(
+    tmp_path: Path, monkeypatch
+) -> None:
+    pq = pytest.importorskip("pyarrow.parquet")
+    path = tmp_path / "nutrition.db"
+    out = tmp_path / "export"
+    _seed(path)
+    monkeypatch.setenv("NUTRI_DB_PATH", str(path))
+    runner = CliRunner()
+    args = [
+        "export",
+        "--from",
+        "2026-01-01",
+        "--to",
+        "2026-12-31",
+        "--format",
+        "parquet",
+        "--partition",
+        "month",
+        "-o",
+        str(out),
+        "--nutrients",
+        "caffeine_mg",
+        "-j",
+        "2",
+    ]
+
+    result = runner.invoke(app, args)
+    assert result.exit_code == 0, result.output
+    assert "6 meals in 3 months (3 written, 0 unchanged, 0 removed)" in result.output
+    table = pq.read_table(out / "2026-02.parquet")
+    assert table.column_names[-1] == "caffeine_mg"
+    rows = table.to_pylist()
+    assert [r["description"] for r in rows] == ["Meal 02-03", "Meal 02-17"]
+    assert rows[0]["date"].isoformat() == "2026-02-03"
+    assert rows[0]["confirmed"] is True and rows[1]["protein_g"] is None
+    assert rows[0]["caffeine_mg"] == 80
+
+    result = runner.invoke(app, args)
+    assert "(0 written, 3 unchanged, 0 removed)" in result.output
+
+    conn = db.get_connection(path)
+    db.set_meal_nutrients(conn, 1, {"caffeine_mg": 90})
+    db.delete_meals(conn, date_from="2026-03-01", date_to="2026-03-31")
+    conn.close()
+    result = runner.invoke(app, args)
+    assert "4 meals in 2 months (1 written, 1 unchanged, 1 removed)" in result.output
+    assert sorted(p.name for p in out.glob("*.parquet")) == [
+        "2026-01.parquet",
+        "2026-02.parquet",
+    ]
+    manifest = json.loads((out / columnar.MANIFEST_NAME).read_text())
+    assert sorted(manifest["partitions"]) == ["2026-01", "2026-02"]
+    assert manifest["partitions"]["2026-01"]["rows"] == 2
+
+    # A range cut inside a month still covers the whole month, so neither
+    # a narrower window nor one past the last meal loses rows or files.
+    args[args.index("2026-12-31")] = "2026-02-10"
+    result = runner.invoke(app, args)
+    assert "4 meals in 2 months (0 written, 2 unchanged, 0 removed)" in result.output
+    args[args.index("2026-01-01")] = "2026-02-20"
+    result = runner.invoke(app, args)
+    assert "2 meals in 1 months (0 written, 1 unchanged, 0 removed)" in result.output
+    assert pq.read_table(out / "2026-02.parquet").num_rows == 2
+    assert (out / "2026-01.parquet").exists()
+
+
+def test_single_arrow_file_and_missing_pyarrow(tmp_path: Path, monkeypatch) -> None:
+    path = tmp_path / "nutrition.db"
+    _seed(path)
+    monkeypatch.setenv("NUTRI_DB_PATH", str(path))
+    runner = CliRunner()
+
+    if columnar_available():
+        import pyarrow as pa
+
+        target = tmp_path / "meals.arrow"
+        result = runner.invoke(
+            app, ["export", "--from", "2026-02-01", "--format", "arrow", "-o", str(target)]
+        )
+        assert result.exit_code == 0, result.output
+        assert pa.ipc.open_file(target).read_all().num_rows == 4
+
+    def unavailable():
+        raise columnar.ColumnarUnavailable("no pyarrow")
+
+    monkeypatch.setattr(columnar, "_pyarrow", unavailable)
+    result = runner.invoke(
+        app,
+        ["export", "--from", "2026-01-01", "--format", "parquet", "-o", str(tmp_path / "x")],
+    )
+    assert result.exit_code == 1
+    assert "no pyarrow" in result.output
+    result = runner.invoke(
+        app, ["export", "--from", "2026-01-01", "--format", "csv", "--partition", "month"]
+    )
+    assert result.exit_code == 1
+
+
+def columnar_available() -> bool:
+    try:
+        columnar.check_available()
+    except columnar.ColumnarUnavailable:
+        return False
+    return True
@@ -1,8 +1,14 @@
 from __future__ import annotations
 
+import json
+import sqlite3
 from pathlib import Path
 
-from nutricli import db
+import pytest
+from typer.testing import CliRunner
+
+from nutricli import db, models
+from nutricli.cli import app
 
 
 def test_schema_created_and_versioned(tmp_path: Path) -> None:
@@ -58,3 +64,490 @@ def test_insert_meal_target_water(tmp_path: Path) -> None:
     assert target["id"] == target_id
     assert water and water[0]["id"] == water_id
     conn.close()
+
+
+def test_archive_moves_meals_and_range_reads_span_archives(tmp_path: Path) -> None:
+    path = tmp_path / "nutrition.db"
+    conn = db.get_connection(path)
+    for day in ("2019-03-01", "2020-07-01", "2026-02-11"):
+        db.insert_meal(conn, date=day, description=day, calories=100)
+
+    moved = db.archive_meals_before(conn, "2021-01-01")
+    hot = conn.execute("SELECT COUNT(*) FROM main.meals").fetchone()[0]
+    meals = db.get_meals_in_range(conn, "2019-01-01", "2026-12-31")
+    conn.close()
+
+    assert moved == {"2019": 1, "2020": 1}
+    assert db.archive_path(path).exists()
+    assert hot == 1
+    assert [m["date"] for m in meals] == ["2019-03-01", "2020-07-01", "2026-02-11"]
+
+
+def test_archived_meals_are_read_only_and_span_many_years(
+    tmp_path: Path, monkeypatch
+) -> None:
+    path = tmp_path / "nutrition.db"
+    conn = db.get_connection(path)
+    for year in range(2010, 2026):
+        db.insert_meal(conn, date=f"{year}-05-01", description=str(year), calories=100)
+    db.archive_meals_before(conn, "2025-01-01")
+    conn.close()
+
+    monkeypatch.setenv("NUTRI_DB_PATH", str(path))
+    runner = CliRunner()
+    # Fifteen archived years sit in one attached database.
+    result = runner.invoke(app, ["export", "--from", "2010-01-01", "--format", "json"])
+    assert result.exit_code == 0, result.output
+    assert len(json.loads(result.output)) == 16
+    for args in (["delete", "1"], ["confirm", "1"], ["edit", "1", "--cal", "5"]):
+        result = runner.invoke(app, args)
+        assert result.exit_code == 1
+        assert "Meal #1 is archived and read-only." in result.output
+    assert "not found" in runner.invoke(app, ["delete", "999"]).output
+
+    conn = db.get_read_connection(path)
+    assert db.get_meal(conn, 1)["archived"] is True
+    assert "archived" not in db.get_meal(conn, 16)
+    assert db.list_archive_years(conn) == list(range(2010, 2025))
+    conn.close()
+
+
+def test_maintenance_steps(tmp_path: Path) -> None:
+    conn = db.get_connection(tmp_path / "nutrition.db")
+    for i in range(200):
+        db.insert_meal(conn, date="2026-02-11", description="x" * 200, calories=i)
+    conn.execute("DELETE FROM meals")
+    conn.commit()
+
+    assert db.optimize_db(conn)["analyzed"] is True
+    vacuum = db.vacuum_db(conn)
+    checkpoint = db.checkpoint_wal(conn)
+    conn.close()
+
+    assert vacuum["mode"] == "incremental"
+    assert vacuum["freed_pages"] > 0
+    assert checkpoint["busy"] is False
+
+
+def test_backup_and_restore_roundtrip(tmp_path: Path, monkeypatch) -> None:
+    conn = db.get_connection(tmp_path / "nutrition.db")
+    db.insert_meal(conn, date="2026-02-11", description="x", calories=100)
+    db.insert_target(conn, date_from="2026-02-11", calories=2000)
+    db.insert_water(conn, date="2026-02-11", time="09:00", amount_ml=300)
+
+    writer = db.get_connection(tmp_path / "nutrition.db")
+    steps: list[int] = []
+    original_sleep = db.time.sleep
+
+    def write_between_steps(seconds: float) -> None:
+        # A concurrent writer must never be blocked by the stepwise backup.
+        if not steps:
+            db.insert_water(writer, date="2026-02-11", time="10:00", amount_ml=200)
+        steps.append(1)
+        original_sleep(seconds)
+
+    monkeypatch.setattr(db.time, "sleep", write_between_steps)
+    result = db.backup_db(conn, tmp_path / "bk" / "snap.db", pages=1, sleep=0.001)
+    monkeypatch.undo()
+    writer.close()
+    compact = db.backup_db(conn, tmp_path / "bk" / "compact.db", vacuum_into=True)
+    conn.close()
+
+    restored = db.get_connection(tmp_path / "restored.db")
+    info = db.restore_db(restored, Path(result["path"]))
+    restored.close()
+
+    assert steps and result["steps"] > 1
+    assert compact["mode"] == "vacuum-into"
+    assert (info["meals"], info["targets"]) == (1, 1)
+    assert info["water_entries"] >= 1
+
+
+def test_backup_and_restore_carry_the_archive(tmp_path: Path) -> None:
+    conn = db.get_connection(tmp_path / "home" / "nutrition.db")
+    for day in ("2019-03-01", "2020-07-01", "2026-02-11"):
+        db.insert_meal(conn, date=day, description=day, calories=100)
+    db.archive_meals_before(conn, "2021-01-01")
+    result = db.backup_db(conn, tmp_path / "bk" / "snap.db", pages=2, sleep=0)
+    compact = db.backup_db(conn, tmp_path / "bk" / "compact.db", vacuum_into=True)
+    conn.close()
+    assert result["archive"] == str(db.archive_path(tmp_path / "bk" / "snap.db"))
+    assert Path(compact["archive"]).exists()
+
+    # A new machine: nothing but the backup files.
+    restored = db.get_connection(tmp_path / "new" / "nutrition.db")
+    info = db.restore_db(restored, Path(result["path"]))
+    meals = db.get_meals_in_range(restored, "2019-01-01", "2020-12-31")
+    restored.close()
+    assert (info["meals"], info["archived_meals"]) == (1, 2)
+    assert [m["date"] for m in meals] == ["2019-03-01", "2020-07-01"]
+
+    # Restoring a backup without an archive leaves no archived meals behind.
+    plain = db.get_connection(tmp_path / "plain.db")
+    db.insert_meal(plain, date="2026-02-11", description="x", calories=1)
+    bare = db.backup_db(plain, tmp_path / "bk" / "bare.db")
+    plain.close()
+    assert bare["archive"] is None
+    restored = db.get_connection(tmp_path / "new" / "nutrition.db")
+    assert db.restore_db(restored, Path(bare["path"]))["archived_meals"] == 0
+    assert db.get_meals_in_range(restored, "2019-01-01", "2020-12-31") == []
+    restored.close()
+
+    # Pruning treats a backup and its archive as one.
+    for stamp in ("20260101-000000", "20260102-000000"):
+        for name in (f"nutrition-{stamp}.db", f"nutrition-{stamp}-archive.db"):
+            (tmp_path / "bk" / name).write_text("")
+    removed = db.prune_backups(tmp_path / "bk", "nutrition", keep=1)
+    assert [Path(p).name for p in removed] == ["nutrition-20260101-000000.db"]
+    assert not (tmp_path / "bk" / "nutrition-20260101-000000-archive.db").exists()
+    assert (tmp_path / "bk" / "nutrition-20260102-000000-archive.db").exists()
+
+
+def test_prune_backups_keeps_newest(tmp_path: Path) -> None:
+    for stamp in ("20260101-000000", "20260102-000000", "20260103-000000"):
+        (tmp_path / f"nutrition-{stamp}.db").write_text("")
+    removed = db.prune_backups(tmp_path, "nutrition", keep=2)
+    assert [Path(p).name for p in removed] == ["nutrition-20260101-000000.db"]
+
+
+def test_bulk_update_and_delete_by_filter(tmp_path: Path) -> None:
+    conn = db.get_connection(tmp_path / "nutrition.db")
+    ids = [
+        db.insert_meal(
+            conn,
+            date=d,
+            description="m",
+            calories=100,
+            source=src,
+            confidence=conf,
+        )
+        for d, src, conf in [
+            ("2026-03-01", "vision-ai", "low"),
+            ("2026-03-01", "vision-ai", "high"),
+            ("2026-03-02", "manual", "low"),
+            ("2026-03-05", "vision-ai", "medium"),
+        ]
+    ]
+    day = {"date_from": "2026-03-01", "date_to": "2026-03-01"}
+    assert db.update_meals(
+        conn, {"confirmed": 1}, confidence="low", unconfirmed=True, **day
+    ) == [ids[0]]
+    # Already confirmed meals are not counted again.
+    assert db.update_meals(conn, {"confirmed": 1}, unconfirmed=True, **day) == [ids[1]]
+    assert db.update_meals(conn, {"meal_type": "lunch"}, ids=[ids[2], ids[3]]) == ids[2:]
+    assert db.get_meal(conn, ids[3])["meal_type"] == "lunch"
+
+    window = {"date_from": "2026-03-01", "date_to": "2026-03-04"}
+    assert db.select_meal_ids(conn, source="vision-ai", **window) == ids[:2]
+    assert db.delete_meals(conn, source="vision-ai", **window) == ids[:2]
+    assert db.select_meal_ids(conn, date_from="2026-01-01") == ids[2:]
+    with pytest.raises(ValueError):
+        db.delete_meals(conn)
+    conn.close()
+
+
+def test_day_key_range_scans_use_covering_index(tmp_path: Path) -> None:
+    conn = db.get_connection(tmp_path / "nutrition.db")
+    db.insert_meal(conn, date="2026-03-02", time="08:00", description="b", calories=1)
+    # Writers that only set the TEXT date get the key from the trigger.
+    conn.execute(
+        "INSERT INTO meals (date, time, description, calories) "
+        "VALUES ('2026-03-01', '12:00', 'a', 2)"
+    )
+    conn.execute("UPDATE meals SET date = '2026-02-28' WHERE description = 'a'")
+    conn.commit()
+
+    days = conn.execute("SELECT date, day FROM meals ORDER BY id").fetchall()
+    assert [tuple(r) for r in days] == [
+        ("2026-03-02", models.epoch_day("2026-03-02")),
+        ("2026-02-28", models.epoch_day("2026-02-28")),
+    ]
+    meals = db.get_meals_in_range(conn, "2026-02-01", "2026-03-31")
+    assert [m["description"] for m in meals] == ["a", "b"]
+    rows = list(db.iter_meal_macros_in_range(conn, "2026-02-01", "2026-03-31"))
+    assert [r["date"] for r in rows] == ["2026-02-28", "2026-03-02"]
+
+    macros = ", ".join(models.MACRO_FIELDS)
+    plan = " ".join(
+        r["detail"]
+        for r in conn.execute(
+            f"EXPLAIN QUERY PLAN SELECT day, {macros} FROM meals "
+            "WHERE day BETWEEN 1 AND 2 ORDER BY day, time, id"
+        )
+    )
+    assert "COVERING INDEX idx_meals_day" in plan
+    assert "TEMP B-TREE" not in plan
+    conn.close()
+
+
+def _v1_database(path: Path, meals: int) -> None:
+    conn = db.get_connection(path, migrate=False)
+    conn.executescript(db.SCHEMA)
+    conn.executemany(
+        "INSERT INTO meals (date, description, calories) VALUES (?, 'm', 100)",
+        [(f"2026-01-{i % 28 + 1:02d}",) for i in range(meals)],
+    )
+    conn.execute("PRAGMA user_version = 1")
+    conn.commit()
+    conn.close()
+
+
+def test_migrate_estimate_and_batched_backfill(tmp_path: Path) -> None:
+    path = tmp_path / "nutrition.db"
+    _v1_database(path, 30)
+    conn = db.get_connection(path, migrate=False)
+    plan = db.estimate_migration(conn)
+    assert plan["pending_versions"] == list(range(2, db.SCHEMA_VERSION + 1))
+    assert {"name": "meals_day", "rows": 30, "resumed": 0} == {
+        k: v for k, v in plan["backfills"][0].items() if k != "seconds"
+    }
+
+    class Interrupted(Exception):
+        pass
+
+    def stop(state: dict) -> None:
+        if state["last_id"] >= 20:
+            raise Interrupted
+
+    db.migrate_schema(conn)
+    assert db.get_schema_version(conn) == db.SCHEMA_VERSION
+    with pytest.raises(Interrupted):
+        db.run_backfills(conn, batch_size=10, progress=stop)
+    assert conn.execute("SELECT COUNT(*) FROM meals WHERE day IS NULL").fetchone()[0] == 10
+    remaining = db.estimate_migration(conn)["backfills"]
+    assert [(b["name"], b["rows"], b["resumed"]) for b in remaining] == [
+        ("meals_day", 10, 20),
+        ("meals_desc_key", 30, 0),
+    ]
+    conn.close()
+
+    # A normal connection finishes the remaining batches.
+    conn = db.get_connection(path)
+    assert db.pending_backfills(conn) == []
+    assert conn.execute("SELECT COUNT(*) FROM meals WHERE day IS NULL").fetchone()[0] == 0
+    assert conn.execute("SELECT COUNT(*) FROM meals WHERE desc_key IS NULL").fetchone()[0] == 0
+    assert len(db.get_meals_by_date(conn, "2026-01-01")) == 2
+    # Backfills are not user changes: only the seeded entries are logged.
+    ops = {r[0] for r in conn.execute("SELECT op FROM changes")}
+    assert ops == {"upsert"}
+    conn.close()
+
+
+def test_backfill_never_trims_concurrent_changes(tmp_path: Path) -> None:
+    path = tmp_path / "nutrition.db"
+    _v1_database(path, 5)
+    conn = db.get_connection(path, migrate=False)
+    db.migrate_schema(conn)
+    other = db.get_connection(path, migrate=False)
+    other.execute("PRAGMA busy_timeout = 0")
+    blocked: list[bool] = []
+
+    def write_in_the_gap(statement: str) -> None:
+        # Another process writes right after the change-log position is read.
+        if "MAX(seq)" in statement and not blocked:
+            try:
+                db.insert_meal(other, date="2026-01-02", description="x", calories=1)
+                blocked.append(False)
+            except sqlite3.OperationalError:
+                other.rollback()
+                blocked.append(True)
+
+    conn.set_trace_callback(write_in_the_gap)
+    db.run_backfills(conn)
+    conn.set_trace_callback(None)
+    assert blocked == [True]
+    db.insert_meal(other, date="2026-01-02", description="y", calories=1)
+    logged = other.execute("SELECT COUNT(*) FROM changes").fetchone()[0]
+    assert logged == 6
+    other.close()
+    conn.close()
+
+
+def test_read_connection_is_read_only_and_checks_schema(tmp_path: Path) -> None:
+    path = tmp_path / "nutrition.db"
+    with pytest.raises(db.SchemaError):
+        db.get_read_connection(path)
+    assert not path.exists()
+
+    _v1_database(path, 3)
+    with pytest.raises(db.SchemaError, match="nutri migrate") as excinfo:
+        db.get_read_connection(path)
+    assert excinfo.value.migratable
+    # Closing checkpoints the WAL, which immutable readers ignore.
+    db.get_connection(path).close()
+
+    for immutable in (False, True):
+        conn = db.get_read_connection(path, immutable=immutable)
+        assert db.get_db_stats(conn)["meals"] == 3
+        with pytest.raises(sqlite3.OperationalError, match="readonly"):
+            conn.execute("DELETE FROM meals")
+        conn.close()
+
+    other = tmp_path / "other.db"
+    sqlite3.connect(other).execute("CREATE TABLE t (x)").connection.close()
+    with pytest.raises(db.SchemaError, match="no nutri schema") as excinfo:
+        db.get_read_connection(other)
+    assert not excinfo.value.migratable
+
+
+def test_counters_follow_writes_and_match_exact_stats(tmp_path: Path) -> None:
+    path = tmp_path / "nutrition.db"
+    _v1_database(path, 10)
+    conn = db.get_connection(path)
+
+    def stats(exact: bool) -> dict:
+        return {
+            k: v
+            for k, v in db.get_db_stats(conn, exact=exact).items()
+            if k in ("meals", "days_tracked", "since", "water_entries", "targets")
+        }
+
+    assert stats(False) == stats(True)
+    assert stats(False)["meals"] == 10
+    meal_id = db.insert_meal(
+        conn,
+        date="2025-12-31",
+        time="08:00",
+        meal_type="lunch",
+        description="Soup",
+        calories=300,
+    )
+    db.insert_water(conn, date="2025-12-31", time="09:00", amount_ml=250)
+    conn.commit()
+    assert stats(False)["since"] == "2025-12-31"
+    db.update_meal(conn, meal_id, date="2026-01-01")
+    db.delete_meals(conn, date_from="2026-01-02", date_to="2026-01-05")
+    conn.commit()
+    assert stats(False) == stats(True)
+    assert stats(False)["since"] == "2026-01-01"
+
+    storage = db.get_storage_stats(conn, objects=True)
+    assert storage["page_count"] > 0 and storage["wal_bytes"] > 0
+    names = {o["name"] for o in storage["objects"]}
+    assert {"meals", "idx_meals_day", "row_counts"} <= names
+    conn.close()
+
+
+def test_meal_nutrients_follow_meal_deletes(tmp_path: Path) -> None:
+    conn = db.get_connection(tmp_path / "nutrition.db")
+    meal_id = db.insert_meal(conn, date="2026-02-11", description="x", calories=1)
+    db.set_meal_nutrients(conn, meal_id, {"iron_mg": 2.0, "caffeine_mg": 40.0})
+    db.set_meal_nutrients(conn, meal_id, {"caffeine_mg": None, "iron_mg": 3.0})
+    after_edit = db.get_meal_nutrients(conn, meal_id)
+    db.delete_meal(conn, meal_id)
+    left = conn.execute("SELECT COUNT(*) FROM meal_nutrients").fetchone()[0]
+    conn.close()
+
+    assert after_edit == {"iron_mg": 3.0}
+    assert left == 0
+
+
+def test_duplicate_meals_found_by_index_and_deduped(tmp_path: Path) -> None:
+    conn = db.get_connection(tmp_path / "nutrition.db")
+    for time, desc, cal in (
+        ("12:00", "Chicken bowl", 650),
+        ("12:08", "chicken  Bowl!", 660),  # same photo submitted twice
+        ("12:30", "Chicken bowl", 650),  # outside the window
+        ("12:05", "Chicken bowl", 900),  # different portion
+        ("12:02", "Salad", 650),
+    ):
+        db.insert_meal(conn, date="2026-02-11", time=time, description=desc, calories=cal)
+    # Written by another tool without a desc_key.
+    conn.execute(
+        "INSERT INTO meals (date, day, time, description, calories) "
+        "VALUES ('2026-02-11', ?, '12:31', 'chicken bowl', 652)",
+        (models.epoch_day("2026-02-11"),),
+    )
+    conn.commit()
+
+    found = db.find_duplicate_meal(conn, "2026-02-11", "12:04", "CHICKEN BOWL", 640)
+    missed = db.find_duplicate_meal(conn, "2026-02-12", "12:00", "Chicken bowl", 650)
+    plan = " ".join(
+        r["detail"]
+        for r in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT id, time, calories FROM meals "
+            "WHERE day = 1 AND desc_key = 2 ORDER BY id"
+        )
+    )
+    duplicates = db.find_duplicate_meals(conn, "2026-02-01", "2026-02-28")
+    # Finding duplicates is read-only, even for rows without a desc_key.
+    unkeyed = conn.execute("SELECT COUNT(*) FROM meals WHERE desc_key IS NULL")
+    assert unkeyed.fetchone()[0] == 1
+
+    meal = {"date": "2026-02-11", "time": "12:03", "description": "Chicken Bowl"}
+    skipped = db.insert_meal_checked(conn, "skip", **meal, calories=640)
+    warned = db.insert_meal_checked(conn, "warn", **meal, calories=640)
+    forced = db.insert_meal_checked(conn, "insert", **meal, calories=640)
+    conn.close()
+
+    assert found is not None and found["id"] == 1
+    assert missed is None
+    assert "idx_meals_dedupe" in plan
+    assert duplicates == {2: 1, 6: 3}
+    assert skipped[0] is None and skipped[1]["id"] == 1
+    assert warned[0] == 7 and warned[1]["id"] == 1
+    assert forced == (8, None)
+
+
+def test_day_totals_cache_follows_every_meal_write(tmp_path: Path) -> None:
+    conn = db.get_connection(tmp_path / "nutrition.db")
+    ids = [
+        db.insert_meal(conn, date=day, description="x", calories=cal, protein_g=p)
+        for day, cal, p in (
+            ("2019-06-01", 500, 20),
+            ("2026-02-10", 700, 30),
+            ("2026-02-10", 300, None),
+            ("2026-02-11", 900, 60),
+        )
+    ]
+    db.update_meal(conn, ids[2], date="2026-02-11")
+    db.update_meals(conn, {"calories": 1000}, date_from="2026-02-11", date_to="2026-02-11")
+    db.delete_meal(conn, ids[1])
+    db.archive_meals_before(conn, "2021-01-01")
+
+    cached = {
+        d: (v["meals"], v["totals"]["calories"], v["totals"]["protein_g"])
+        for d, v in db.get_cached_day_totals(conn, "2000-01-01", "2030-12-31").items()
+    }
+    conn.close()
+
+    assert cached == {
+        "2019-06-01": (1, 500, 20),
+        "2026-02-11": (2, 2000, 60),
+    }
+
+
+def test_day_totals_cache_covers_writes_to_archived_days(tmp_path: Path) -> None:
+    conn = db.get_connection(tmp_path / "nutrition.db")
+    db.insert_meal(conn, date="2020-03-01", description="a", calories=1000)
+    db.insert_meal(conn, date="2020-03-02", description="b", calories=800)
+    db.insert_target(conn, date_from="2020-01-01", calories=2000)
+    conn.commit()
+    db.archive_meals_before(conn, "2021-01-01")
+
+    # A backdated log lands in the main DB on a day the archive also holds.
+    late = db.insert_meal(conn, date="2020-03-01", description="c", calories=1000)
+    db.insert_meal(conn, date="2020-03-02", description="d", calories=500)
+    db.delete_meal(conn, db.insert_meal(conn, date="2020-03-03", description="e", calories=1))
+    db.update_meal(conn, late, calories=900)
+    db.update_meal(conn, late, calories=1000)
+    conn.commit()
+
+    def days(c: sqlite3.Connection) -> dict:
+        return {
+            d: (v["meals"], v["totals"]["calories"])
+            for d, v in db.get_cached_day_totals(c, "2020-01-01", "2020-12-31").items()
+        }
+
+    expected = {"2020-03-01": (2, 2000), "2020-03-02": (2, 1300)}
+    assert days(conn) == expected
+    assert [
+        (h["date"], h["hit"])
+        for h in db.get_target_hits(conn, "calories", None, None, 0.1)
+    ] == [("2020-03-01", True), ("2020-03-02", False)]
+    assert db.get_tracked_span(conn) == ("2020-03-01", "2020-03-02")
+    conn.close()
+
+    conn = db.get_read_connection(tmp_path / "nutrition.db")
+    assert days(conn) == expected
+    conn.close()
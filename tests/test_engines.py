@@ -0,0 +1,63 @@
+from __future__ import annotations
+
+import random
+from pathlib import Path
+
+import pytest
+from typer.testing import CliRunner
+
+from nutricli import db, engines, queries
+from nutricli.cli import app
+
+
+def _duckdb_or_skip() -> None:
+    pytest.importorskip("duckdb")
+    try:
+        engines.connect_duckdb().close()
+    except engines.EngineUnavailable as e:
+        pytest.skip(str(e))
+
+
+def test_duckdb_engine_matches_sqlite(tmp_path: Path) -> None:
+    _duckdb_or_skip()
+    path = tmp_path / "nutrition.db"
+    conn = db.get_connection(path)
+    rng = random.Random(7)
+    db.insert_target(conn, date_from="2019-01-01", calories=2000, protein_g=120)
+    for i in range(400):
+        db.insert_meal(
+            conn,
+            date=f"20{19 + i % 8}-0{1 + i % 9}-{1 + i % 27:02d}",
+            time=None
+            if i % 13 == 0
+            else f"{rng.randrange(24):02d}:{rng.randrange(60):02d}",
+            description="m",
+            calories=rng.uniform(0, 900),
+            protein_g=None if i % 5 == 0 else rng.uniform(0, 60) / 3,
+        )
+    db.insert_water(conn, date="2024-03-03", time="10:00", amount_ml=250)
+    conn.commit()
+    db.archive_meals_before(conn, "2021-01-01")
+    conn.close()
+
+    conn = db.get_read_connection(path)
+    kwargs = dict(avg=True, trend_field="calories", below_field="protein_g")
+    expected = queries.range_summary(conn, "2019-01-01", "2026-12-31", **kwargs)
+    actual = queries.range_summary(
+        conn, "2019-01-01", "2026-12-31", engine="duckdb", **kwargs
+    )
+    conn.close()
+    assert expected["total_meals"] == 400
+    assert actual == expected
+
+
+def test_duckdb_engine_reports_missing_package(tmp_path: Path, monkeypatch) -> None:
+    monkeypatch.setenv("NUTRI_DB_PATH", str(tmp_path / "nutrition.db"))
+
+    def unavailable():
+        raise engines.EngineUnavailable("no duckdb")
+
+    monkeypatch.setattr(engines, "connect_duckdb", unavailable)
+    result = CliRunner().invoke(app, ["query", "--last", "7d", "--engine", "duckdb"])
+    assert result.exit_code == 1
+    assert "no duckdb" in result.output
@@ -0,0 +1,102 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+from typer.testing import CliRunner
+
+from nutricli import db
+from nutricli.cli import app
+
+
+def _records(output: str) -> list[dict]:
+    return [json.loads(line) for line in output.splitlines() if line.strip()]
+
+
+def test_exec_runs_batch_on_one_connection(tmp_path: Path, monkeypatch) -> None:
+    db_path = tmp_path / "nutrition.db"
+    monkeypatch.setenv("NUTRI_DB_PATH", str(db_path))
+    opened = []
+    real = db.get_connection
+    monkeypatch.setattr(
+        db, "get_connection", lambda *a, **kw: opened.append(1) or real(*a, **kw)
+    )
+    script = tmp_path / "batch.txt"
+    script.write_text(
+        "# nightly import\n"
+        'log --desc "Bowl" --cal 650 --date 2026-02-11\n'
+        "water 500 --date 2026-02-11\n"
+        "delete 99\n"
+        "nutri query --from 2026-02-11 --to 2026-02-11\n"
+        "watch\n",
+        encoding="utf-8",
+    )
+    result = CliRunner().invoke(app, ["exec", str(script)])
+    records = _records(result.output)
+
+    assert result.exit_code == 1
+    assert [(r["line"], r["exit_code"]) for r in records] == [
+        (2, 0),
+        (3, 0),
+        (4, 1),
+        (5, 0),
+        (6, 2),
+    ]
+    assert records[0]["result"]["description"] == "Bowl"
+    assert records[2]["error"] == "Meal #99 not found."
+    assert records[3]["result"]["total_water_ml"] == 500
+    assert len(opened) == 1
+
+
+def test_exec_transaction_rolls_back_on_error(tmp_path: Path, monkeypatch) -> None:
+    db_path = tmp_path / "nutrition.db"
+    monkeypatch.setenv("NUTRI_DB_PATH", str(db_path))
+    runner = CliRunner()
+    batch = 'log --desc "A" --cal 100\nwater 250\nedit 42 --cal 1\nlog --desc "B" --cal 1\n'
+
+    result = runner.invoke(app, ["exec", "-", "--transaction"], input=batch)
+    records = _records(result.output)
+    assert result.exit_code == 1
+    assert [r.get("line") for r in records] == [1, 2, 3, None]
+    assert records[-1] == {"transaction": "rolled_back", "commands": 3}
+    conn = db.get_connection(db_path)
+    assert db.get_db_stats(conn)["meals"] == 0
+    conn.close()
+
+    result = runner.invoke(
+        app, ["exec", "-", "--transaction"], input=batch.replace("edit 42", "edit 1")
+    )
+    assert result.exit_code == 0
+    assert _records(result.output)[-1] == {"transaction": "committed", "commands": 4}
+    conn = db.get_connection(db_path)
+    assert db.get_db_stats(conn)["meals"] == 2
+    conn.close()
+
+
+def test_exec_transaction_rejects_self_managed_commands(
+    tmp_path: Path, monkeypatch
+) -> None:
+    db_path = tmp_path / "nutrition.db"
+    monkeypatch.setenv("NUTRI_DB_PATH", str(db_path))
+    foods = tmp_path / "foods.csv"
+    foods.write_text("name,calories\nOats,379\n", encoding="utf-8")
+    runner = CliRunner()
+
+    for command in ("maintenance", f"nutri food import {foods}"):
+        batch = f'log --desc "A" --cal 100\n{command}\n'
+        result = runner.invoke(app, ["exec", "-", "--transaction"], input=batch)
+        assert result.exit_code == 1
+        assert "Line 2:" in result.output
+        assert "cannot run with --transaction" in result.output
+        conn = db.get_connection(db_path)
+        assert db.get_db_stats(conn)["meals"] == 0
+        conn.close()
+
+    # Without --transaction each command commits on its own.
+    batch = f'log --desc "A" --cal 100\nmaintenance\nfood import {foods}\n'
+    result = runner.invoke(app, ["exec", "-"], input=batch)
+    assert result.exit_code == 0
+    assert [r["exit_code"] for r in _records(result.output)] == [0, 0, 0]
+    conn = db.get_connection(db_path)
+    assert db.get_db_stats(conn)["meals"] == 1
+    conn.close()
@@ -0,0 +1,83 @@
+from __future__ import annotations
+
+import json
+import os
+from pathlib import Path
+
+from typer.testing import CliRunner
+
+from nutricli import db, fleet
+from nutricli.cli import app
+
+
+def _client(path: Path, calories: list[float]) -> None:
+    path.parent.mkdir(parents=True)
+    conn = db.get_connection(path)
+    for i, cal in enumerate(calories):
+        db.insert_meal(conn, date=f"2026-03-{i + 1:02d}", description="m", calories=cal)
+    conn.commit()
+    conn.close()
+
+
+def test_fleet_query_merges_and_isolates_errors(tmp_path: Path) -> None:
+    _client(tmp_path / "a" / "nutri.db", [1000, 2000])
+    _client(tmp_path / "b" / "nutri.db", [3000])
+    _client(tmp_path / "c" / "nutri.db", [])
+    broken = tmp_path / "d" / "nutri.db"
+    broken.parent.mkdir()
+    broken.write_text("not a database")
+    pattern = str(tmp_path / "*" / "nutri.db")
+    runner = CliRunner()
+
+    result = runner.invoke(
+        app,
+        [
+            "fleet",
+            "-j",
+            "2",
+            pattern,
+            "query",
+            "--from",
+            "2026-03-01",
+            "--to",
+            "2026-03-31",
+            "--format",
+            "json",
+        ],
+    )
+    assert result.exit_code == 1
+    data = json.loads(result.output)
+    rows = {Path(r["db"]).parent.name: r for r in data["databases"]}
+    assert list(rows) == ["a", "b", "c", "d"]
+    assert rows["a"]["averages"]["calories"] == 1500
+    assert "error" in rows["d"]
+    combined = data["combined"]
+    assert (combined["databases"], combined["failed"]) == (4, 1)
+    assert combined["days"] == 3 and combined["total_meals"] == 3
+    assert combined["averages"]["calories"] == 2000
+    assert combined["daily_percentiles"]["calories"]["p50"] == 2000
+    assert combined["db_average_percentiles"]["calories"]["p50"] == 2250
+
+    result = runner.invoke(
+        app, ["fleet", str(tmp_path / "[abc]" / "nutri.db"), "info", "--format", "json"]
+    )
+    assert result.exit_code == 0
+    assert json.loads(result.output)["combined"]["meals"] == 3
+
+
+def _crash_on_b(path: str) -> dict:
+    if Path(path).parent.name == "b":
+        os._exit(1)
+    return {"ok": True}
+
+
+def test_fleet_run_survives_a_dead_worker(tmp_path: Path) -> None:
+    paths = [tmp_path / name / "nutri.db" for name in "abcdefghij"]
+    rows = fleet.run(paths, _crash_on_b, jobs=1)
+
+    assert [r["db"] for r in rows] == [str(p) for p in paths]
+    assert "BrokenProcessPool" in rows[1]["error"]
+    # Databases queued behind the crash may fail with it; later ones run in
+    # a fresh pool.
+    assert rows[0] == {"db": str(paths[0]), "ok": True}
+    assert rows[-1] == {"db": str(paths[-1]), "ok": True}
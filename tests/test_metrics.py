@@ -0,0 +1,60 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+from typer.testing import CliRunner
+
+from nutricli import metrics
+from nutricli.cli import app
+
+
+def test_metrics_are_opt_in(tmp_path: Path, monkeypatch) -> None:
+    db_path = tmp_path / "nutrition.db"
+    monkeypatch.setenv("NUTRI_DB_PATH", str(db_path))
+    monkeypatch.delenv("NUTRI_METRICS", raising=False)
+    runner = CliRunner()
+
+    assert runner.invoke(app, ["status"]).exit_code == 0
+    assert not metrics.metrics_path(db_path).exists()
+    result = runner.invoke(app, ["metrics"])
+    assert result.exit_code == 0
+    assert result.output.strip().endswith("# EOF")
+
+
+def test_metrics_record_commands(tmp_path: Path, monkeypatch) -> None:
+    db_path = tmp_path / "nutrition.db"
+    monkeypatch.setenv("NUTRI_DB_PATH", str(db_path))
+    monkeypatch.setenv("NUTRI_METRICS", "1")
+    runner = CliRunner()
+
+    for args in (
+        ["log", "--desc", "Oats", "--cal", "350", "--date", "2026-02-11"],
+        ["query", "--from", "2026-02-11", "--to", "2026-02-11"],
+        ["query", "--from", "2026-02-11", "--to", "2026-02-11"],
+        ["sync", "status", str(tmp_path / "peer")],
+    ):
+        assert runner.invoke(app, args).exit_code == 0, args
+
+    data = json.loads(runner.invoke(app, ["metrics", "--format", "json"]).output)
+    assert set(data["commands"]) == {"log", "query", "sync status"}
+    duration = data["commands"]["query"]["command_duration_seconds"]
+    assert duration["count"] == 2
+    assert duration["buckets"]["+Inf"] == 2
+    assert data["commands"]["query"]["sql_statements"] > 0
+    assert data["commands"]["query"]["sql_rows"] > 0
+    assert data["db_bytes"] > 0
+
+    text = runner.invoke(app, ["metrics"]).output
+    assert "# TYPE nutri_command_duration_seconds histogram" in text
+    assert 'nutri_command_duration_seconds_count{command="query"} 2' in text
+    assert 'nutri_command_duration_seconds_bucket{command="log",le="+Inf"} 1' in text
+    assert "nutri_db_bytes " in text
+
+    assert runner.invoke(app, ["metrics", "--reset"]).exit_code == 0
+    assert (
+        json.loads(runner.invoke(app, ["metrics", "--format", "json"]).output)[
+            "commands"
+        ]
+        == {}
+    )
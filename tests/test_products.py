@@ -0,0 +1,75 @@
+from __future__ import annotations
+
+import gzip
+from pathlib import Path
+
+import pytest
+from typer.testing import CliRunner
+
+from nutricli import db, products
+from nutricli.cli import app
+
+HEADER = "code\tproduct_name\tbrands\tserving_quantity\tenergy-kcal_100g\tproteins_100g\tsodium_100g\n"
+
+
+def _write_dump(path: Path, n: int, kcal: int = 100) -> Path:
+    with gzip.open(path, "wt", encoding="utf-8") as f:
+        f.write(HEADER)
+        for i in range(n):
+            f.write(f"{4000000 + i}\tBar {i}\tAcme\t40\t{kcal}\t5\t0.2\n")
+        f.write("\tno barcode\t\t\t1\t1\t1\n")
+    return path
+
+
+class Interrupted(Exception):
+    pass
+
+
+def test_import_upserts_and_resumes(tmp_path: Path) -> None:
+    conn = db.get_connection(tmp_path / "nutrition.db")
+    dump = _write_dump(tmp_path / "dump.tsv.gz", 25)
+
+    def stop_after_two_chunks(rows: int, rate: float) -> None:
+        if rows >= 20:
+            raise Interrupted
+
+    with pytest.raises(Interrupted):
+        products.import_products(conn, dump, chunk_size=10, progress=stop_after_two_chunks)
+    assert conn.execute("SELECT COUNT(*) FROM products").fetchone()[0] == 20
+
+    result = products.import_products(conn, dump, chunk_size=10)
+    assert result["resumed_from"] == 20
+    assert (result["rows"], result["upserted"], result["invalid"]) == (6, 5, 1)
+    product = products.get_product(conn, "4000003")
+    assert product["name"] == "Bar 3"
+    assert product["sodium_mg"] == 200
+
+    # A finished import starts over; unchanged rows are not rewritten.
+    again = products.import_products(conn, dump, chunk_size=10)
+    assert (again["resumed_from"], again["rows"], again["upserted"]) == (0, 26, 0)
+    changed = products.import_products(
+        conn, _write_dump(tmp_path / "dump.tsv.gz", 25, kcal=120)
+    )
+    assert changed["upserted"] == 25
+    conn.close()
+
+
+def test_log_barcode(tmp_path: Path, monkeypatch) -> None:
+    db_path = tmp_path / "nutrition.db"
+    monkeypatch.setenv("NUTRI_DB_PATH", str(db_path))
+    dump = _write_dump(tmp_path / "dump.tsv.gz", 3)
+    runner = CliRunner()
+    assert runner.invoke(app, ["products", "import", str(dump)]).exit_code == 0
+
+    result = runner.invoke(app, ["log", "--barcode", "4000001"])
+    assert result.exit_code == 0, result.output
+    result = runner.invoke(app, ["log", "--barcode", "4000002", "--grams", "100"])
+    assert result.exit_code == 0, result.output
+    conn = db.get_connection(db_path)
+    first, second = db.get_meal(conn, 1), db.get_meal(conn, 2)
+    assert (first["description"], first["calories"]) == ("Bar 1 (40 g)", 40)
+    assert (first["source"], first["barcode"]) == ("barcode", "4000001")
+    assert second["calories"] == 100
+    conn.close()
+
+    assert runner.invoke(app, ["log", "--barcode", "999"]).exit_code == 1
@@ -2,7 +2,9 @@ from __future__ import annotations
 
 from pathlib import Path
 
-from nutricli import db, queries
+import pytest
+
+from nutricli import db, models, queries
 
 
 def test_day_and_status_summary_keys(tmp_path: Path) -> None:
@@ -34,3 +36,163 @@ def test_day_and_status_summary_keys(tmp_path: Path) -> None:
         day.keys()
     )
     assert {"date", "meals", "totals", "target", "remaining", "water_ml"} <= set(status.keys())
+
+
+def test_range_summary_distribution(tmp_path: Path) -> None:
+    conn = db.get_connection(tmp_path / "nutrition.db")
+    # Set twice for the same day: the later target wins, as in `day`.
+    db.insert_target(conn, date_from="2026-02-01", calories=1000)
+    db.insert_target(conn, date_from="2026-02-01", calories=2000, protein_g=100)
+    for day, cals in (("2026-02-01", (900, 1100)), ("2026-02-02", (1400, 300))):
+        for cal in cals:
+            db.insert_meal(
+                conn, date=day, description="x", calories=cal, protein_g=cal / 20
+            )
+    db.insert_meal(conn, date="2026-02-03", description="x", calories=3000)
+
+    result = queries.range_summary(conn, "2026-02-01", "2026-02-03", percentiles=True)
+    conn.close()
+
+    dist = result["distribution"]
+    assert dist["method"] == "exact"
+    assert dist["daily_percentiles"]["calories"]["p50"] == 2000
+    assert sum(b["count"] for b in dist["meal_size_histogram"]) == 5
+    assert dist["within_target"]["calories"] == {"days": 3, "within": 1, "share": 0.333}
+
+
+def test_breakdown_by_hour_wraps_midnight(tmp_path: Path) -> None:
+    conn = db.get_connection(tmp_path / "nutrition.db")
+    for time, meal_type, cal in (
+        ("08:15", "breakfast", 400),
+        ("23:30", "snack", 250),
+        ("01:05", "snack", 150),
+    ):
+        db.insert_meal(
+            conn,
+            date="2026-02-11",
+            time=time,
+            meal_type=meal_type,
+            description="x",
+            calories=cal,
+        )
+
+    by_type = queries.breakdown_summary(conn, "2026-02-11", "2026-02-11", "meal_type")
+    late = queries.breakdown_summary(
+        conn, "2026-02-11", "2026-02-11", "hour", ("21:00", "02:00")
+    )
+    summary = queries.range_summary(
+        conn, "2026-02-11", "2026-02-11", avg=True, between=("21:00", "02:00")
+    )
+    plan = " ".join(
+        r["detail"]
+        for r in conn.execute(
+            "EXPLAIN QUERY PLAN SELECT meal_type, COUNT(*) FROM meals "
+            "WHERE date >= '2026-01-01' AND date <= '2026-02-01' "
+            "GROUP BY date, meal_type"
+        )
+    )
+    conn.close()
+
+    assert [t["key"] for t in by_type["totals"]] == ["breakfast", "snack"]
+    assert by_type["keys"][:4] == ["breakfast", "lunch", "dinner", "snack"]
+    assert [(c["key"], c["calories"]) for c in late["cells"]] == [(1, 150), (23, 250)]
+    # The window narrows only the breakdown; the rest covers whole days.
+    assert summary["breakdown"]["cells"] == late["cells"]
+    assert summary["averages"]["calories"] == 800
+    assert summary["daily"]["2026-02-11"]["meals"] == 3
+    assert "idx_meals_date_meal_type" in plan
+
+
+def test_range_summary_includes_water(tmp_path: Path) -> None:
+    conn = db.get_connection(tmp_path / "nutrition.db")
+    db.insert_meal(conn, date="2026-02-10", description="x", calories=500)
+    for day, amount in (("2026-02-10", 500), ("2026-02-10", 250), ("2026-02-11", 1000)):
+        db.insert_water(conn, date=day, time="10:00", amount_ml=amount)
+
+    result = queries.range_summary(
+        conn, "2026-02-10", "2026-02-11", avg=True, trend_field="water_ml"
+    )
+    day = queries.day_summary(conn, "2026-02-10", water_entries=False)
+    conn.close()
+
+    assert result["total_water_ml"] == 1750
+    assert result["averages"]["water_ml"] == 875
+    assert result["daily"]["2026-02-11"] == {
+        "meals": 0,
+        "totals": {f: 0.0 for f in models.MACRO_FIELDS},
+        "water_ml": 1000,
+    }
+    assert result["trend"]["field"] == "water_ml"
+    assert day["water_ml"] == 750 and "water_entries" not in day
+
+
+def test_extra_nutrients_aggregate_only_when_asked(tmp_path: Path) -> None:
+    path = tmp_path / "nutrition.db"
+    conn = db.get_connection(path)
+    for day, time, amounts in (
+        ("2020-05-01", "08:00", {"potassium_mg": 300.0}),
+        ("2026-02-10", "08:00", {"potassium_mg": 400.0, "caffeine_mg": 95.0}),
+        ("2026-02-10", "19:00", {"potassium_mg": 600.0}),
+        ("2026-02-11", "12:00", {}),
+    ):
+        meal_id = db.insert_meal(
+            conn, date=day, time=time, meal_type="lunch", description="x", calories=500
+        )
+        db.set_meal_nutrients(conn, meal_id, amounts)
+    db.archive_meals_before(conn, "2021-01-01")
+    codes = db.resolve_nutrient_codes(conn, "potassium_mg, caffeine_mg")
+
+    plain = queries.range_summary(conn, "2020-01-01", "2026-02-11", avg=True)
+    result = queries.range_summary(
+        conn, "2020-01-01", "2026-02-11", avg=True, by="meal_type", nutrients=codes
+    )
+    day = queries.day_summary(conn, "2026-02-10", nutrients=codes)
+    with pytest.raises(ValueError):
+        db.resolve_nutrient_codes(conn, "potassium_mg,unicorn_mg")
+    conn.close()
+
+    assert "nutrient_averages" not in plain
+    assert "nutrients" not in plain["daily"]["2026-02-10"]
+    assert result["daily"]["2020-05-01"]["nutrients"]["potassium_mg"] == 300
+    assert result["daily"]["2026-02-10"]["nutrients"] == {
+        "potassium_mg": 1000.0,
+        "caffeine_mg": 95.0,
+    }
+    assert result["daily"]["2026-02-11"]["nutrients"]["caffeine_mg"] == 0.0
+    assert result["nutrient_averages"] == {"potassium_mg": 433.3, "caffeine_mg": 31.7}
+    assert result["breakdown"]["totals"][0]["nutrients"]["potassium_mg"] == 1300
+    assert day["nutrient_totals"] == models.compute_nutrient_totals(day["meals"], codes)
+    assert day["nutrient_totals"]["potassium_mg"] == 1000
+
+
+def test_streaks_and_adherence_follow_the_target_timeline(tmp_path: Path) -> None:
+    conn = db.get_connection(tmp_path / "nutrition.db")
+    db.insert_target(conn, date_from="2026-01-01", calories=2000, protein_g=100)
+    db.insert_target(conn, date_from="2026-01-06", calories=2000, protein_g=150)
+    for day, protein in ((1, 120), (2, 120), (3, 90), (4, 110), (5, 100), (6, 140), (7, 160)):
+        db.insert_meal(
+            conn, date=f"2026-01-{day:02d}", description="x", calories=2100, protein_g=protein
+        )
+
+    adherence = queries.adherence_summary(
+        conn, ["protein_g", "calories"], "2026-01-01", "2026-01-07"
+    )
+    streaks = queries.streaks_summary(conn, ["protein_g"], "2026-01-08")
+    below = queries.range_summary(
+        conn, "2026-01-01", "2026-01-07", below_field="protein_g"
+    )["below_target_days"]
+    conn.close()
+
+    protein = adherence["fields"]["protein_g"]
+    assert (protein["days"], protein["hit"]) == (7, 5)
+    assert protein["missed"] == len(below)
+    assert adherence["fields"]["calories"]["share"] == 1.0
+    assert streaks["fields"]["protein_g"] == {
+        "rule": "at_least",
+        "current": 1,
+        "current_start": "2026-01-07",
+        "hit_today": False,
+        "longest": 2,
+        "longest_start": "2026-01-04",
+        "longest_end": "2026-01-05",
+    }
@@ -0,0 +1,94 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+from typer.testing import CliRunner
+
+from nutricli import db, queries, reports
+from nutricli.cli import app
+
+
+def _seed(path: Path) -> None:
+    conn = db.get_connection(path)
+    db.insert_target(conn, date_from="2026-01-01", calories=2000, protein_g=120)
+    for i, day in enumerate(("2026-01-05", "2026-01-06", "2026-01-14", "2026-02-02")):
+        for time, cal in (("08:00", 600.5), ("19:00", 1300 + i * 100)):
+            db.insert_meal(
+                conn,
+                date=day,
+                time=time,
+                description="meal",
+                calories=cal,
+                protein_g=45.5,
+            )
+    db.insert_water(conn, date="2026-01-20", time="10:00", amount_ml=500)
+    conn.close()
+
+
+def test_weekly_summaries_match_range_queries(tmp_path: Path) -> None:
+    path = tmp_path / "nutrition.db"
+    _seed(path)
+    conn = db.get_connection(path)
+    weeks = reports.collect(conn, "week", "2026-01-07", "2026-02-03", 0.1)
+    months = reports.collect(conn, "month", "2026-01-01", "2026-02-28", 0.1)
+
+    # Widened to whole weeks; weeks without meals or water are left out.
+    assert [w["key"] for w in weeks] == ["2026-W02", "2026-W03", "2026-W04", "2026-W06"]
+    assert [m["key"] for m in months] == ["2026-01", "2026-02"]
+    for w in weeks:
+        expected = queries.range_summary(conn, w["date_from"], w["date_to"], avg=True)
+        assert w["days"] == expected["days"]
+        assert w["total_meals"] == expected["total_meals"]
+        assert w["averages"] == expected["averages"]
+    conn.close()
+
+    first = weeks[0]
+    assert (first["date_from"], first["date_to"]) == ("2026-01-05", "2026-01-11")
+    assert first["target"]["calories"] == 2000
+    # 1900.5 kcal is within 10% of 2000, 2000.5 too; protein 91 < 120.
+    assert first["target_hits"] == {
+        "calories": {"days": 2, "hit": 2},
+        "protein_g": {"days": 2, "hit": 0},
+    }
+    assert weeks[2]["days"] == 0 and weeks[2]["total_water_ml"] == 500
+
+
+def test_report_rewrites_only_changed_periods(tmp_path: Path, monkeypatch) -> None:
+    path = tmp_path / "nutrition.db"
+    out = tmp_path / "reports"
+    _seed(path)
+    monkeypatch.setenv("NUTRI_DB_PATH", str(path))
+    runner = CliRunner()
+    args = ["report", "--weekly", "--all", "-o", str(out), "--jobs", "2"]
+
+    result = runner.invoke(app, args)
+    assert result.exit_code == 0, result.output
+    assert "4 written, 0 unchanged" in result.output
+    assert sorted(p.name for p in out.glob("*.md")) == [
+        "2026-W02.md",
+        "2026-W03.md",
+        "2026-W04.md",
+        "2026-W06.md",
+    ]
+    assert "# Week 2026-W03 (2026-01-12 to 2026-01-18)" in (out / "2026-W03.md").read_text()
+
+    result = runner.invoke(app, args)
+    assert "0 written, 4 unchanged" in result.output
+
+    conn = db.get_connection(path)
+    db.insert_meal(conn, date="2026-01-15", time="12:00", description="x", calories=100)
+    conn.close()
+    (out / "2026-W06.md").unlink()
+    result = runner.invoke(app, args)
+    assert "2 written, 2 unchanged" in result.output
+    manifest = json.loads((out / reports.MANIFEST_NAME).read_text())
+    assert set(manifest["reports"]) == {p.name for p in out.glob("*.md")}
+
+    result = runner.invoke(app, [*args, "--force", "--format", "json"])
+    assert "4 written, 0 unchanged" in result.output
+    week = json.loads((out / "2026-W03.json").read_text())
+    assert week["total_meals"] == 3
+
+    result = runner.invoke(app, ["report", "--all", "-o", str(out)])
+    assert result.exit_code == 1
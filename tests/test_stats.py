@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+import random
+
+from nutricli.stats import Histogram, QuantileSketch, exact_quantile
+
+
+def test_sketch_is_exact_for_small_inputs() -> None:
+    sketch = QuantileSketch()
+    values = [float(v) for v in range(1, 101)]
+    for v in values:
+        sketch.add(v)
+    assert sketch.is_exact
+    assert sketch.quantile(0.5) == exact_quantile(values, 0.5)
+
+
+def test_sketch_bounded_and_mergeable() -> None:
+    rng = random.Random(7)
+    values = [rng.uniform(800, 3500) for _ in range(20000)]
+    left = QuantileSketch(exact_limit=100)
+    right = QuantileSketch(exact_limit=100)
+    for i, v in enumerate(values):
+        (left if i % 2 else right).add(v)
+    left.merge(QuantileSketch.from_dict(right.to_dict()))
+
+    assert not left.is_exact
+    assert left.count == len(values)
+    assert len(left.to_dict()["buckets"]) <= left.max_buckets
+    for q in (0.1, 0.5, 0.9):
+        exact = exact_quantile(values, q)
+        assert abs(left.quantile(q) - exact) <= exact * 0.03
+
+
+def test_histogram_bins() -> None:
+    hist = Histogram((200.0, 400.0))
+    for v in (0, 150, 250, 900):
+        hist.add(v)
+    assert [b["count"] for b in hist.to_list()] == [2, 1, 1]
+    assert hist.to_list()[-1]["max"] is None
@@ -0,0 +1,145 @@
+from __future__ import annotations
+
+import random
+from pathlib import Path
+
+import pytest
+from typer.testing import CliRunner
+
+from nutricli import db, queries, storage
+from nutricli.cli import app
+
+# Columns that differ between backends by construction.
+VOLATILE = ("uid", "created_at", "updated_at")
+
+
+def _fill(write) -> None:
+    """Same rows into either backend; ``write(kind, **values)``."""
+    rng = random.Random(3)
+    write("target", date_from="2026-01-01", calories=2000, protein_g=100)
+    write("target", date_from="2026-01-10", calories=1800, protein_g=120)
+    for i in range(120):
+        day = f"2026-01-{1 + i % 20:02d}"
+        meal_id = write(
+            "meal",
+            date=day,
+            time=None if i % 11 == 0 else f"{rng.randrange(24):02d}:{rng.choice((0, 30))}0",
+            meal_type=rng.choice(("breakfast", "lunch", "dinner", "snack")),
+            description=f"meal {i}",
+            calories=rng.randrange(100, 1200) / 2,
+            protein_g=None if i % 7 == 0 else rng.randrange(0, 80) / 2,
+        )
+        if i % 3 == 0:
+            write("nutrients", meal_id=meal_id, amounts={"caffeine_mg": 40.5})
+    for i in range(30):
+        write(
+            "water",
+            date=f"2026-01-{1 + i % 15:02d}",
+            time=f"{rng.randrange(24):02d}:00",
+            amount_ml=250,
+        )
+
+
+def _strip(value):
+    if isinstance(value, dict):
+        return {k: _strip(v) for k, v in value.items() if k not in VOLATILE}
+    if isinstance(value, list):
+        return [_strip(v) for v in value]
+    return value
+
+
+def test_memory_backend_matches_sqlite(tmp_path: Path) -> None:
+    conn = db.get_connection(tmp_path / "nutrition.db")
+    memory = storage.MemoryStorage()
+
+    def to_sqlite(kind, **values):
+        if kind == "nutrients":
+            return db.set_meal_nutrients(conn, values["meal_id"], values["amounts"])
+        return getattr(db, f"insert_{kind}")(conn, **values)
+
+    def to_memory(kind, **values):
+        if kind == "nutrients":
+            return memory.set_meal_nutrients(values["meal_id"], values["amounts"])
+        return getattr(memory, f"insert_{kind}")(**values)
+
+    _fill(to_sqlite)
+    _fill(to_memory)
+    assert isinstance(memory, storage.Storage)
+
+    codes = ["caffeine_mg"]
+    calls = [
+        lambda s: queries.day_summary(s, "2026-01-05", nutrients=codes),
+        lambda s: queries.status_summary(s, "2026-01-12"),
+        lambda s: queries.range_summary(
+            s,
+            "2026-01-01",
+            "2026-01-31",
+            avg=True,
+            trend_field="calories",
+            below_field="protein_g",
+            percentiles=True,
+            by="hour",
+            between=("21:00", "02:00"),
+            nutrients=codes,
+        ),
+        lambda s: queries.breakdown_summary(
+            s, "2026-01-03", "2026-01-09", "meal_type", nutrients=codes
+        ),
+        lambda s: queries.adherence_summary(
+            s, ["calories", "protein_g"], "2026-01-01", "2026-01-31"
+        ),
+        lambda s: queries.streaks_summary(s, ["calories", "protein_g"], "2026-01-20"),
+        lambda s: storage.as_storage(s).get_cached_day_totals("2026-01-01", "2026-01-31"),
+    ]
+    for call in calls:
+        assert _strip(call(memory)) == _strip(call(conn))
+    conn.close()
+
+    assert memory.delete_meal(1)
+    assert not memory.delete_meal(1)
+    with pytest.raises(ValueError):
+        memory.insert_meal(date="2026-01-01", description="x")
+
+
+
+def test_memory_columns_match_schema(tmp_path: Path) -> None:
+    conn = db.get_connection(tmp_path / "nutrition.db")
+    for table, columns in (
+        ("meals", storage.MEAL_COLUMNS),
+        ("water", storage.WATER_COLUMNS),
+        ("targets", storage.TARGET_COLUMNS),
+    ):
+        info = conn.execute(f"PRAGMA table_info({table})").fetchall()
+        assert list(columns) == [r["name"] for r in info], table
+        for r in info:
+            default = r["dflt_value"]
+            if default is None or "(" in default:
+                # No default, or one SQLite computes (datetime('now')).
+                continue
+            literal = default.strip("'") if default.startswith("'") else float(default)
+            assert columns[r["name"]] == literal, (table, r["name"])
+    conn.close()
+
+def test_memory_db_path_shares_one_database(monkeypatch) -> None:
+    monkeypatch.setenv("NUTRI_DB_PATH", ":memory:")
+    db.reset_memory_db()
+    try:
+        runner = CliRunner()
+        result = runner.invoke(
+            app, ["log", "--date", "2026-01-05", "--desc", "Oats", "--cal", "450"]
+        )
+        assert result.exit_code == 0, result.output
+        result = runner.invoke(app, ["day", "2026-01-05", "--format", "json"])
+        assert '"description": "Oats"' in result.output
+        assert not Path(":memory:").exists()
+
+        conn = db.get_read_connection()
+        assert db.get_main_db_path(conn) is None
+        assert len(db.get_meals_by_date(conn, "2026-01-05")) == 1
+        conn.close()
+    finally:
+        db.reset_memory_db()
+    conn = db.get_connection()
+    assert db.get_meals_by_date(conn, "2026-01-05") == []
+    conn.close()
+    db.reset_memory_db()
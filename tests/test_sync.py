@@ -0,0 +1,113 @@
+from __future__ import annotations
+
+import json
+from pathlib import Path
+
+import pytest
+
+from nutricli import db, sync
+
+
+def _meal(conn, desc: str, cal: float) -> int:
+    return db.insert_meal(conn, date="2026-02-11", description=desc, calories=cal)
+
+
+def test_push_pull_roundtrip_without_echo(tmp_path: Path) -> None:
+    transport = tmp_path / "transport"
+    a = db.get_connection(tmp_path / "a.db")
+    b = db.get_connection(tmp_path / "b.db")
+    _meal(a, "from a", 100)
+    db.insert_water(a, date="2026-02-11", time="09:00", amount_ml=250)
+    db.insert_target(a, date_from="2026-02-01", calories=2000)
+    _meal(b, "from b", 200)
+
+    assert sync.push(a, transport)["changes"] == 3
+    assert sync.push(b, transport)["changes"] == 1
+    assert sync.pull(b, transport)["applied"] == 3
+    assert sync.pull(a, transport)["applied"] == 1
+
+    # Applied changes are not re-exported, and nothing is re-applied.
+    assert sync.push(a, transport)["changes"] == 0
+    assert sync.push(b, transport)["changes"] == 0
+    assert sync.pull(a, transport)["files"] == 0
+
+    for conn in (a, b):
+        descs = sorted(
+            m["description"] for m in db.get_meals_by_date(conn, "2026-02-11")
+        )
+        assert descs == ["from a", "from b"]
+    assert db.get_water_total(b, "2026-02-11") == 250
+    a.close()
+    b.close()
+
+
+def test_conflicts_resolve_on_updated_at_and_deletes_propagate(tmp_path: Path) -> None:
+    bundle = tmp_path / "bundle.jsonl"
+    a = db.get_connection(tmp_path / "a.db")
+    b = db.get_connection(tmp_path / "b.db")
+    meal_id = _meal(a, "shared", 100)
+    other_id = _meal(a, "doomed", 300)
+    sync.push(a, bundle)
+    sync.pull(b, bundle)
+    b_id = b.execute("SELECT id FROM meals WHERE description = 'shared'").fetchone()[0]
+
+    a.execute(
+        "UPDATE meals SET calories = 111, updated_at = '2030-01-01 00:00:00' WHERE id = ?",
+        (meal_id,),
+    )
+    a.commit()
+    b.execute(
+        "UPDATE meals SET calories = 222, updated_at = '2029-01-01 00:00:00' WHERE id = ?",
+        (b_id,),
+    )
+    b.commit()
+    db.delete_meal(a, other_id)
+
+    sync.push(a, bundle)
+    result = sync.pull(b, bundle)
+    b_bundle = tmp_path / "b-bundle.jsonl"
+    sync.push(b, b_bundle)
+    assert sync.pull(a, b_bundle)["applied"] == 0
+
+    assert result["applied"] == 2
+    assert db.get_meal(b, b_id)["calories"] == 111
+    assert db.get_meal(a, meal_id)["calories"] == 111
+    assert [m["description"] for m in db.get_meals_by_date(b, "2026-02-11")] == [
+        "shared"
+    ]
+    a.close()
+    b.close()
+
+
+def test_file_transport_keeps_every_push_and_refuses_gaps(tmp_path: Path) -> None:
+    bundle = tmp_path / "changes.jsonl"
+    a = db.get_connection(tmp_path / "a.db")
+    b = db.get_connection(tmp_path / "b.db")
+    _meal(a, "first", 100)
+    assert sync.push(a, bundle)["changes"] == 1
+    _meal(a, "second", 200)
+    assert sync.push(a, bundle)["changes"] == 1
+
+    result = sync.pull(b, bundle)
+    assert (result["files"], result["applied"]) == (2, 2)
+    descs = sorted(m["description"] for m in db.get_meals_by_date(b, "2026-02-11"))
+    assert descs == ["first", "second"]
+
+    # A changeset that starts after what was applied means a lost push.
+    c = db.get_connection(tmp_path / "c.db")
+    lines = bundle.read_text().splitlines()
+    second = lines.index(next(l for l in lines[1:] if '"from_seq"' in l))
+    gap = tmp_path / "gap.jsonl"
+    gap.write_text("\n".join(lines[second:]) + "\n")
+    with pytest.raises(sync.SyncError, match="missing"):
+        sync.pull(c, gap)
+
+    newer = tmp_path / "newer.jsonl"
+    header = json.loads(lines[0])
+    header["schema_version"] = db.SCHEMA_VERSION + 1
+    newer.write_text("\n".join([json.dumps(header), *lines[1:second]]) + "\n")
+    with pytest.raises(sync.SyncError, match="newer"):
+        sync.pull(c, newer)
+    assert db.get_meals_by_date(c, "2026-02-11") == []
+    for conn in (a, b, c):
+        conn.close()
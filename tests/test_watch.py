@@ -0,0 +1,73 @@
+from __future__ import annotations
+
+from pathlib import Path
+
+import pytest
+
+from nutricli import db, models, watch
+
+
+class Done(Exception):
+    pass
+
+
+def test_change_events_coalesce_per_row(tmp_path: Path) -> None:
+    conn = db.get_connection(tmp_path / "nutrition.db")
+    kept = db.insert_meal(conn, date="2026-02-11", description="oats", calories=300)
+    since = db.get_last_change_seq(conn)
+
+    new = db.insert_meal(conn, date="2026-02-11", description="apple", calories=80)
+    db.update_meal(conn, new, calories=90)
+    gone = db.insert_meal(conn, date="2026-02-11", description="typo", calories=1)
+    db.delete_meal(conn, gone)
+    db.update_meal(conn, kept, calories=350)
+    db.insert_water(conn, date="2026-02-11", time="09:00", amount_ml=250)
+    db.delete_meal(conn, kept)
+
+    events, seq = watch.change_events(conn, since)
+    assert [(e["event"], e["table"], e["id"]) for e in events] == [
+        ("created", "meals", new),
+        ("created", "water", 1),
+        ("deleted", "meals", kept),
+    ]
+    assert events[0]["row"]["calories"] == 90
+    assert seq == db.get_last_change_seq(conn)
+    assert watch.change_events(conn, seq) == ([], seq)
+    conn.close()
+
+
+def test_watch_sees_commits_from_other_connections(tmp_path: Path) -> None:
+    path = tmp_path / "nutrition.db"
+    reader = db.get_connection(path)
+    writer = db.get_connection(path)
+    today = models.today_str()
+    writes = iter(
+        [
+            lambda: db.insert_meal(writer, date=today, description="oats", calories=300),
+            lambda: db.insert_water(writer, date=today, time="09:00", amount_ml=500),
+        ]
+    )
+
+    def sleep(_: float) -> None:
+        # Each poll is followed by a commit from the other connection.
+        write = next(writes, None)
+        if write is None:
+            raise Done
+        write()
+
+    events = []
+    with pytest.raises(Done):
+        for event in watch.watch(reader, status=True, sleep=sleep):
+            events.append(event)
+
+    kinds = [(e["event"], e.get("table")) for e in events]
+    assert kinds == [
+        ("created", "meals"),
+        ("status", None),
+        ("created", "water"),
+        ("status", None),
+    ]
+    assert events[1]["delta"]["calories"] == 300
+    assert events[3]["delta"] == {"water_ml": 500}
+    reader.close()
+    writer.close()